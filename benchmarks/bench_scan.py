@@ -0,0 +1,89 @@
+"""Compare the os.scandir scanner with the original os.walk-based find_files.
+
+Generates a synthetic tree (100k matching files by default, plus excluded
+and hidden folders that must be pruned) and times:
+
+* ``os.walk``       - the original loop, including its per-file commonpath checks
+* ``iter_scan``     - serial os.scandir walk
+* ``scan_parallel`` - os.scandir with subtrees listed on a thread pool
+* ``iter_scan + globs`` - serial walk with include globs and .gitignore matching enabled
+
+Usage: python benchmarks/bench_scan.py [--files N] [--fanout N] [--depth N] [--workers N] [--keep DIR]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codemerger import core  # noqa: E402
+from codemerger.filters import FileFilter  # noqa: E402
+from codemerger.scanner import iter_scan, scan_parallel  # noqa: E402
+from synthetic import EXTENSION, generate_tree  # noqa: E402
+
+EXCLUDED = core.parse_excluded_folders(core.DEFAULT_EXCLUDED_FOLDERS)
+
+
+def legacy_find_files(folder_path, extension, excluded_folders):
+    """The pre-scanner implementation of CodeMergerApp.find_files, minus the Tk bits."""
+    found_files = []
+    for root_dir, dirs, files in os.walk(folder_path, topdown=True):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in excluded_folders]
+        for file in files:
+            if file.endswith(extension):
+                file_path = os.path.join(root_dir, file)
+                if os.path.commonpath([folder_path]) == os.path.commonpath([folder_path, file_path]):
+                    found_files.append(file_path)
+    return found_files
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", help="Generate (or reuse) the tree in this directory instead of a temp dir.")
+    args = parser.parse_args(argv)
+
+    root = args.keep or tempfile.mkdtemp(prefix="codemerger-bench-")
+    try:
+        if not os.path.isdir(os.path.join(root, "node_modules")):
+            print(f"Generating {args.files} files under {root} ...")
+            generate_tree(root, args.files, args.fanout, args.depth)
+
+        cases = [
+            ("os.walk (legacy)", lambda: legacy_find_files(root, EXTENSION, EXCLUDED)),
+            ("iter_scan", lambda: list(iter_scan(root, FileFilter(root, EXTENSION, EXCLUDED)))),
+            (f"scan_parallel x{args.workers}", lambda: scan_parallel(root, FileFilter(root, EXTENSION, EXCLUDED), workers=args.workers)),
+            # Same result, but every entry also goes through the compiled glob and .gitignore matchers
+            ("iter_scan + globs", lambda: list(iter_scan(root, FileFilter(root, EXTENSION, EXCLUDED, include=["**/*.py"], use_gitignore=True)))),
+        ]
+        baseline_time = baseline = None
+        for label, func in cases:
+            elapsed, found = best_of(args.repeat, func)
+            if baseline is None:
+                baseline_time, baseline = elapsed, found
+            status = "ok" if found == baseline else "MISMATCH"
+            print(f"{label:<22} {elapsed * 1000:9.1f} ms  {len(found):>7} files  "
+                  f"{baseline_time / elapsed:5.2f}x  {status}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""End-to-end benchmark of the merge pipeline, with JSON results for tracking regressions.
+
+Generates a synthetic tree (see synthetic.py) and times each phase the app
+goes through, separately:
+
+* ``scan``          - core.find_files (serial walk, or parallel with --scan-workers)
+* ``preview``       - FileSelection + per-file size/token stats, i.e. what preview_files computes
+* ``preview_tk``    - loading that selection into the FileTreeView (skipped without a display)
+* ``combine``       - core.iter_blocks over all files with the default read pool, as combine_files does
+* ``save``          - streamcopy.write_merge_stream to a file, as Save Output does
+
+Each phase reports the best of --repeat runs, files/s and MB/s (of source
+bytes), plus its peak Python allocation (tracemalloc, from one extra run, so
+the timings are not skewed by tracing). The process's peak RSS is recorded
+where the platform provides it.
+
+Usage: python benchmarks/bench_suite.py [--files N] [--size-dist lognormal] [--size BYTES] [--json out.json]
+       python benchmarks/bench_suite.py --compare old.json new.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codemerger import core  # noqa: E402
+from codemerger.selection import FileSelection  # noqa: E402
+from codemerger.streamcopy import write_merge_stream  # noqa: E402
+from codemerger.tokens import TokenCounter  # noqa: E402
+from synthetic import DEFAULT_NOISE_DIRS, EXTENSION, SIZE_DISTRIBUTIONS, generate_tree  # noqa: E402
+
+RESULT_FORMAT = 1 # Bumped when the JSON layout changes
+MB = 1024 * 1024
+
+
+class CountingWriter:
+    """Text sink that only counts what is written, so combine is not timed on string building."""
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, text):
+        self.chars += len(text)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def peak_traced(func):
+    """Peak bytes allocated by Python while ``func`` runs."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # bytes on macOS, KB elsewhere
+
+
+def git_revision():
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        out = subprocess.run(["git", "-C", repo, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def measure(name, func, repeat, files, source_bytes, trace_memory):
+    elapsed, result = best_of(repeat, func)
+    phase = {
+        "seconds": round(elapsed, 6),
+        "files_per_s": round(files / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(source_bytes / MB / elapsed, 2) if elapsed and source_bytes else None,
+    }
+    if trace_memory: phase["peak_alloc_mb"] = round(peak_traced(func) / MB, 2)
+    throughput = f"{phase['mb_per_s']:>8.1f} MB/s" if phase["mb_per_s"] else f"{'-':>8} MB/s"
+    print(f"{name:<12} {elapsed * 1000:10.1f} ms  {phase['files_per_s'] or 0:>12,.0f} files/s  {throughput}"
+          + (f"  peak {phase['peak_alloc_mb']:.1f} MB" if trace_memory else ""))
+    return phase, result
+
+
+def preview_tk(selection):
+    """A function that loads ``selection`` into a withdrawn FileTreeView, or None without a display."""
+    try:
+        import tkinter as tk
+        from codemerger.filetree import FileTreeView
+        root = tk.Tk()
+    except Exception: # ImportError, or TclError without a display
+        return None
+    root.withdraw()
+    view = FileTreeView(root, check_color="#FF9500", box_color="#2a2a2a")
+    view.grid()
+
+    def load():
+        view.load(selection)
+        root.update_idletasks()
+    load.close = root.destroy
+    return load
+
+
+def run_suite(args, root):
+    file_filter = core.build_filter(root, EXTENSION, core.DEFAULT_EXCLUDED_FOLDERS)
+    files = core.find_files(root, file_filter)
+    source_bytes = sum(os.path.getsize(path) for path in files)
+    print(f"{len(files)} matching files, {source_bytes / MB:.1f} MB")
+    repeat, trace = args.repeat, not args.no_memory
+    phases = {}
+
+    phases["scan"], found = measure("scan", lambda: core.find_files(root, file_filter, workers=args.scan_workers),
+                                    repeat, len(files), 0, trace)
+
+    def preview():
+        selection = FileSelection(found, root)
+        selection.set_stats(*TokenCounter().file_stats(found))
+        return selection
+    phases["preview"], selection = measure("preview", preview, repeat, len(found), 0, trace)
+
+    load = preview_tk(selection)
+    if load is None:
+        print(f"{'preview_tk':<12} skipped (no display)")
+        phases["preview_tk"] = None
+    else:
+        try:
+            phases["preview_tk"], _ = measure("preview_tk", load, repeat, len(found), 0, trace)
+        finally:
+            load.close()
+
+    def combine():
+        result = core.MergeResult()
+        out = CountingWriter()
+        for _, block, _ in core.iter_blocks(found, root, result, workers=args.read_workers):
+            out.write(block)
+        return out.chars
+    phases["combine"], _ = measure("combine", combine, repeat, len(found), source_bytes, trace)
+
+    output_path = os.path.join(args.output_dir or root, "bench_output.txt")
+    def save():
+        with open(output_path, "wb") as out:
+            write_merge_stream(found, root, out)
+    try:
+        phases["save"], _ = measure("save", save, repeat, len(found), source_bytes, trace)
+    finally:
+        if os.path.exists(output_path): os.remove(output_path)
+
+    return {"files": len(found), "source_bytes": source_bytes}, phases
+
+
+def compare(old_path, new_path):
+    """Prints the per-phase time ratio of two result files (>1.00x means new is faster)."""
+    with open(old_path, encoding="utf-8") as f: old = json.load(f)
+    with open(new_path, encoding="utf-8") as f: new = json.load(f)
+    print(f"{'phase':<12} {'old ms':>10} {'new ms':>10}  speedup   ({old.get('revision')} -> {new.get('revision')})")
+    for name, phase in new["phases"].items():
+        before = old["phases"].get(name)
+        if not phase or not before:
+            continue
+        print(f"{name:<12} {before['seconds'] * 1000:10.1f} {phase['seconds'] * 1000:10.1f}  {before['seconds'] / phase['seconds']:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--size-dist", choices=SIZE_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--size", type=int, default=4096,
+                        help="Bytes per file: the fixed size, uniform mean or lognormal median (default: %(default)s).")
+    parser.add_argument("--noise-dirs", default=",".join(DEFAULT_NOISE_DIRS),
+                        help="Comma-separated directories filled with files the scan must prune (default: %(default)s).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scan-workers", type=int, default=1)
+    parser.add_argument("--read-workers", type=int, default=core.DEFAULT_READ_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run of each phase.")
+    parser.add_argument("--keep", help="Generate (or reuse) the tree in this directory instead of a temp dir.")
+    parser.add_argument("--output-dir", help="Where the save phase writes (default: inside the tree).")
+    parser.add_argument("--json", help="Write the results to this file ('-' for stdout).")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit.")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    noise_dirs = tuple(name.strip() for name in args.noise_dirs.split(",") if name.strip())
+    config = {"files": args.files, "fanout": args.fanout, "depth": args.depth, "size_dist": args.size_dist,
+              "size": args.size, "noise_dirs": list(noise_dirs), "seed": args.seed,
+              "scan_workers": args.scan_workers, "read_workers": args.read_workers, "repeat": args.repeat}
+    root = args.keep or tempfile.mkdtemp(prefix="codemerger-bench-")
+    try:
+        if not os.path.isdir(os.path.join(root, "pkg0")):
+            print(f"Generating {args.files} files under {root} ...")
+            generate_tree(root, args.files, args.fanout, args.depth, args.size_dist, args.size, noise_dirs, seed=args.seed)
+        tree, phases = run_suite(args, root)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        "format": RESULT_FORMAT,
+        "revision": git_revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "tree": tree,
+        "phases": phases,
+        "peak_rss_mb": round(peak_rss_bytes() / MB, 1) if peak_rss_bytes() else None,
+    }
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
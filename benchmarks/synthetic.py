@@ -0,0 +1,78 @@
+"""Synthetic source trees for the benchmarks.
+
+``generate_tree`` spreads files over a ``fanout ** depth`` directory tree and
+adds noise subtrees (``node_modules``, ``.git``, ...) that the scanner must
+prune. File sizes follow a configurable distribution; contents are Python-like
+lines so the text paths and token estimates behave as they do on real code.
+Generation is deterministic for a given seed.
+"""
+import os
+import random
+
+EXTENSION = ".py"
+DEFAULT_NOISE_DIRS = ("node_modules", ".git", "build")
+SIZE_DISTRIBUTIONS = ("empty", "fixed", "uniform", "lognormal")
+
+_LINES = [
+    "import os\n",
+    "def handler_{n}(request, *args, **kwargs):\n",
+    "    \"\"\"Process one request and return the response.\"\"\"\n",
+    "    value = compute_{n}(request.payload, retries=3)\n",
+    "    if value is None:\n",
+    "        raise ValueError(f\"missing value for {{request.id}}\")\n",
+    "    return {{'status': 'ok', 'value': value, 'id': {n}}}\n",
+    "\n",
+    "class Model{n}(Base):\n",
+    "    fields = ['id', 'name', 'created_at', 'updated_at']\n",
+]
+
+
+def file_size(rng, distribution, size):
+    """One file size in bytes; ``size`` is the fixed size, uniform maximum or lognormal median."""
+    if distribution == "empty": return 0
+    if distribution == "fixed": return size
+    if distribution == "uniform": return rng.randint(0, 2 * size)
+    if distribution == "lognormal": return int(rng.lognormvariate(0, 1) * size)
+    raise ValueError(f"Unknown size distribution '{distribution}' (expected one of {', '.join(SIZE_DISTRIBUTIONS)})")
+
+
+def file_content(index, size):
+    """About ``size`` bytes of Python-like text (exactly ``size`` bytes, ASCII)."""
+    if size <= 0: return ""
+    block = "".join(line.format(n=index) for line in _LINES)
+    return (block * (size // len(block) + 1))[:size]
+
+
+def generate_tree(root, n_files, fanout=10, depth=3, size_distribution="empty", size=4096,
+                  noise_dirs=DEFAULT_NOISE_DIRS, noise_files=None, other_every=10, seed=0):
+    """Writes the tree under ``root`` and returns ``(matching files, their total bytes)``.
+
+    Every ``other_every``-th file gets another extension and must be filtered
+    out (0 disables that). Each noise directory gets ``noise_files`` matching
+    files (default: n_files // 20) that a correct scan never sees.
+    """
+    rng = random.Random(seed)
+    leaves = [root]
+    for _ in range(depth):
+        leaves = [os.path.join(parent, f"pkg{i}") for parent in leaves for i in range(fanout)]
+    for leaf in leaves:
+        os.makedirs(leaf, exist_ok=True)
+    matching = total_bytes = 0
+    for i in range(n_files):
+        leaf = leaves[i % len(leaves)]
+        other = other_every and i % other_every == 0
+        name = f"data{i}.txt" if other else f"mod{i}{EXTENSION}"
+        nbytes = file_size(rng, size_distribution, size)
+        with open(os.path.join(leaf, name), "w", newline="") as f:
+            f.write(file_content(i, nbytes))
+        if not other:
+            matching += 1
+            total_bytes += nbytes
+    if noise_files is None: noise_files = max(1, n_files // 20)
+    for noise in noise_dirs:
+        noise_dir = os.path.join(root, noise, "deep")
+        os.makedirs(noise_dir, exist_ok=True)
+        for i in range(noise_files):
+            with open(os.path.join(noise_dir, f"skip{i}{EXTENSION}"), "w", newline="") as f:
+                f.write(file_content(i, file_size(rng, size_distribution, size)))
+    return matching, total_bytes
@@ -0,0 +1,39 @@
+"""CodeMerger: combine the source files of a directory tree into one text document."""
+from .core import (
+    DEFAULT_EXCLUDED_FOLDERS,
+    DEFAULT_EXTENSION,
+    DEFAULT_MAX_BUFFERED_BYTES,
+    DEFAULT_READ_WORKERS,
+    InputError,
+    MergeCancelled,
+    MergeResult,
+    build_filter,
+    find_files,
+    iter_contents,
+    iter_files,
+    parse_excluded_folders,
+    write_merge,
+)
+from .filters import FileFilter
+from .formats import read_jsonl, save_merge
+from .streamcopy import write_merge_stream
+
+__all__ = [
+    "DEFAULT_EXCLUDED_FOLDERS",
+    "DEFAULT_EXTENSION",
+    "DEFAULT_MAX_BUFFERED_BYTES",
+    "DEFAULT_READ_WORKERS",
+    "InputError",
+    "MergeCancelled",
+    "FileFilter",
+    "MergeResult",
+    "build_filter",
+    "find_files",
+    "iter_contents",
+    "iter_files",
+    "parse_excluded_folders",
+    "read_jsonl",
+    "save_merge",
+    "write_merge",
+    "write_merge_stream",
+]
@@ -0,0 +1,358 @@
+"""Command-line entry point: ``python -m codemerger DIRECTORY [options]``.
+
+Runs the same merge as the GUI without importing tkinter, streaming the
+combined output to stdout or a file.
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+from . import core
+from .batch import DEFAULT_THREADS_PER_JOB, default_processes, run_batch
+from .analysis import DEFAULT_MAX_FILE_BYTES, DEFAULT_MAX_LINE_LENGTH, SKIP, TRUNCATE, AnalysisOptions, analyze_files
+from .cache import DEFAULT_CACHE_MAX_BYTES, MergeCache
+from .formats import COMPRESSIONS, FORMATS, TEXT, check_compression, detect_format, open_output, wrap_output, write_merge_format
+from .metrics import MetricsLog, ProfileCapture, RunMetrics, default_metrics_log
+from .profiles import MergeProfile, ProfileStore
+from .streamcopy import write_merge_stream
+from .tokens import HEURISTIC_TOKENIZER, TokenCounter, chunk_path, write_merge_chunks
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="codemerger",
+        description="Combine all matching source files under DIRECTORY into one text document.",
+    )
+    parser.add_argument("directory", nargs="?", help="Target directory to scan.")
+    parser.add_argument("-e", "--extension", default=core.DEFAULT_EXTENSION,
+                        help="File extension(s) to include, e.g. '.py, .pyi, .toml' (default: %(default)s).")
+    parser.add_argument("-x", "--exclude", default=core.DEFAULT_EXCLUDED_FOLDERS,
+                        help="Comma-separated folder names and/or globs (e.g. 'tests/**, *_pb2.py') to skip "
+                             "(default: %(default)r).")
+    parser.add_argument("-i", "--include", default="",
+                        help="Comma-separated globs; if given, only files matching one of them are kept.")
+    parser.add_argument("--gitignore", action="store_true",
+                        help="Also skip whatever the tree's .gitignore files ignore.")
+    parser.add_argument("--scan-jobs", type=int, default=1,
+                        help="Directories listed concurrently. 1 (default) streams output while scanning; "
+                             "more lists the whole tree in parallel first.")
+    parser.add_argument("-j", "--jobs", type=int, default=core.DEFAULT_READ_WORKERS,
+                        help="Number of files read concurrently (default: %(default)s; 1 reads serially).")
+    parser.add_argument("--max-buffer-mb", type=int, default=core.DEFAULT_MAX_BUFFERED_BYTES // (1024 * 1024),
+                        help="Cap on file content read ahead of the writer, in MB (default: %(default)s).")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse directory listings and file contents from the persistent cache; "
+                             "only changed directories/files are listed/read again.")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        help="Size cap of the persistent cache in MB, LRU-evicted (default: %(default)s).")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Empty the persistent cache (and exit if no DIRECTORY is given).")
+    parser.add_argument("--stream-copy", action="store_true",
+                        help="Copy file bytes straight from disk to the output (serial, no decoding of "
+                             "ASCII files); ignores --jobs and the content cache.")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Split the output into files of at most this many tokens, between file blocks "
+                             "(OUTPUT.part001.txt, ...). Requires -o.")
+    parser.add_argument("--tokenizer", default=HEURISTIC_TOKENIZER,
+                        help="Token counting: 'heuristic' (default, no dependencies) or a tiktoken encoding "
+                             "such as 'cl100k_base' (needs tiktoken).")
+    parser.add_argument("--analyze", action="store_true",
+                        help="Check files before merging: collapse byte-identical files into one block, skip "
+                             "binary and minified (long-line) files, and truncate or skip oversize files.")
+    parser.add_argument("--max-file-kb", type=int, default=DEFAULT_MAX_FILE_BYTES // 1024,
+                        help="With --analyze, files above this size in KB are oversize (default: %(default)s; 0 = no limit).")
+    parser.add_argument("--oversize", choices=(TRUNCATE, SKIP), default=TRUNCATE,
+                        help="With --analyze, what to do with oversize files (default: %(default)s).")
+    parser.add_argument("--max-line-length", type=int, default=DEFAULT_MAX_LINE_LENGTH,
+                        help="With --analyze, files with a longer line in their first 8 KB are skipped as "
+                             "minified/generated (default: %(default)s; 0 = keep them).")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="With --analyze, keep every copy of byte-identical files.")
+    parser.add_argument("--list", action="store_true",
+                        help="Only list the matching files with their size and token count (estimated from "
+                             "the size unless cached), then exit.")
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="Output format: merged text blocks, JSON Lines (one record per file with path, size, "
+                             "sha256 and content) or a tar of the files. Default: from the -o suffix "
+                             "(.jsonl, .tar, .tgz, ...), else text.")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=None,
+                        help="Compress the output while writing it (zstd needs the 'zstandard' package). "
+                             "Default: from the -o suffix (.gz, .zst), else none.")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print per-phase timings, counts and read latency percentiles to stderr.")
+    parser.add_argument("--metrics-log", default=None,
+                        help="Append the run's metrics as one JSON line to this file "
+                             "(default: $CODEMERGER_METRICS_LOG if set).")
+    parser.add_argument("--profile", metavar="DIR", default=None,
+                        help="Profile this run with cProfile and tracemalloc, writing .prof and .memory.txt files to DIR.")
+    profiles = parser.add_argument_group("profiles and batch mode")
+    profiles.add_argument("--save-profile", metavar="NAME",
+                          help="Save DIRECTORY with the filter, --analyze/--max-file-kb, -o, --format and --compress "
+                               "settings as a named profile, then exit.")
+    profiles.add_argument("--list-profiles", action="store_true", help="List the saved profiles and exit.")
+    profiles.add_argument("--delete-profile", metavar="NAME", help="Delete a saved profile and exit.")
+    profiles.add_argument("--batch", nargs="*", metavar="NAME",
+                          help="Merge the named profiles (all of them if no name is given) in parallel, each to its "
+                               "own output, then exit.")
+    profiles.add_argument("--processes", type=int, default=None,
+                          help=f"With --batch, profiles merged at once, one process each (default: CPU count, {default_processes()}).")
+    profiles.add_argument("--threads-per-job", type=int, default=DEFAULT_THREADS_PER_JOB,
+                          help="With --batch, scan/read threads within each job (default: %(default)s).")
+    profiles.add_argument("--output-dir", default=".",
+                          help="With --batch, where profiles without an absolute output write (default: current directory).")
+    profiles.add_argument("--profiles-file", default=None,
+                          help="Profiles file to use instead of the one in the user config directory.")
+    parser.add_argument("-o", "--output", default="-",
+                        help="Output file, or '-' for stdout (default).")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Do not print the summary line to stderr.")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.clear_cache:
+        with MergeCache() as cache: cache.clear()
+        if args.directory is None: return 0
+    store = ProfileStore(args.profiles_file)
+    if args.list_profiles or args.delete_profile or args.batch is not None:
+        try:
+            return run_profiles(args, store)
+        except core.InputError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+    if args.directory is None:
+        parser.error("the following arguments are required: directory")
+    detected_format, detected_compression = detect_format(args.output) if args.output != "-" else (TEXT, None)
+    args.format = args.format or detected_format
+    args.compress = args.compress or detected_compression or "none"
+    if args.max_tokens is not None and (args.max_tokens <= 0 or args.output == "-" or args.stream_copy
+                                        or args.format != TEXT or args.compress != "none"):
+        parser.error("--max-tokens needs a positive budget and -o OUTPUT, and cannot be combined with --stream-copy, "
+                     "--format or --compress")
+    if args.save_profile:
+        # A profile cannot hold these; saving without them would silently merge differently in --batch
+        unsaved = [flag for flag, given in (("--max-tokens", args.max_tokens is not None), ("--no-dedupe", args.no_dedupe),
+                                            ("--oversize", args.oversize != TRUNCATE),
+                                            ("--max-line-length", args.max_line_length != DEFAULT_MAX_LINE_LENGTH)) if given]
+        if unsaved: parser.error(f"--save-profile does not store {', '.join(unsaved)}")
+    try:
+        file_filter = core.build_filter(args.directory, args.extension, args.exclude, args.include, args.gitignore)
+        counter = TokenCounter(args.tokenizer) # Validates --tokenizer before any work is done
+        check_compression(args.compress)
+        if args.save_profile:
+            store.save(MergeProfile(args.save_profile, os.path.abspath(args.directory), args.extension, args.exclude,
+                                    args.include, args.gitignore, args.analyze, args.max_file_kb,
+                                    os.path.abspath(args.output) if args.output != "-" else None,
+                                    format=args.format, compression=args.compress if args.compress != "none" else None))
+            if not args.quiet: print(f"Saved profile '{args.save_profile}' to {store.path}.", file=sys.stderr)
+            return 0
+    except core.InputError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    metrics_log = MetricsLog(args.metrics_log) if args.metrics_log else default_metrics_log()
+    # Timing every filter decision slows the scan, so only when the numbers are reported
+    filter_timing = bool(args.stats or args.profile or metrics_log is not None)
+    metrics = RunMetrics("list" if args.list else "merge", os.path.abspath(args.directory), filter_timing)
+    profile = ProfileCapture(args.profile, metrics.operation, metrics) if args.profile else contextlib.nullcontext()
+    cache = MergeCache(max_bytes=max(1, args.cache_max_mb) * 1024 * 1024) if args.cache else None
+    try:
+        with profile:
+            if args.list: return list_files(args, file_filter, cache, counter, metrics)
+            return run_merge(args, file_filter, cache, metrics)
+    finally:
+        if cache is not None: cache.close()
+        metrics.finish()
+        if args.stats:
+            for line in metrics.summary_lines(): print(line, file=sys.stderr)
+        if metrics_log is not None: metrics_log.write(metrics)
+
+
+def run_profiles(args, store):
+    """--list-profiles, --delete-profile and --batch."""
+    if args.delete_profile:
+        store.delete(args.delete_profile)
+        return 0
+    if args.list_profiles:
+        for profile in store.all():
+            print(f"{profile.name}\t{profile.folder}\t{profile.extension}\t{profile.output_path(args.output_dir)}")
+        return 0
+    profiles = [store.get(name) for name in args.batch] if args.batch else store.all()
+    if not profiles:
+        print("No profiles to run.", file=sys.stderr)
+        return 1
+
+    def on_job(job):
+        if args.quiet and job.ok: return
+        if job.ok:
+            status = f"{job.files} file(s)" + (f", {job.errors} read error(s)" if job.errors else "")
+            status += f", {job.skipped} skipped" if job.skipped else ""
+            print(f"[{job.name}] {status} -> {job.output} ({job.seconds:.2f} s)", file=sys.stderr)
+        else:
+            print(f"[{job.name}] FAILED: {job.failure}", file=sys.stderr)
+
+    result = run_batch(profiles, args.output_dir, args.processes, args.threads_per_job, on_job)
+    if not args.quiet: print(result.summary(), file=sys.stderr)
+    return 1 if result.failed else 0
+
+
+def list_files(args, file_filter, cache, counter, metrics):
+    """Prints ``tokens<TAB>bytes<TAB>relative path`` per matching file, then the totals."""
+    lister = cache.lister(args.directory) if cache else None
+    counter.known.update(cache.token_counts(args.directory, counter.tokenizer) if cache else {})
+    files = metrics.scan(lambda instrumented_filter: core.find_files(
+        args.directory, instrumented_filter, workers=args.scan_jobs, lister=lister), file_filter)
+    metrics.count("found", len(files))
+    with metrics.phase("estimate"):
+        sizes, tokens = counter.file_stats(files)
+    if lister is not None: lister.commit()
+    if hasattr(sys.stdout, 'reconfigure'): sys.stdout.reconfigure(encoding='utf-8')
+    for file_path, size, count in zip(files, sizes, tokens):
+        print(f"{count}\t{size}\t{core.relative_path(file_path, args.directory)}")
+    if not args.quiet:
+        print(f"{len(files)} file(s), {sum(sizes)} bytes, ~{sum(tokens)} tokens.", file=sys.stderr)
+    return 0
+
+
+def analyze(args, files, metrics):
+    """Runs the pre-merge checks if --analyze was given; returns ``(files to merge, Analysis or None)``."""
+    if not args.analyze: return files, None
+    options = AnalysisOptions(dedupe=not args.no_dedupe, max_file_bytes=max(0, args.max_file_kb) * 1024,
+                              oversize_action=args.oversize, max_line_length=max(0, args.max_line_length))
+    with metrics.phase("analyze"):
+        analysis = analyze_files(files, args.directory, options, workers=max(1, args.jobs))
+    metrics.add_analysis(analysis)
+    if not args.quiet:
+        for report in analysis.skipped():
+            print(f"Skipped {core.relative_path(report.path, args.directory)} ({', '.join(sorted(report.flags))})", file=sys.stderr)
+    return analysis.files, analysis
+
+
+def run_merge(args, file_filter, cache, metrics):
+    if args.max_tokens is not None:
+        return run_chunked_merge(args, file_filter, cache, metrics)
+    lister = cache.lister(args.directory) if cache else None
+    cached_reader = cache.reader(args.directory, on_decode=metrics.count_decode) if cache else None
+    if args.scan_jobs > 1:
+        files = metrics.scan(lambda instrumented_filter: core.find_files(
+            args.directory, instrumented_filter, workers=args.scan_jobs, lister=lister), file_filter)
+    else:
+        files = metrics.iter_scan(lambda instrumented_filter: core.iter_files(
+            args.directory, instrumented_filter, lister=lister), file_filter)
+    files, analysis = analyze(args, files, metrics)
+    plan = analysis.plan if analysis is not None else None
+    if args.format != TEXT or args.compress != "none":
+        result = write_formatted(args, files, plan, metrics)
+        if result is None: return 1
+        return finish_merge(args, result, cache, lister, cached_reader, analysis)
+    merge_options = {"workers": max(1, args.jobs), "max_buffered_bytes": max(1, args.max_buffer_mb) * 1024 * 1024,
+                     "reader": metrics.reader(cached_reader), "plan": plan}
+    # The byte copy has no reader to time: its whole run is the save phase
+    phase = "save" if args.stream_copy else "assemble"
+    if args.output == "-":
+        if hasattr(sys.stdout, 'reconfigure'): sys.stdout.reconfigure(encoding='utf-8')
+        try:
+            with metrics.phase(phase):
+                if args.stream_copy:
+                    sys.stdout.flush()
+                    result = write_merge_stream(files, args.directory, sys.stdout.buffer, plan=plan,
+                                                on_decode=metrics.count_decode)
+                    sys.stdout.buffer.flush()
+                else:
+                    result = core.write_merge(files, args.directory, sys.stdout, **merge_options)
+                sys.stdout.flush()
+        except BrokenPipeError:
+            # Downstream (e.g. `| head`) stopped reading; silence the flush at interpreter exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
+    elif args.stream_copy:
+        with metrics.phase(phase), open(args.output, 'wb') as out:
+            result = write_merge_stream(files, args.directory, out, plan=plan, on_decode=metrics.count_decode)
+    else:
+        with metrics.phase(phase), open(args.output, 'w', encoding='utf-8', newline='') as out:
+            result = core.write_merge(files, args.directory, out, **merge_options)
+    if args.stream_copy:
+        metrics.count("files", result.processed)
+        metrics.count("errors", result.errors)
+    return finish_merge(args, result, cache, lister, cached_reader, analysis)
+
+
+def write_formatted(args, files, plan, metrics):
+    """Writes --format/--compress output in one pass (to -o or stdout); returns the MergeResult, or None on a broken pipe."""
+    with metrics.phase("save"):
+        if args.output != "-":
+            with open_output(args.output, args.compress) as out:
+                result = write_merge_format(files, args.directory, out, args.format, plan=plan, workers=max(1, args.jobs),
+                                            on_decode=metrics.count_decode)
+        else:
+            sys.stdout.flush()
+            compressed = wrap_output(sys.stdout.buffer, args.compress)
+            try:
+                result = write_merge_format(files, args.directory, compressed or sys.stdout.buffer, args.format,
+                                            plan=plan, workers=max(1, args.jobs), on_decode=metrics.count_decode)
+                if compressed is not None: compressed.close()
+                sys.stdout.buffer.flush()
+            except BrokenPipeError:
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                return None
+    metrics.count("files", result.processed)
+    metrics.count("errors", result.errors)
+    return result
+
+
+def finish_merge(args, result, cache, lister, cached_reader, analysis):
+    """Commits the cache and prints the warnings and summary line; returns the exit code."""
+    if cache is not None:
+        lister.commit()
+        cached_reader.commit()
+
+    report_failures(result)
+    if not args.quiet:
+        status_msg = f"Combined {result.processed} file(s)."
+        if result.errors > 0: status_msg += f" Encountered {result.errors} read error(s)."
+        if analysis is not None and analysis.summary(): status_msg += f" Checks: {analysis.summary()}."
+        print(status_msg, file=sys.stderr)
+    return 0 if result.processed > 0 or result.errors == 0 else 1
+
+
+def report_failures(result):
+    for file_path, error in result.failures.items():
+        print(f"Warning: Could not read file {file_path}: {error}", file=sys.stderr)
+
+
+def run_chunked_merge(args, file_filter, cache, metrics):
+    """Writes the merge as OUTPUT.partNNN files of at most --max-tokens tokens each."""
+    lister = cache.lister(args.directory) if cache else None
+    cached_reader = cache.reader(args.directory, on_decode=metrics.count_decode) if cache else None
+    counter = TokenCounter.load(cache, args.directory, args.tokenizer)
+    files = metrics.iter_scan(lambda instrumented_filter: core.iter_files(
+        args.directory, instrumented_filter, lister=lister), file_filter)
+    files, analysis = analyze(args, files, metrics)
+    open_chunk = lambda index: open(chunk_path(args.output, index), 'w', encoding='utf-8', newline='')
+    with metrics.phase("save"):
+        result = write_merge_chunks(files, args.directory, open_chunk, args.max_tokens, counter,
+                                    workers=max(1, args.jobs), max_buffered_bytes=max(1, args.max_buffer_mb) * 1024 * 1024,
+                                    reader=metrics.reader(cached_reader),
+                                    plan=analysis.plan if analysis is not None else None)
+    if cache is not None:
+        lister.commit()
+        cached_reader.commit()
+        counter.save(cache, args.directory)
+
+    report_failures(result)
+    if not args.quiet:
+        status_msg = f"Combined {result.processed} file(s) into {len(result.chunk_tokens)} chunk(s)"
+        if result.chunk_tokens: status_msg += f" of at most {max(result.chunk_tokens)} tokens"
+        status_msg += "."
+        if result.oversized: status_msg += f" {result.oversized} file(s) alone exceed --max-tokens."
+        if result.errors > 0: status_msg += f" Encountered {result.errors} read error(s)."
+        if analysis is not None and analysis.summary(): status_msg += f" Checks: {analysis.summary()}."
+        print(status_msg, file=sys.stderr)
+    return 0 if result.processed > 0 or result.errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
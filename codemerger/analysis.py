@@ -0,0 +1,216 @@
+"""Pre-merge analysis: duplicates, binaries, encodings and size limits.
+
+Runs over the selected files before anything is merged and decides, per
+file, whether it is merged in full, truncated, skipped, or collapsed into a
+byte-identical file earlier in the list. Classification works from a sniff
+of the first ``SNIFF_BYTES`` of each file plus its size, so it costs one
+small read per file:
+
+* binary       - a NUL byte, or mostly non-text control bytes (UTF-16/32
+                 text, recognized by decoding.detect_wide, is not binary)
+* non-UTF-8    - the sniffed bytes do not decode as UTF-8 (flagged only:
+                 such files are merged through the legacy fallback decoder)
+* long lines   - a line longer than ``max_line_length`` (minified bundles,
+                 generated data)
+* oversize     - larger than ``max_file_bytes``
+
+Only files whose size occurs more than once can be duplicates, so only those
+are hashed in full (and only after their sniffed heads matched). Reports keep
+a digest of the sniffed head, not the head itself, so memory stays small per
+file however many files are analyzed.
+"""
+import codecs
+import collections
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .core import MergePlan, check_cancelled, relative_path
+from .decoding import detect_wide
+
+SNIFF_BYTES = 8 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+DEFAULT_MAX_LINE_LENGTH = 1000
+BINARY_CONTROL_RATIO = 0.3 # Share of non-text bytes above which a file counts as binary
+
+# Flags
+BINARY = "binary"
+NON_UTF8 = "non-utf8"
+LONG_LINES = "long-lines"
+OVERSIZE = "oversize"
+DUPLICATE = "duplicate"
+UNREADABLE = "unreadable"
+
+# Actions
+INCLUDE = "include"
+TRUNCATE = "truncate"
+SKIP = "skip"
+ALIAS = "alias" # Collapsed into the block of an identical file
+
+# Bytes that occur in text files (same set as file(1)'s text test): BEL, BS, TAB, LF, FF, CR, ESC and 0x20-0xFF
+_TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)))
+
+
+class AnalysisOptions:
+    """What the analysis does with each kind of file. ``0``/None disables a limit."""
+
+    def __init__(self, dedupe=True, skip_binary=True, skip_non_utf8=False, max_file_bytes=DEFAULT_MAX_FILE_BYTES,
+                 oversize_action=TRUNCATE, max_line_length=DEFAULT_MAX_LINE_LENGTH, long_line_action=SKIP):
+        self.dedupe = dedupe
+        self.skip_binary = skip_binary
+        self.skip_non_utf8 = skip_non_utf8
+        self.max_file_bytes = max_file_bytes
+        self.oversize_action = oversize_action # TRUNCATE or SKIP
+        self.max_line_length = max_line_length
+        self.long_line_action = long_line_action # SKIP or INCLUDE
+
+
+class FileReport:
+    """Outcome for one file."""
+
+    __slots__ = ("path", "size", "flags", "action", "primary", "head_digest", "whole")
+
+    def __init__(self, path, size, flags, head_digest, whole):
+        self.path = path
+        self.size = size
+        self.flags = flags # set of flag names
+        self.action = INCLUDE
+        self.primary = None # for ALIAS: the full path whose block lists this file
+        self.head_digest = head_digest # of the sniffed bytes, dropped once the analysis is done
+        self.whole = whole # whether the sniff covered the whole file
+
+
+def sniff(head, size, max_line_length=DEFAULT_MAX_LINE_LENGTH):
+    """Flags for a file of ``size`` bytes whose first bytes are ``head``."""
+    flags = set()
+    if not head: return flags
+    # UTF-16/32 text (BOM or NUL pattern): its NULs are not binary and read_file decodes it as such
+    if detect_wide(head) is not None: return flags
+    if b"\0" in head or len(head.translate(None, _TEXT_BYTES)) > len(head) * BINARY_CONTROL_RATIO:
+        flags.add(BINARY)
+        return flags
+    try:
+        # Not final unless the whole file was sniffed: a character may straddle the end of the head
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=len(head) >= size)
+    except UnicodeDecodeError:
+        flags.add(NON_UTF8)
+    if max_line_length and len(head) > max_line_length:
+        if max(map(len, head.split(b"\n"))) > max_line_length: flags.add(LONG_LINES)
+    return flags
+
+
+def _sniff_file(file_path, max_line_length):
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return FileReport(file_path, 0, {UNREADABLE}, None, True)
+    return FileReport(file_path, size, sniff(head, size, max_line_length), _digest(head), size <= len(head))
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=20).digest()
+
+
+def hash_file(file_path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class Analysis:
+    """Result of analyze_files: per-file reports, the files left to merge and the MergePlan for them."""
+
+    def __init__(self, reports, folder_path):
+        self.reports = reports
+        self.files = [r.path for r in reports if r.action in (INCLUDE, TRUNCATE)]
+        aliases = collections.defaultdict(list)
+        for report in reports:
+            if report.action == ALIAS: aliases[report.primary].append(relative_path(report.path, folder_path))
+        self.plan = MergePlan(dict(aliases), {})
+        self.flag_counts = collections.Counter(flag for r in reports for flag in r.flags)
+        self.action_counts = collections.Counter(r.action for r in reports)
+
+    def skipped(self):
+        return [r for r in self.reports if r.action == SKIP]
+
+    def summary(self):
+        """One line for the status bar / stderr, e.g. '3 duplicate(s) collapsed, 2 binary skipped'."""
+        parts = []
+        if self.action_counts[ALIAS]: parts.append(f"{self.action_counts[ALIAS]} duplicate(s) collapsed")
+        if self.action_counts[TRUNCATE]: parts.append(f"{self.action_counts[TRUNCATE]} truncated")
+        skipped = self.skipped()
+        if skipped:
+            reasons = collections.Counter(sorted(r.flags - {NON_UTF8})[0] if r.flags - {NON_UTF8} else NON_UTF8 for r in skipped)
+            parts.append(f"{len(skipped)} skipped (" + ", ".join(f"{n} {flag}" for flag, n in sorted(reasons.items())) + ")")
+        if self.flag_counts[NON_UTF8]: parts.append(f"{self.flag_counts[NON_UTF8]} non-UTF-8")
+        return ", ".join(parts)
+
+
+def _decide(report, options):
+    flags = report.flags
+    if UNREADABLE in flags: return INCLUDE # Let the merge report the read error in place
+    if BINARY in flags and options.skip_binary: return SKIP
+    if NON_UTF8 in flags and options.skip_non_utf8: return SKIP
+    if LONG_LINES in flags and options.long_line_action == SKIP: return SKIP
+    if options.max_file_bytes and report.size > options.max_file_bytes:
+        flags.add(OVERSIZE)
+        return options.oversize_action
+    return INCLUDE
+
+
+def analyze_files(file_paths, folder_path, options=None, cancel=None, workers=1, on_progress=None):
+    """Classifies ``file_paths`` and returns an Analysis (input order is kept).
+
+    The first file of each group of byte-identical files keeps its block; the
+    others become its aliases. ``on_progress(done, total)`` is called while sniffing.
+    """
+    options = options or AnalysisOptions()
+    file_paths = list(file_paths)
+    total = len(file_paths)
+    reports = []
+    sniff_one = lambda path: _sniff_file(path, options.max_line_length)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="codemerger-sniff") as executor:
+            for report in executor.map(sniff_one, file_paths):
+                check_cancelled(cancel)
+                reports.append(report)
+                if on_progress is not None: on_progress(len(reports), total)
+    else:
+        for file_path in file_paths:
+            check_cancelled(cancel)
+            reports.append(sniff_one(file_path))
+            if on_progress is not None: on_progress(len(reports), total)
+
+    for report in reports:
+        report.action = _decide(report, options)
+
+    if options.dedupe:
+        by_size = collections.defaultdict(list)
+        for report in reports:
+            if report.action != SKIP and UNREADABLE not in report.flags: by_size[report.size].append(report)
+        for group in by_size.values():
+            if len(group) < 2: continue
+            check_cancelled(cancel)
+            first_by_key = {}
+            for report in group:
+                try:
+                    # Files that fit in the sniff are compared by their head; larger ones are hashed
+                    key = report.head_digest if report.whole else (report.head_digest, hash_file(report.path))
+                except OSError:
+                    continue
+                primary = first_by_key.setdefault(key, report)
+                if primary is not report:
+                    report.action = ALIAS
+                    report.primary = primary.path
+                    report.flags.add(DUPLICATE)
+
+    analysis = Analysis(reports, folder_path)
+    for report in reports:
+        if report.action == TRUNCATE: analysis.plan.limits[report.path] = options.max_file_bytes
+        report.head_digest = None
+    return analysis
@@ -0,0 +1,133 @@
+"""Batch mode: run many merge profiles at once, one worker process per job.
+
+Each job scans its folder, drops the files its profile unchecked, optionally
+runs the pre-merge checks and writes its output with formats.save_merge.
+Jobs run in a ProcessPoolExecutor so decoding, filtering and compression
+scale across cores instead of contending for one GIL; inside a job, reads
+use at most ``threads_per_job`` threads, so ``processes * threads_per_job``
+bounds the total I/O concurrency. A failing job is reported and does not
+stop the others.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import core
+from .analysis import AnalysisOptions, analyze_files
+from .errors import InputError
+from .formats import save_merge
+
+DEFAULT_THREADS_PER_JOB = 2
+
+
+def default_processes():
+    return os.cpu_count() or 1
+
+
+class JobResult:
+    """Outcome of one profile's merge (plain attributes, so it pickles back from the worker)."""
+
+    def __init__(self, name, output):
+        self.name = name
+        self.output = output
+        self.files = 0
+        self.errors = 0
+        self.skipped = 0
+        self.source_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+        self.failure = None # Message if the job itself failed
+
+    @property
+    def ok(self):
+        return self.failure is None
+
+
+def run_job(profile, output_path, threads=DEFAULT_THREADS_PER_JOB):
+    """Merges one MergeProfile into ``output_path``; returns a JobResult (never raises)."""
+    job = JobResult(profile.name, output_path)
+    start = time.perf_counter()
+    try:
+        file_filter = core.build_filter(profile.folder, profile.extension, profile.exclude, profile.include, profile.gitignore)
+        files = core.find_files(profile.folder, file_filter, workers=threads)
+        if profile.unchecked:
+            unchecked = set(profile.unchecked)
+            files = [path for path in files if core.relative_path(path, profile.folder).replace(os.sep, "/") not in unchecked]
+        plan = None
+        if profile.analyze:
+            options = AnalysisOptions() if profile.max_file_kb is None else AnalysisOptions(max_file_bytes=profile.max_file_kb * 1024)
+            analysis = analyze_files(files, profile.folder, options, workers=threads)
+            files, plan = analysis.files, analysis.plan
+            job.skipped = len(analysis.skipped())
+        job.source_bytes = sum(_size(path) for path in files)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            result = save_merge(files, profile.folder, output_path, profile.format, profile.compression, plan=plan, workers=threads)
+        except BaseException:
+            # A failed or interrupted job leaves no partial output behind
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+            raise
+        job.files, job.errors = result.processed, result.errors
+        job.output_bytes = _size(output_path)
+    except Exception as e:
+        job.failure = f"{type(e).__name__}: {e}"
+    job.seconds = time.perf_counter() - start
+    return job
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class BatchResult:
+    """All jobs of a batch, in completion order, plus the batch's wall time."""
+
+    def __init__(self, jobs, seconds):
+        self.jobs = jobs
+        self.seconds = seconds
+
+    @property
+    def failed(self):
+        return [job for job in self.jobs if not job.ok]
+
+    def summary(self):
+        files = sum(job.files for job in self.jobs)
+        megabytes = sum(job.source_bytes for job in self.jobs) / (1024 * 1024)
+        rate = f", {files / self.seconds:,.0f} files/s, {megabytes / self.seconds:.1f} MB/s" if self.seconds else ""
+        return (f"{len(self.jobs) - len(self.failed)}/{len(self.jobs)} profile(s) merged: {files} file(s), "
+                f"{megabytes:.1f} MB in {self.seconds:.2f} s{rate}")
+
+
+def run_batch(profiles, output_dir=".", processes=None, threads_per_job=DEFAULT_THREADS_PER_JOB, on_job=None):
+    """Runs every MergeProfile in ``profiles`` on up to ``processes`` worker processes.
+
+    ``on_job(job_result)`` is called in the calling process as each job finishes.
+    With ``processes == 1`` the jobs run in this process, one after another.
+    """
+    outputs = [os.path.abspath(profile.output_path(output_dir)) for profile in profiles]
+    if len(set(outputs)) < len(outputs):
+        raise InputError("Several profiles would write the same output file; give them distinct outputs.", "Duplicate batch outputs")
+    processes = max(1, min(processes or default_processes(), len(profiles) or 1))
+    threads_per_job = max(1, threads_per_job)
+    start = time.perf_counter()
+    jobs = []
+    if processes == 1:
+        for profile in profiles:
+            job = run_job(profile, profile.output_path(output_dir), threads_per_job)
+            jobs.append(job)
+            if on_job is not None: on_job(job)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(run_job, profile, profile.output_path(output_dir), threads_per_job) for profile in profiles]
+            for future in as_completed(futures):
+                job = future.result()
+                jobs.append(job)
+                if on_job is not None: on_job(job)
+    return BatchResult(jobs, time.perf_counter() - start)
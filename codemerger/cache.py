@@ -0,0 +1,277 @@
+"""Persistent scan and content cache for repeat merges of the same trees.
+
+Stored in one SQLite database (stdlib, safe across processes) under the user
+cache directory, keyed by the absolute target directory:
+
+* ``dirs``  - each directory's raw listing with the directory's mtime. A
+  directory whose mtime is unchanged is served from the cache instead of
+  being listed again, so a repeat scan only ``stat``s directories.
+* ``files`` - each file's size, mtime and normalized (decoded, stripped)
+  content. A file whose size and mtime are unchanged is not read again.
+  Rows written by a version that normalized differently (CONTENT_VERSION,
+  kept in ``PRAGMA user_version``) are dropped on open.
+* ``tokens`` - each file's token count per tokenizer, with its size and
+  mtime (see tokens.TokenCounter), so counts survive between runs.
+
+Entries written within ``RACY_WINDOW_NS`` of their mtime are not trusted (the
+same file could be modified again within the timestamp granularity), which
+is the approach git takes for its index. Total size is capped with LRU
+eviction (least recently merged target first, then oldest rows within it);
+``clear()`` (or ``python -m codemerger --clear-cache``) empties it.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from .core import read_file
+from .scanner import list_directory
+
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RACY_WINDOW_NS = 2 * 1_000_000_000
+CONTENT_VERSION = 1 # Bump when read_file's output changes; 1: encoding detection (decoding.decode_bytes)
+CACHED = "cached" # Decoding path reported for cache hits
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    target TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    target TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    listing TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    PRIMARY KEY (target, path)
+);
+CREATE TABLE IF NOT EXISTS files (
+    target TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (target, path)
+);
+CREATE INDEX IF NOT EXISTS files_lru ON files (last_used);
+CREATE TABLE IF NOT EXISTS tokens (
+    target TEXT NOT NULL,
+    tokenizer TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (target, tokenizer, path)
+);
+"""
+
+
+def default_cache_dir():
+    """Per-user cache location (overridable with CODEMERGER_CACHE_DIR)."""
+    override = os.environ.get("CODEMERGER_CACHE_DIR")
+    if override: return override
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "CodeMerger", "Cache")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/CodeMerger")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "codemerger")
+
+
+def _is_racy(mtime_ns):
+    return time.time_ns() - mtime_ns < RACY_WINDOW_NS
+
+
+class MergeCache:
+    """Handle on the cache database; share one instance between scan and merge."""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        if path is None:
+            cache_dir = default_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "cache.sqlite3")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Workers of the read/scan pools call in from other threads; all access is under self.lock
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.executescript(_SCHEMA)
+        version, = self.db.execute("PRAGMA user_version").fetchone()
+        if version < CONTENT_VERSION:
+            # Content and token counts of files decoded the old way
+            self.db.executescript(f"DELETE FROM files; DELETE FROM tokens; PRAGMA user_version = {CONTENT_VERSION};")
+            self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    # --- Maintenance ---
+    def clear(self):
+        """Drops every cached listing and file."""
+        with self.lock:
+            self.db.executescript("DELETE FROM files; DELETE FROM dirs; DELETE FROM tokens; DELETE FROM targets;")
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def size(self):
+        """Total bytes of cached listings and content."""
+        with self.lock:
+            return self._size()
+
+    def _size(self):
+        files, = self.db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM files").fetchone()
+        dirs, = self.db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM dirs").fetchone()
+        return files + dirs
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in ``max_bytes``."""
+        with self.lock:
+            total = self._size()
+            while total > self.max_bytes:
+                rows = self.db.execute(
+                    "SELECT f.target, f.path, f.nbytes FROM files f LEFT JOIN targets t ON t.target = f.target "
+                    "ORDER BY COALESCE(t.last_used, 0), f.last_used LIMIT 100").fetchall()
+                if rows:
+                    self.db.executemany("DELETE FROM files WHERE target = ? AND path = ?", [row[:2] for row in rows])
+                    total -= sum(row[2] for row in rows)
+                    continue
+                # Only listings left: drop the least recently used target's listings
+                row = self.db.execute("SELECT target FROM targets ORDER BY last_used LIMIT 1").fetchone()
+                if row is None: break
+                self.db.execute("DELETE FROM dirs WHERE target = ?", row)
+                self.db.execute("DELETE FROM tokens WHERE target = ?", row)
+                self.db.execute("DELETE FROM targets WHERE target = ?", row)
+                total = self._size()
+            self.db.commit()
+
+    def _touch_target(self, target):
+        self.db.execute("INSERT OR REPLACE INTO targets (target, last_used) VALUES (?, ?)", (target, time.time()))
+
+    # --- Per-target views ---
+    def lister(self, folder_path):
+        return CachedLister(self, folder_path)
+
+    def reader(self, folder_path, on_decode=None):
+        return CachedReader(self, folder_path, on_decode)
+
+    # --- Token counts ---
+    def token_counts(self, folder_path, tokenizer):
+        """Stored counts for a TokenCounter: ``{path: (size, mtime_ns, count)}``."""
+        with self.lock:
+            rows = self.db.execute("SELECT path, size, mtime_ns, count FROM tokens WHERE target = ? AND tokenizer = ?",
+                                   (os.path.abspath(folder_path), tokenizer)).fetchall()
+        return {path: (size, mtime_ns, count) for path, size, mtime_ns, count in rows}
+
+    def store_token_counts(self, folder_path, tokenizer, counts):
+        """Saves ``{path: (size, mtime_ns, count)}`` (e.g. TokenCounter.updated), skipping racy entries."""
+        target = os.path.abspath(folder_path)
+        rows = [(target, tokenizer, path, size, mtime_ns, count)
+                for path, (size, mtime_ns, count) in counts.items() if not _is_racy(mtime_ns)]
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO tokens (target, tokenizer, path, size, mtime_ns, count) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+
+
+class CachedLister:
+    """Drop-in ``lister`` for the scanner: reuses listings of directories whose mtime is unchanged."""
+
+    def __init__(self, cache, folder_path):
+        self.cache = cache
+        self.target = os.path.abspath(folder_path)
+        with cache.lock:
+            rows = cache.db.execute("SELECT path, mtime_ns, listing FROM dirs WHERE target = ?", (self.target,)).fetchall()
+        self.known = {path: (mtime_ns, listing) for path, mtime_ns, listing in rows}
+        self.updates = {} # dir path -> (mtime_ns, raw listing)
+        self.hits = 0
+        self.misses = 0
+        self._count_lock = threading.Lock() # Called from the scan pool's threads
+
+    def __call__(self, dir_path):
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        cached = self.known.get(dir_path)
+        if cached is not None and cached[0] == mtime_ns:
+            with self._count_lock: self.hits += 1
+            return [tuple(entry) for entry in json.loads(cached[1])]
+        with self._count_lock: self.misses += 1
+        listing = list_directory(dir_path)
+        if not _is_racy(mtime_ns):
+            self.updates[dir_path] = (mtime_ns, listing)
+        return listing
+
+    def commit(self):
+        """Stores the listings that changed during this scan."""
+        rows = []
+        for dir_path, (mtime_ns, listing) in self.updates.items():
+            encoded = json.dumps(listing, separators=(",", ":"))
+            rows.append((self.target, dir_path, mtime_ns, encoded, len(encoded)))
+        with self.cache.lock:
+            self.cache.db.executemany("INSERT OR REPLACE INTO dirs (target, path, mtime_ns, listing, nbytes) VALUES (?, ?, ?, ?, ?)", rows)
+            self.cache._touch_target(self.target)
+            self.cache.db.commit()
+        self.updates = {}
+        self.cache.evict()
+
+
+class CachedReader:
+    """Drop-in ``reader`` for the merge: returns cached content for files whose size and mtime are unchanged.
+
+    ``on_decode(path)`` is told each file's decoding path, CACHED for hits.
+    Heads read with a ``limit`` (see core.MergePlan) are neither looked up nor stored.
+    """
+
+    def __init__(self, cache, folder_path, on_decode=None):
+        self.cache = cache
+        self.target = os.path.abspath(folder_path)
+        self.on_decode = on_decode
+        self.updates = []
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, file_path, st=None, limit=None):
+        if limit is not None: return read_file(file_path, on_decode=self.on_decode, limit=limit)
+        if st is None: st = os.stat(file_path)
+        with self.cache.lock:
+            row = self.cache.db.execute(
+                "SELECT content FROM files WHERE target = ? AND path = ? AND size = ? AND mtime_ns = ?",
+                (self.target, file_path, st.st_size, st.st_mtime_ns)).fetchone()
+            if row is not None:
+                self.hits += 1
+                if self.on_decode is not None: self.on_decode(CACHED)
+                return row[0]
+            self.misses += 1
+        content = read_file(file_path, on_decode=self.on_decode)
+        if not _is_racy(st.st_mtime_ns):
+            with self.cache.lock:
+                self.updates.append((self.target, file_path, st.st_size, st.st_mtime_ns, content, len(content.encode("utf-8"))))
+                # Bound the pending batch so a cold merge of a huge tree does not pile up in memory
+                flush = len(self.updates) >= 256
+            if flush: self._write_updates()
+        return content
+
+    def _write_updates(self):
+        now = time.time()
+        with self.cache.lock:
+            updates, self.updates = self.updates, []
+            self.cache.db.executemany(
+                "INSERT OR REPLACE INTO files (target, path, size, mtime_ns, content, nbytes, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [row + (now,) for row in updates])
+
+    def commit(self):
+        """Stores newly read files and marks the target as recently used."""
+        self._write_updates()
+        with self.cache.lock:
+            # Recency is tracked per target, so hits cost no per-row writes
+            self.cache._touch_target(self.target)
+            self.cache.db.commit()
+        self.cache.evict()
@@ -0,0 +1,320 @@
+"""GUI-free merge engine shared by the Tk app and the command line.
+
+Nothing in here may import tkinter: the CLI (``python -m codemerger``) has to
+start on headless CI machines and stream arbitrarily large trees with bounded
+memory, so files are discovered lazily and each ``--- File: ... ---`` block is
+written out as soon as it has been read.
+"""
+import collections
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .decoding import decode_bytes
+from .errors import InputError, MergeCancelled, check_cancelled
+from .filters import FileFilter, parse_extensions
+from .scanner import DEFAULT_SCAN_WORKERS, iter_scan, scan_parallel
+
+DEFAULT_EXTENSION = ".py"
+DEFAULT_EXCLUDED_FOLDERS = "venv, .git, __pycache__, node_modules, build, dist"
+# Reads are I/O bound (network filesystems, cold caches), so use more threads than cores
+DEFAULT_READ_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+# Upper bound on file content read ahead of the writer, so a few huge files cannot OOM
+DEFAULT_MAX_BUFFERED_BYTES = 64 * 1024 * 1024
+
+
+# --- Input Parsing / Validation ---
+
+def parse_excluded_folders(exclude_str):
+    """Parses a comma-separated excluded folders string (names and/or globs) into a set."""
+    exclude_str = (exclude_str or "").strip()
+    if not exclude_str: return set()
+    return {folder.strip() for folder in exclude_str.split(',') if folder.strip()}
+
+
+def validate_folder(folder_path):
+    """Raises InputError if ``folder_path`` is not an existing directory."""
+    if not folder_path or not os.path.isdir(folder_path):
+        raise InputError("Please select a valid target directory.", "Invalid directory")
+
+
+def validate_inputs(folder_path, extension):
+    """Raises InputError with a user-facing message if the inputs are unusable.
+
+    ``extension`` may list several suffixes (``".py, .pyi"``).
+    """
+    validate_folder(folder_path)
+    parse_extensions(extension)
+
+
+def build_filter(folder_path, extension, exclude_str=DEFAULT_EXCLUDED_FOLDERS, include_str="", use_gitignore=False):
+    """Validates the GUI/CLI text inputs and compiles them into a filters.FileFilter."""
+    validate_folder(folder_path)
+    return FileFilter.from_strings(folder_path, extension, exclude_str, include_str, use_gitignore)
+
+
+def relative_path(file_path, folder_path):
+    """Path shown in the block headers; falls back to the full path (e.g. other drive on Windows)."""
+    try:
+        return os.path.relpath(file_path, folder_path)
+    except ValueError:
+        return file_path
+
+
+# --- File Discovery ---
+
+def iter_files(folder_path, file_filter, cancel=None, lister=None):
+    """Yields full paths of the files ``file_filter`` (a filters.FileFilter) keeps; hidden folders are skipped."""
+    return iter_scan(folder_path, file_filter, cancel, lister)
+
+
+def find_files(folder_path, file_filter, cancel=None, workers=DEFAULT_SCAN_WORKERS, on_progress=None, lister=None):
+    """Validates the folder and returns the list of matching full paths (subtrees listed in parallel).
+
+    ``lister`` (e.g. cache.CachedLister) replaces scandir for the raw directory listings.
+    """
+    validate_folder(folder_path)
+    return scan_parallel(folder_path, file_filter, cancel, workers, on_progress, lister)
+
+
+# --- Reading / Block Formatting ---
+
+def read_file(file_path, st=None, on_decode=None, limit=None):
+    """Reads a file the way every merge does: decoded (see decoding.decode_bytes), universal newlines, stripped.
+
+    ``st`` (an already known os.stat result) is accepted for signature
+    compatibility with cache.CachedReader, which uses it for validation.
+    ``on_decode(path)`` is told which decoding path the file took. With
+    ``limit``, only the file's head is read (see read_file_head).
+    """
+    if limit is not None: return read_file_head(file_path, limit, on_decode)
+    with open(file_path, 'rb') as f:
+        content, path = decode_bytes(f.read())
+    if on_decode is not None: on_decode(path)
+    return content
+
+
+class _ReadBudget:
+    """Byte budget shared by the read workers, released as the writer consumes files.
+
+    A worker must reserve a file's size before reading it. The file the writer
+    is waiting for (``head``) is always admitted, even over the limit, so the
+    pipeline can never deadlock on a file larger than the whole budget.
+    """
+
+    def __init__(self, limit, cancel=None):
+        self.limit = limit
+        self.cancel = cancel
+        self.used = 0
+        self.head = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def acquire(self, seq, nbytes):
+        with self.cond:
+            while self.used + nbytes > self.limit and seq != self.head:
+                if self.closed: raise MergeCancelled()
+                check_cancelled(self.cancel)
+                self.cond.wait(0.1)
+            self.used += nbytes
+
+    def release(self, nbytes):
+        with self.cond:
+            self.used -= nbytes
+            self.head += 1
+            self.cond.notify_all()
+
+    def close(self):
+        """Wakes any waiting workers so they give up (the consumer has stopped)."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def _read_reserved(seq, file_path, budget, reader):
+    """Worker body: reserve the file's size in the budget, then read it."""
+    try:
+        st = os.stat(file_path)
+    except OSError as e:
+        budget.acquire(seq, 0)
+        return None, e, 0
+    size = st.st_size
+    budget.acquire(seq, size)
+    try:
+        return reader(file_path, st), None, size
+    except Exception as e:
+        return None, e, size
+
+
+def iter_contents(file_paths, workers=1, max_buffered_bytes=DEFAULT_MAX_BUFFERED_BYTES, cancel=None, reader=read_file):
+    """Yields ``(file_path, content, error)`` in input order; exactly one of content/error is None.
+
+    With ``workers > 1`` files are read concurrently by a bounded thread pool.
+    At most ``max_buffered_bytes`` of content (plus the file currently being
+    written) is held at once, and only a small window of files is queued
+    ahead, so memory stays flat however many files there are. ``reader`` is
+    ``read_file`` or a drop-in such as cache.CachedReader.
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            check_cancelled(cancel)
+            try:
+                yield file_path, reader(file_path), None
+            except Exception as e:
+                yield file_path, None, e
+        return
+
+    budget = _ReadBudget(max_buffered_bytes, cancel)
+    window = workers * 4
+    pending = collections.deque()
+    paths = iter(file_paths)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="codemerger-read")
+    try:
+        seq = 0
+        for file_path in paths:
+            pending.append((file_path, executor.submit(_read_reserved, seq, file_path, budget, reader)))
+            seq += 1
+            if len(pending) >= window: break
+        while pending:
+            check_cancelled(cancel)
+            file_path, future = pending.popleft()
+            content, error, size = future.result()
+            yield file_path, content, error
+            content = None
+            budget.release(size)
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(_read_reserved, seq, next_path, budget, reader)))
+                seq += 1
+    finally:
+        budget.close()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def format_block(rel_path, content, aliases=None):
+    """One successfully read file, as it appears in the merged output.
+
+    ``aliases`` lists the relative paths of byte-identical copies that were
+    collapsed into this block (see analysis.analyze_files).
+    """
+    return f"{format_header(rel_path, aliases)}{content}\n--- End File: {rel_path} ---\n"
+
+
+def format_header(rel_path, aliases=None):
+    """The opening line(s) of a block, including the duplicates line if there are aliases."""
+    if aliases: return f"--- File: {rel_path} ---\n--- Duplicates: {', '.join(aliases)} ---\n"
+    return f"--- File: {rel_path} ---\n"
+
+
+def format_truncation(omitted_bytes):
+    """Appended to the content of a file cut short at a size limit."""
+    return f"\n... [truncated: {omitted_bytes} more bytes]"
+
+
+def format_error_block(rel_path, error):
+    """Placeholder block for a file that could not be read."""
+    return f"--- Error reading file: {rel_path} ---\nError: {str(error)}\n--- End Error ---\n"
+
+
+class MergeResult:
+    """Counters reported back to the caller once a merge has been written."""
+
+    def __init__(self):
+        self.processed = 0
+        self.errors = 0
+        self.failures = {} # full path -> the exception that kept it out, in merge order
+
+    @property
+    def total(self):
+        return self.processed + self.errors
+
+    def fail(self, file_path, error):
+        self.errors += 1
+        self.failures[file_path] = error
+
+
+class MergePlan:
+    """Per-file adjustments decided before a merge (see analysis.analyze_files).
+
+    ``aliases`` maps a full path to the relative paths of byte-identical copies
+    collapsed into its block; ``limits`` maps a full path to the number of
+    bytes to keep (the rest is cut at a line boundary and marked).
+    """
+
+    def __init__(self, aliases=None, limits=None):
+        self.aliases = aliases or {}
+        self.limits = limits or {}
+
+    def reader(self, reader=read_file):
+        """Wraps a merge ``reader``: files with a limit are read truncated, by ``reader`` all the same.
+
+        The limit is passed on as ``reader(file_path, st, limit=limit)``, so
+        every reader in the chain (metrics, cache, token counts) sees the read.
+        """
+        if not self.limits: return reader
+        def read_planned(file_path, st=None):
+            limit = self.limits.get(file_path)
+            return reader(file_path, st) if limit is None else reader(file_path, st, limit=limit)
+        return read_planned
+
+
+def truncation_point(head, size, limit):
+    """Where to cut a file of ``size`` bytes whose first bytes are ``head``: the last line break within ``limit``."""
+    if size <= limit: return size
+    cut = head.rfind(b"\n", 0, limit)
+    return cut if cut > 0 else limit
+
+
+def read_file_head(file_path, limit, on_decode=None):
+    """Like read_file, but only the first ``limit`` bytes (cut at a line break) plus a truncation marker."""
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(limit)
+    cut = truncation_point(head, size, limit)
+    content, path = decode_bytes(head[:cut])
+    if on_decode is not None: on_decode(path)
+    if cut < size: content += format_truncation(size - cut)
+    return content
+
+
+def decode_content(data):
+    """Decodes raw file bytes exactly as read_file does."""
+    return decode_bytes(data)[0]
+
+
+def iter_blocks(file_paths, folder_path, result=None, cancel=None, workers=1, max_buffered_bytes=DEFAULT_MAX_BUFFERED_BYTES, reader=read_file, plan=None):
+    """Yields ``(file_path, block_text, ok)`` one file at a time, in input order.
+
+    With a MergePlan, truncated files are read through ``plan.reader`` and
+    duplicates are listed in their primary file's block.
+    """
+    if plan is not None: reader = plan.reader(reader)
+    aliases = plan.aliases if plan is not None else None
+    for file_path, content, error in iter_contents(file_paths, workers, max_buffered_bytes, cancel, reader):
+        rel_path = relative_path(file_path, folder_path)
+        ok = error is None
+        block = format_block(rel_path, content, aliases.get(file_path) if aliases else None) if ok else format_error_block(rel_path, error)
+        if result is not None:
+            if ok: result.processed += 1
+            else: result.fail(file_path, error)
+        yield file_path, block, ok
+
+
+def write_merge(file_paths, folder_path, out, on_file=None, cancel=None, workers=1, max_buffered_bytes=DEFAULT_MAX_BUFFERED_BYTES, reader=read_file, plan=None):
+    """Streams the merged blocks for ``file_paths`` to the text stream ``out``.
+
+    Blocks are always written in input order. With the default single worker
+    only one file's content is held in memory at a time; with ``workers > 1``
+    reads overlap and read-ahead is capped at ``max_buffered_bytes``.
+    ``on_file`` is called as ``on_file(file_path, ok)`` after each block has
+    been written (a failed file's error ends up in ``result.failures``); setting ``cancel`` stops the merge with MergeCancelled.
+    ``plan`` (a MergePlan) is passed on to iter_blocks.
+    """
+    result = MergeResult()
+    first = True
+    for file_path, block, ok in iter_blocks(file_paths, folder_path, result, cancel, workers, max_buffered_bytes, reader, plan):
+        if not first: out.write("\n")
+        out.write(block)
+        first = False
+        if on_file is not None: on_file(file_path, ok)
+    return result
@@ -0,0 +1,153 @@
+"""Byte-level decoding of source files: encoding detection plus normalization in one pass.
+
+Every merge path turns a file's raw bytes into the text of its block the
+same way: surrounding whitespace stripped, ``\\r\\n`` and ``\\r`` turned into
+``\\n``, and the result in UTF-8. What varies is how much work that takes, so
+each file is classified by the cheapest test that settles it:
+
+* ``ascii``  - pure ASCII (``bytes.isascii``, a C-level scan). Nothing to
+               decode; the bytes are already the output.
+* ``utf-8``  - valid UTF-8 without a BOM. Decoded once, to validate it.
+* ``bom``    - a UTF-8, UTF-16 or UTF-32 byte order mark says what it is.
+* ``utf-16`` - no BOM, but many of every other byte of the head are NUL:
+               UTF-16 text that is mostly ASCII, in the byte order the NULs imply.
+* ``legacy`` - anything else, i.e. not valid UTF-8: decoded as
+               FALLBACK_ENCODING (Windows-1252, a superset of Latin-1's
+               printable range) with undefined bytes replaced, instead of
+               silently dropping every non-UTF-8 byte.
+
+Stripping and line ending normalization happen on the bytes before any
+decode for the ASCII-compatible paths, so no intermediate ``str`` copy is
+made. Only the whole file's leading and trailing whitespace is stripped, as
+the merge always did; trailing whitespace inside the file is kept, so the
+merged text stays byte-for-byte what earlier versions produced (and
+whitespace-sensitive content such as Markdown hard breaks survives).
+Nothing here imports the rest of the package.
+"""
+import codecs
+import re
+
+ASCII = "ascii"
+UTF8 = "utf-8"
+BOM = "bom"
+UTF16 = "utf-16"
+LEGACY = "legacy"
+PATHS = (ASCII, UTF8, BOM, UTF16, LEGACY)
+
+FALLBACK_ENCODING = "cp1252"
+UTF16_SNIFF_BYTES = 4096
+UTF16_NUL_RATIO = 0.4 # Share of NULs in the high bytes of UTF-16 text that is mostly ASCII
+UTF16_STRAY_NUL_RATIO = 0.05
+# What str.strip() removes, restricted to ASCII
+STRIP_BYTES = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+# Control characters that do not occur in text; a UTF-16 guess decoding to one of them is binary
+_BINARY_CONTROLS = re.compile("[\x00-\x08\x0e-\x1b\x7f]")
+
+# Longest first: a UTF-32-LE BOM starts with the UTF-16-LE one
+_BOMS = ((codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"), (codecs.BOM_UTF8, "utf-8"),
+         (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"))
+
+
+def detect_bom(head):
+    """``(encoding, BOM length)`` if ``head`` starts with a byte order mark, else ``(None, 0)``."""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom): return encoding, len(bom)
+    return None, 0
+
+
+def guess_utf16(head):
+    """'utf-16-le' or 'utf-16-be' if ``head`` looks like BOM-less UTF-16 text, else None."""
+    sample = head[:UTF16_SNIFF_BYTES]
+    if len(sample) < 4: return None
+    even_nuls, odd_nuls = sample[0::2].count(0), sample[1::2].count(0)
+    half = len(sample) // 2
+    # NULs on one side only (a few are allowed: e.g. U+4E00 is 00 4E in UTF-16-LE)
+    if odd_nuls >= half * UTF16_NUL_RATIO and even_nuls <= half * UTF16_STRAY_NUL_RATIO: encoding = "utf-16-le"
+    elif even_nuls >= half * UTF16_NUL_RATIO and odd_nuls <= half * UTF16_STRAY_NUL_RATIO: encoding = "utf-16-be"
+    else: return None
+    # The NUL pattern alone also fits short binary heads: the guess must decode to text
+    try:
+        text = codecs.getincrementaldecoder(encoding)().decode(sample[:half * 2])
+    except UnicodeDecodeError:
+        return None
+    return None if _BINARY_CONTROLS.search(text) else encoding
+
+
+def detect_wide(head):
+    """``(encoding, bytes to skip, path)`` for files that are not ASCII-compatible (UTF-16/32), else None."""
+    encoding, skip = detect_bom(head)
+    if encoding is not None:
+        return (encoding, skip, BOM) if encoding != "utf-8" else None
+    encoding = guess_utf16(head)
+    return (encoding, 0, UTF16) if encoding is not None else None
+
+
+def normalize_newlines(data):
+    """``\\r\\n`` and lone ``\\r`` to ``\\n``, on bytes or str (a no-op without carriage returns)."""
+    cr, lf = ("\r", "\n") if isinstance(data, str) else (b"\r", b"\n")
+    if cr not in data: return data
+    return data.replace(cr + lf, lf).replace(cr, lf)
+
+
+def _strip_text(text):
+    # str.strip() also removes non-ASCII whitespace (e.g. U+00A0); only copy when an end has some
+    return text.strip() if text[:1].isspace() or text[-1:].isspace() else text
+
+
+def decode_bytes(data):
+    """Normalized text of a whole file's raw bytes: ``(text, path)``, path being one of PATHS."""
+    wide = detect_wide(data)
+    if wide is not None:
+        encoding, skip, path = wide
+        return normalize_newlines(data[skip:].decode(encoding, errors='replace')).strip(), path
+    path = None
+    if data.startswith(codecs.BOM_UTF8):
+        data, path = data[len(codecs.BOM_UTF8):], BOM
+    data = normalize_newlines(data.strip(STRIP_BYTES))
+    if path is None and data.isascii():
+        return data.decode('ascii'), ASCII
+    if path == BOM:
+        return _strip_text(data.decode('utf-8', errors='replace')), BOM
+    try:
+        return _strip_text(data.decode('utf-8')), UTF8
+    except UnicodeDecodeError:
+        return _strip_text(data.decode(FALLBACK_ENCODING, errors='replace')), LEGACY
+
+
+def normalize_bytes(data):
+    """Like decode_bytes, but returns the normalized text UTF-8 encoded: ``(bytes, path)``.
+
+    ASCII and valid UTF-8 files come back as (a slice of) their own bytes,
+    never re-encoded.
+    """
+    if detect_wide(data) is None and not data.startswith(codecs.BOM_UTF8):
+        data = normalize_newlines(data.strip(STRIP_BYTES))
+        if data.isascii(): return data, ASCII
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+        else:
+            stripped = _strip_text(text)
+            return (data if stripped is text else stripped.encode('utf-8')), UTF8
+    text, path = decode_bytes(data)
+    return text.encode('utf-8'), path
+
+
+def stream_decoder(path):
+    """Incremental decoder for the chunks of a large ASCII-compatible file, or None when chunks can be copied as they are."""
+    if path in (ASCII, UTF8): return None
+    encoding = FALLBACK_ENCODING if path == LEGACY else "utf-8"
+    return codecs.getincrementaldecoder(encoding)('replace')
+
+
+def scan_utf8(chunks):
+    """True if the byte chunks, in order, are valid UTF-8 (a character may span chunks)."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for chunk in chunks:
+            if not chunk.isascii() or decoder.getstate()[0]: decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
@@ -0,0 +1,19 @@
+"""Exceptions shared by the scan, read and merge stages."""
+
+
+class InputError(ValueError):
+    """Invalid user input; ``status`` is the short form shown in the status bar."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class MergeCancelled(Exception):
+    """Raised inside a scan or merge once its ``cancel`` event has been set."""
+
+
+def check_cancelled(cancel):
+    """Raises MergeCancelled if ``cancel`` (a threading.Event or None) is set."""
+    if cancel is not None and cancel.is_set():
+        raise MergeCancelled()
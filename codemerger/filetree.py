@@ -0,0 +1,276 @@
+"""Virtualized preview list: a ttk.Treeview over a FileSelection.
+
+Only the nodes the user can actually see are ever created in Tk. The root's
+children are inserted when a selection is loaded and a directory's children
+are inserted the first time it is opened; every file's checked state lives in
+the FileSelection bitset, and the row images are just a rendering of it. When
+the selection carries sizes and token estimates they are shown in a second
+column, with directory rows showing their subtree totals.
+
+While the filter box has a query the tree is replaced by a flat list of the
+matching files (search.PathIndex ids), capped at MAX_MATCH_ROWS rows;
+clearing the query brings back the tree as it was.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+from .selection import STATE_ALL, STATE_NONE, STATE_SOME
+
+CHECKBOX_SIZE = 12
+PLACEHOLDER_SUFFIX = "#placeholder" # Dummy child that makes an unopened directory expandable
+STATS_COLUMN_WIDTH = 150
+MAX_MATCH_ROWS = 500 # Filter results shown as rows; Select All/None still cover every match
+
+
+def format_size(nbytes):
+    for unit in ("B", "KB", "MB"):
+        if nbytes < 1024: return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GB"
+
+
+def format_tokens(count):
+    """Short token count: 950, 12.3k, 4.1M."""
+    if count < 1000: return str(count)
+    if count < 1_000_000: return f"{count / 1000:.1f}k"
+    return f"{count / 1_000_000:.1f}M"
+
+
+def format_stats(nbytes, tokens):
+    return f"{format_size(nbytes)}  ~{format_tokens(tokens)} tok"
+
+
+def _make_checkbox_image(master, border, fill, mark=None):
+    """Draws a small square checkbox image (mark: None, 'check' or 'dash')."""
+    size = CHECKBOX_SIZE
+    image = tk.PhotoImage(master=master, width=size, height=size)
+    image.put(fill, to=(0, 0, size, size))
+    image.put(border, to=(0, 0, size, 1))
+    image.put(border, to=(0, size - 1, size, size))
+    image.put(border, to=(0, 0, 1, size))
+    image.put(border, to=(size - 1, 0, size, size))
+    if mark == "check":
+        image.put(border, to=(3, 3, size - 3, size - 3))
+    elif mark == "dash":
+        image.put(border, to=(3, size // 2 - 1, size - 3, size // 2 + 1))
+    return image
+
+
+class FileTreeView(ttk.Frame):
+    """Scrollable, lazily populated checkbox tree of the files found by a preview."""
+
+    def __init__(self, master, check_color, box_color, style=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.selection = None
+        self.on_change = None # Called with no arguments after the user toggles something
+        self.matches = None # File ids shown by the filter, or None when the tree is shown
+        self._tree_state = None # (open directory keys, scroll position) to restore when the filter is cleared
+
+        tree_kwargs = {"style": style} if style else {}
+        self.tree = ttk.Treeview(self, show="tree", selectmode="browse", columns=("stats",), **tree_kwargs)
+        self.tree.column("stats", width=STATS_COLUMN_WIDTH, minwidth=STATS_COLUMN_WIDTH, stretch=False, anchor="e")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.images = {
+            STATE_NONE: _make_checkbox_image(self, check_color, box_color),
+            STATE_ALL: _make_checkbox_image(self, check_color, box_color, "check"),
+            STATE_SOME: _make_checkbox_image(self, check_color, box_color, "dash"),
+        }
+
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+        self.tree.bind("<Button-1>", self.on_click)
+        self.tree.bind("<space>", self.on_space)
+
+    # --- Item ids: 'd:<relative dir>' for directories, 'f:<file id>' for files ---
+    @staticmethod
+    def dir_iid(node):
+        return f"d:{node.key}"
+
+    @staticmethod
+    def file_iid(file_id):
+        return f"f:{file_id}"
+
+    def _node_for(self, iid):
+        if iid.startswith("d:"): return self.selection.dirs[iid[2:]]
+        return None
+
+    # --- Loading ---
+    def clear(self):
+        """Removes every row; only the populated rows exist in Tk so this is cheap."""
+        self.tree.delete(*self.tree.get_children())
+        self.selection = None
+        self.matches = None
+        self._tree_state = None
+
+    def show_message(self, text):
+        self.clear()
+        self.tree.insert("", tk.END, text=text)
+
+    def load(self, selection):
+        """Shows a new FileSelection, inserting only the root directory's children."""
+        self.clear()
+        self.selection = selection
+        self._populate("", selection.root)
+        self.tree.yview_moveto(0)
+
+    def _save_tree_state(self):
+        open_keys = []
+        stack = list(self.tree.get_children(""))
+        while stack:
+            iid = stack.pop()
+            if iid.startswith("d:") and not iid.endswith(PLACEHOLDER_SUFFIX) and self.tree.tk.getboolean(self.tree.item(iid, "open")):
+                open_keys.append(iid[2:])
+                stack.extend(self.tree.get_children(iid))
+        return open_keys, self.tree.yview()[0]
+
+    def reload(self, selection):
+        """Shows an updated FileSelection of the same tree, keeping expanded directories and scroll position.
+
+        A filtered list is replaced by the tree; the caller re-applies the filter.
+        """
+        self._restore_tree(selection, self._tree_state if self.matches is not None else self._save_tree_state())
+
+    def _restore_tree(self, selection, tree_state):
+        open_keys, top = tree_state
+        self.load(selection)
+        # Parents before children, so each directory's row exists when it is re-opened
+        for key in sorted(open_keys, key=lambda k: k.count("/")):
+            node = selection.dirs.get(key)
+            iid = f"d:{key}"
+            if node is None or not self.tree.exists(iid): continue
+            placeholder = iid + PLACEHOLDER_SUFFIX
+            if self.tree.exists(placeholder):
+                self.tree.delete(placeholder)
+                self._populate(iid, node)
+            self.tree.item(iid, open=True)
+        self.tree.yview_moveto(top)
+
+    def show_matches(self, file_ids):
+        """Replaces the tree with a flat list of the files ``file_ids`` (the first MAX_MATCH_ROWS of them)."""
+        if self.selection is None: return
+        if self.matches is None: self._tree_state = self._save_tree_state()
+        self.matches = file_ids
+        self.tree.delete(*self.tree.get_children())
+        for file_id in file_ids[:MAX_MATCH_ROWS]:
+            state = STATE_ALL if self.selection.is_checked(file_id) else STATE_NONE
+            self.tree.insert("", tk.END, iid=self.file_iid(file_id), text=f" {self.selection.rel_paths[file_id]}", image=self.images[state],
+                             values=self._file_values(file_id))
+        if len(file_ids) > MAX_MATCH_ROWS:
+            self.tree.insert("", tk.END, text=f" ... {len(file_ids) - MAX_MATCH_ROWS} more match(es) not listed")
+        elif not file_ids:
+            self.tree.insert("", tk.END, text=" No matching files.")
+        self.tree.yview_moveto(0)
+
+    def clear_matches(self):
+        """Leaves the filtered list and shows the tree again, as it was before filtering."""
+        if self.matches is None or self.selection is None: return
+        self._restore_tree(self.selection, self._tree_state)
+
+    def _dir_values(self, node):
+        return (format_stats(*self.selection.dir_stats(node)),) if self.selection.has_stats() else ("",)
+
+    def _file_values(self, file_id):
+        return (format_stats(*self.selection.file_stats(file_id)),) if self.selection.has_stats() else ("",)
+
+    def _populate(self, parent_iid, node):
+        for child in node.subdirs.values():
+            iid = self.dir_iid(child)
+            self.tree.insert(parent_iid, tk.END, iid=iid, text=f" {child.name}/", image=self.images[self.selection.dir_state(child)],
+                             values=self._dir_values(child))
+            self.tree.insert(iid, tk.END, iid=iid + PLACEHOLDER_SUFFIX)
+        for file_id in node.files:
+            state = STATE_ALL if self.selection.is_checked(file_id) else STATE_NONE
+            self.tree.insert(parent_iid, tk.END, iid=self.file_iid(file_id), text=f" {self.selection.file_name(file_id)}", image=self.images[state],
+                             values=self._file_values(file_id))
+
+    def refresh_stats(self):
+        """Redraws the size/token column of the existing rows (e.g. after exact counts replaced estimates)."""
+        if self.selection is None: return
+        stack = list(self.tree.get_children(""))
+        while stack:
+            iid = stack.pop()
+            if iid.startswith("f:"):
+                self.tree.item(iid, values=self._file_values(int(iid[2:])))
+            elif iid.startswith("d:") and not iid.endswith(PLACEHOLDER_SUFFIX):
+                self.tree.item(iid, values=self._dir_values(self._node_for(iid)))
+                stack.extend(self.tree.get_children(iid))
+
+    def on_open(self, event=None):
+        iid = self.tree.focus()
+        placeholder = iid + PLACEHOLDER_SUFFIX
+        if self.selection is not None and self.tree.exists(placeholder):
+            self.tree.delete(placeholder)
+            self._populate(iid, self._node_for(iid))
+
+    # --- Toggling ---
+    def on_click(self, event):
+        if self.selection is None: return
+        iid = self.tree.identify_row(event.y)
+        # Clicking the expand arrow opens/closes; clicking anywhere else on the row toggles it
+        if not iid or "indicator" in self.tree.identify_element(event.x, event.y): return
+        self.toggle(iid)
+
+    def on_space(self, event=None):
+        iid = self.tree.focus()
+        if self.selection is not None and iid: self.toggle(iid)
+        return "break"
+
+    def toggle(self, iid):
+        if iid.startswith("f:"):
+            file_id = int(iid[2:])
+            self.selection.toggle_file(file_id)
+            self._refresh_file(file_id)
+            self._refresh_ancestors(self.selection.file_dirs[file_id])
+        elif iid.startswith("d:"):
+            node = self._node_for(iid)
+            self.selection.toggle_dir(node)
+            self._refresh_subtree(iid)
+            self._refresh_ancestors(node.parent)
+        else:
+            return
+        if self.on_change is not None: self.on_change()
+
+    def set_all(self, value):
+        """Checks or unchecks every file, or only the filter's matches while a filter is shown."""
+        if self.selection is None: return
+        if self.matches is not None:
+            self.selection.set_files(self.matches, value)
+        else:
+            self.selection.set_all(value)
+        self._refresh_subtree("")
+        if self.on_change is not None: self.on_change()
+
+    # --- Redrawing (only rows that exist in Tk) ---
+    def _refresh_file(self, file_id):
+        iid = self.file_iid(file_id)
+        if self.tree.exists(iid):
+            state = STATE_ALL if self.selection.is_checked(file_id) else STATE_NONE
+            self.tree.item(iid, image=self.images[state])
+
+    def _refresh_dir(self, node):
+        iid = self.dir_iid(node)
+        if node.parent is not None and self.tree.exists(iid):
+            self.tree.item(iid, image=self.images[self.selection.dir_state(node)])
+
+    def _refresh_ancestors(self, node):
+        while node is not None:
+            self._refresh_dir(node)
+            node = node.parent
+
+    def _refresh_subtree(self, iid):
+        if iid:
+            node = self._node_for(iid)
+            if node is not None: self._refresh_dir(node)
+        stack = list(self.tree.get_children(iid))
+        while stack:
+            child = stack.pop()
+            if child.startswith("f:"):
+                self._refresh_file(int(child[2:]))
+            elif child.startswith("d:") and not child.endswith(PLACEHOLDER_SUFFIX):
+                self._refresh_dir(self._node_for(child))
+                stack.extend(self.tree.get_children(child))
@@ -0,0 +1,357 @@
+"""Which files and folders a scan keeps: extensions, globs and .gitignore rules.
+
+Everything is compiled once per scan. Extensions become a tuple for a single
+``str.endswith`` call, each glob list becomes one alternation regex and each
+.gitignore file becomes at most two regexes (or an ordered rule list when it
+uses ``!`` negation). The scanner asks ``FileFilter.directory(dir_path)`` for
+the rules of each directory it lists; those are built once per directory from
+the parent's, so the per-entry cost does not grow with the number of patterns.
+
+With .gitignore handling on, the sources git itself uses are read, lowest
+priority first: the ``core.excludesFile`` file (default
+``$XDG_CONFIG_HOME/git/ignore``), the repository's ``.git/info/exclude``,
+then every .gitignore from the work tree's top down. Git config ``include``
+directives are not followed when looking up ``core.excludesFile``.
+
+Glob syntax is gitignore-like: ``*`` and ``?`` stop at ``/``, ``**`` crosses
+directories, a pattern without ``/`` matches a name at any depth, one with
+``/`` is anchored at the scanned folder, and a trailing ``/`` restricts it to
+directories.
+"""
+import os
+import re
+
+from .errors import InputError
+
+GITIGNORE_NAME = ".gitignore"
+GLOB_CHARS = frozenset("*?[")
+
+
+def parse_extensions(extension_str):
+    """Parses ``".py, .pyi .toml"`` into a tuple of suffixes; raises InputError if one is malformed."""
+    extensions = tuple(dict.fromkeys(ext for ext in re.split(r"[\s,;]+", extension_str or "") if ext))
+    if not extensions or not all(ext.startswith('.') and len(ext) > 1 for ext in extensions):
+        raise InputError("Please enter valid file extensions (e.g., .py or .py, .pyi).", "Invalid extension format")
+    return extensions
+
+
+def parse_patterns(pattern_str):
+    """Parses a comma-separated list of folder names/globs."""
+    return [pattern.strip() for pattern in (pattern_str or "").split(',') if pattern.strip()]
+
+
+def split_excludes(patterns):
+    """Splits exclude entries into bare folder names (matched by name, as before) and globs."""
+    names, globs = set(), []
+    for pattern in patterns:
+        if '/' in pattern or GLOB_CHARS.intersection(pattern): globs.append(pattern)
+        else: names.add(pattern)
+    return names, globs
+
+
+def glob_to_regex(pattern):
+    """Translates one glob (without the directory-only ``/`` suffix) to a regex for paths relative to its base."""
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 2)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[0] in '!^': body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = j + 1
+                continue
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    regex = ''.join(out)
+    return regex if anchored else '(?:.*/)?' + regex
+
+
+def compile_globs(regexes):
+    """One regex matching any of ``regexes`` (full match), or None for an empty list."""
+    if not regexes: return None
+    return re.compile('|'.join(f'(?:{regex})' for regex in regexes), re.DOTALL).fullmatch
+
+
+class GlobSet:
+    """A list of globs compiled into a file matcher and a directory matcher."""
+
+    def __init__(self, patterns):
+        file_regexes, dir_regexes = [], []
+        for pattern in patterns:
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if not pattern: continue
+            regex = glob_to_regex(pattern)
+            dir_regexes.append(regex)
+            if not dir_only: file_regexes.append(regex)
+        self.match_file = compile_globs(file_regexes)
+        self.match_dir = compile_globs(dir_regexes)
+
+    def __bool__(self):
+        return self.match_dir is not None
+
+
+class GitIgnore:
+    """Rules of one .gitignore file; ``match`` paths are relative to the file's directory."""
+
+    def __init__(self, lines):
+        self.rules = [] # (fullmatch, negate, dir_only), in file order
+        regexes = [] # (regex, dir_only)
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'): continue
+            line = re.sub(r'(?<!\\) +$', '', line)
+            negate = line.startswith('!')
+            if negate: line = line[1:]
+            elif line.startswith(('\\!', '\\#')): line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line: continue
+            regex = glob_to_regex(line)
+            regexes.append((regex, dir_only))
+            self.rules.append((re.compile(regex, re.DOTALL).fullmatch, negate, dir_only))
+        # Without negations the order does not matter: any match ignores, so use one regex per kind
+        self.simple = not any(negate for _, negate, _ in self.rules)
+        if self.simple:
+            self.match_file = compile_globs([regex for regex, dir_only in regexes if not dir_only])
+            self.match_dir = compile_globs([regex for regex, _ in regexes])
+
+    @classmethod
+    def load(cls, dir_path):
+        """Returns the GitIgnore of ``dir_path``, or None if it has no (readable) .gitignore."""
+        return cls.load_file(os.path.join(dir_path, GITIGNORE_NAME))
+
+    @classmethod
+    def load_file(cls, path):
+        """Returns the rules in the ignore file ``path`` (e.g. .git/info/exclude), or None if it is missing or empty."""
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                rules = cls(f)
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, rel_path, is_dir):
+        """True if ignored, False if re-included by a ``!`` rule, None if no rule applies."""
+        if self.simple:
+            match = self.match_dir if is_dir else self.match_file
+            return True if match is not None and match(rel_path) else None
+        for match, negate, dir_only in reversed(self.rules):
+            if dir_only and not is_dir: continue
+            if match(rel_path): return not negate
+        return None
+
+
+def _git_dir(top):
+    """The git directory of the work tree at ``top``: ``.git`` itself, or where a ``.git`` file (worktree, submodule) points."""
+    dot_git = os.path.join(top, '.git')
+    if os.path.isdir(dot_git): return dot_git
+    try:
+        with open(dot_git, 'r', encoding='utf-8', errors='ignore') as f:
+            line = f.readline().strip()
+    except OSError:
+        return None
+    if not line.startswith('gitdir:'): return None
+    return os.path.join(top, line[len('gitdir:'):].strip())
+
+
+def _common_dir(git_dir):
+    """Where info/exclude and config live: a linked worktree's git dir names it in ``commondir``."""
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8', errors='ignore') as f:
+            return os.path.join(git_dir, f.readline().strip())
+    except OSError:
+        return git_dir
+
+
+def _config_excludes_file(config_path):
+    """The last ``core.excludesFile`` value set in one git config file, or None."""
+    value = None
+    section = None
+    try:
+        with open(config_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    section = line[1:line.find(']')].strip().lower() if ']' in line else None
+                    continue
+                if section != 'core' or '=' not in line: continue
+                key, _, raw = line.partition('=')
+                if key.strip().lower() == 'excludesfile':
+                    value = raw.split(' #')[0].split(' ;')[0].strip().strip('"')
+    except OSError:
+        pass
+    return value
+
+
+def _global_excludes_path(common_dir):
+    """Path of the ``core.excludesFile`` in effect for a repository (the repository's config wins over the user's)."""
+    xdg_config = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    value = None
+    for config_path in (os.path.join(xdg_config, 'git', 'config'), os.path.expanduser('~/.gitconfig'),
+                        os.path.join(common_dir, 'config')):
+        found = _config_excludes_file(config_path)
+        if found is not None: value = found
+    if value is None: return os.path.join(xdg_config, 'git', 'ignore')
+    return os.path.expanduser(value) if value else None
+
+
+def _repo_ignore_files(folder_path):
+    """Paths of the ignore files that apply to ``folder_path`` from outside it, whether they exist or not.
+
+    These are core.excludesFile, .git/info/exclude, and the .gitignore files of
+    the folders between the enclosing git work tree's top and ``folder_path``.
+    Returns ``[(path prefix of folder_path relative to the file's base folder,
+    path), ...]``, outermost (lowest priority) first, or [] when
+    ``folder_path`` is not inside a git work tree.
+    """
+    found = []
+    prefix = ''
+    current = os.path.abspath(folder_path)
+    while True:
+        if os.path.exists(os.path.join(current, '.git')):
+            # Both apply relative to the work tree's top, with less priority than any .gitignore
+            git_dir = _git_dir(current)
+            if git_dir is not None:
+                common_dir = _common_dir(git_dir)
+                for path in (os.path.join(common_dir, 'info', 'exclude'), _global_excludes_path(common_dir)):
+                    if path: found.append((prefix, path))
+            found.reverse()
+            return found
+        parent = os.path.dirname(current)
+        if parent == current: return []
+        prefix = os.path.basename(current) + '/' + prefix
+        found.append((prefix, os.path.join(parent, GITIGNORE_NAME)))
+        current = parent
+
+
+def _find_repo_gitignores(folder_path):
+    """The rules of the existing _repo_ignore_files: ``[(prefix, GitIgnore), ...]``, outermost first."""
+    found = []
+    for prefix, path in _repo_ignore_files(folder_path):
+        rules = GitIgnore.load_file(path)
+        if rules is not None: found.append((prefix, rules))
+    return found
+
+
+class DirectoryFilter:
+    """The rules in effect inside one directory."""
+
+    def __init__(self, file_filter, rel_dir, gitignores):
+        self.file_filter = file_filter
+        self.rel_dir = rel_dir # relative to the scanned folder, '/'-separated with a trailing '/', '' for the root
+        self.gitignores = gitignores # ((strip, prefix, GitIgnore), ...) outermost first
+        self.extensions = file_filter.extensions
+        if not (gitignores or file_filter.has_path_rules):
+            self.keep_file = self._keep_file_by_extension
+
+    def _keep_file_by_extension(self, name):
+        return name.endswith(self.extensions)
+
+    def _ignored(self, rel_path, is_dir):
+        # The deepest .gitignore with an opinion decides
+        for strip, prefix, rules in reversed(self.gitignores):
+            verdict = rules.match(prefix + rel_path[strip:], is_dir)
+            if verdict is not None: return verdict
+        return False
+
+    def keep_file(self, name):
+        if not name.endswith(self.extensions): return False
+        rel_path = self.rel_dir + name
+        file_filter = self.file_filter
+        if file_filter.exclude.match_file is not None and file_filter.exclude.match_file(rel_path): return False
+        if file_filter.include.match_file is not None and not file_filter.include.match_file(rel_path): return False
+        return not (self.gitignores and self._ignored(rel_path, False))
+
+    def keep_dir(self, name):
+        """Whether to descend into subdirectory ``name`` (hidden and excluded folders are pruned here)."""
+        if name.startswith('.') or name in self.file_filter.excluded_names: return False
+        if not (self.gitignores or self.file_filter.exclude): return True
+        rel_path = self.rel_dir + name
+        if self.file_filter.exclude and self.file_filter.exclude.match_dir(rel_path): return False
+        return not (self.gitignores and self._ignored(rel_path, True))
+
+
+class FileFilter:
+    """Compiled scan rules for the tree under ``folder_path``.
+
+    ``extensions`` is a suffix or an iterable of suffixes. ``excluded`` mixes
+    bare folder names (pruned wherever they occur, as before) and globs
+    (matched against paths relative to ``folder_path``; files and folders).
+    When ``include`` globs are given, only files matching one of them are
+    kept. With ``use_gitignore``, .gitignore files inside the tree and those
+    between it and its git work tree's top are honoured, as are
+    .git/info/exclude and core.excludesFile.
+    """
+
+    def __init__(self, folder_path, extensions, excluded=(), include=(), use_gitignore=False):
+        self.folder_path = folder_path
+        self.extensions = (extensions,) if isinstance(extensions, str) else tuple(extensions)
+        names, globs = split_excludes(excluded)
+        self.excluded_names = frozenset(names)
+        self.exclude = GlobSet(globs)
+        self.include = GlobSet(include)
+        self.has_path_rules = bool(self.exclude or self.include)
+        self.use_gitignore = use_gitignore
+        self._dirs = {} # dir path -> DirectoryFilter
+
+    @classmethod
+    def from_strings(cls, folder_path, extension_str, exclude_str="", include_str="", use_gitignore=False):
+        """Builds a filter from the comma-separated text fields of the GUI/CLI; raises InputError."""
+        return cls(folder_path, parse_extensions(extension_str), parse_patterns(exclude_str), parse_patterns(include_str), use_gitignore)
+
+    def describe(self):
+        return ", ".join(self.extensions)
+
+    def directory(self, dir_path):
+        """Returns the DirectoryFilter for ``dir_path`` (which must be ``folder_path`` or below it)."""
+        rules = self._dirs.get(dir_path)
+        if rules is not None: return rules
+        parent = os.path.dirname(dir_path)
+        if dir_path == self.folder_path or parent == dir_path:
+            rel_dir = ''
+            gitignores = tuple((0, prefix, ignore) for prefix, ignore in _find_repo_gitignores(dir_path)) if self.use_gitignore else ()
+        else:
+            parent_rules = self.directory(parent)
+            rel_dir = parent_rules.rel_dir + os.path.basename(dir_path) + '/'
+            gitignores = parent_rules.gitignores
+        if self.use_gitignore:
+            own = GitIgnore.load(dir_path)
+            if own is not None: gitignores = gitignores + ((len(rel_dir), '', own),)
+        rules = self._dirs[dir_path] = DirectoryFilter(self, rel_dir, gitignores)
+        return rules
+
+    def outer_ignore_files(self):
+        """Ignore files outside the tree whose rules apply in it (existing or not), for watchers; [] without .gitignore handling."""
+        if not self.use_gitignore: return []
+        return [path for _, path in _repo_ignore_files(self.folder_path)]
+
+    def forget(self, dir_path):
+        """Drops the cached rules of ``dir_path`` and below (e.g. after its .gitignore changed)."""
+        prefix = os.path.join(dir_path, '')
+        for path in [p for p in self._dirs if p == dir_path or p.startswith(prefix)]:
+            del self._dirs[path]
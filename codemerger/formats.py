@@ -0,0 +1,299 @@
+"""Output formats for saving a merge: plain text, JSON Lines and tar, optionally compressed.
+
+Every writer makes a single pass over the files, reading each one once and
+streaming it straight into the (possibly compressed) output:
+
+* ``text``  - the usual ``--- File: ... ---`` blocks (streamcopy.write_merge_stream)
+* ``jsonl`` - a header line, then one JSON object per file with its relative
+              path, size on disk, SHA-256 of the raw bytes and the normalized
+              content, so pipelines never have to re-parse block markers.
+              read_jsonl reads it back one record at a time (e.g. to rebuild a
+              preview selection).
+* ``tar``   - the raw source files under their relative paths; duplicates
+              become hard links to their first copy.
+
+Compression is ``gzip`` (stdlib) or ``zstd`` (needs the optional
+``zstandard`` package). Format and compression are inferred from the output
+name (``out.jsonl.gz``, ``src.tar.zst``, ``merged.txt``) unless given.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+
+from .core import DEFAULT_MAX_BUFFERED_BYTES, MergeResult, check_cancelled, iter_contents, relative_path, truncation_point
+from .decoding import decode_bytes
+from .errors import InputError
+from .streamcopy import COPY_CHUNK_SIZE, write_merge_stream
+
+TEXT = "text"
+JSONL = "jsonl"
+TAR = "tar"
+FORMATS = (TEXT, JSONL, TAR)
+
+GZIP = "gzip"
+ZSTD = "zstd"
+COMPRESSIONS = ("none", GZIP, ZSTD)
+
+JSONL_VERSION = 1
+GZIP_LEVEL = 6 # gzip(1)'s default; 9 is several times slower for a few percent
+ZSTD_LEVEL = 3
+TAR_SPOOL_BYTES = 8 * 1024 * 1024 # Tar members up to this size are staged in memory, larger ones in a temp file
+
+_COMPRESSION_SUFFIXES = {".gz": GZIP, ".gzip": GZIP, ".zst": ZSTD, ".zstd": ZSTD}
+_FORMAT_SUFFIXES = {".jsonl": JSONL, ".ndjson": JSONL, ".tar": TAR}
+_SHORT_SUFFIXES = {".tgz": (TAR, GZIP), ".tzst": (TAR, ZSTD)}
+
+
+def detect_format(output_path):
+    """``(format, compression or None)`` implied by a file name; plain text if nothing matches."""
+    root, ext = os.path.splitext(output_path.lower())
+    if ext in _SHORT_SUFFIXES: return _SHORT_SUFFIXES[ext]
+    compression = _COMPRESSION_SUFFIXES.get(ext)
+    if compression is not None: root, ext = os.path.splitext(root)
+    return _FORMAT_SUFFIXES.get(ext, TEXT), compression
+
+
+def output_suffix(fmt=TEXT, compression=None):
+    """File name suffix detect_format maps back to ``fmt`` and ``compression``, e.g. '.jsonl.gz'."""
+    suffix = {TEXT: ".txt", JSONL: ".jsonl", TAR: ".tar"}[fmt or TEXT]
+    if compression == GZIP: suffix += ".gz"
+    elif compression == ZSTD: suffix += ".zst"
+    return suffix
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise InputError("zstd compression needs the optional 'zstandard' package.", "zstandard not installed") from None
+    return zstandard
+
+
+def check_compression(compression):
+    """Raises InputError if ``compression`` is unknown or its package is missing."""
+    if compression in (None, "none", GZIP): return
+    if compression == ZSTD:
+        _zstandard()
+        return
+    raise InputError(f"Unknown compression '{compression}' (expected one of {', '.join(COMPRESSIONS)}).", "Unknown compression")
+
+
+def open_output(output_path, compression=None):
+    """Opens ``output_path`` for binary writing through the given compression (None or 'none' for plain)."""
+    check_compression(compression)
+    if compression == GZIP: return gzip.open(output_path, 'wb', compresslevel=GZIP_LEVEL)
+    if compression == ZSTD: return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(open(output_path, 'wb'), closefd=True)
+    return open(output_path, 'wb')
+
+
+def wrap_output(raw, compression=None):
+    """Compressing writer over the open binary stream ``raw`` (e.g. stdout); closing it leaves ``raw`` open."""
+    check_compression(compression)
+    if compression == GZIP: return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL)
+    if compression == ZSTD: return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+    return None
+
+
+def open_input(input_path):
+    """Opens a possibly compressed file (by its suffix) for binary reading."""
+    _, compression = detect_format(input_path)
+    if compression == GZIP: return gzip.open(input_path, 'rb')
+    if compression == ZSTD:
+        zstandard = _zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(open(input_path, 'rb'), closefd=True)
+    return open(input_path, 'rb')
+
+
+# --- JSON Lines ---
+
+def read_record(file_path, st=None, limit=None, on_decode=None):
+    """Reads a file once for the JSONL writer: ``(size, sha256 hex, content, omitted bytes)``.
+
+    The whole file is hashed; with ``limit`` only its head is decoded (cut at
+    a line break, as the text writers do) and ``omitted`` says how much was dropped.
+    ``on_decode(path)`` is told the decoding path (see decoding.PATHS).
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if limit is None or size <= limit:
+            data = f.read()
+            digest.update(data)
+            content, path = decode_bytes(data)
+            if on_decode is not None: on_decode(path)
+            return len(data), digest.hexdigest(), content, 0
+        head = f.read(limit)
+        digest.update(head)
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    cut = truncation_point(head, size, limit)
+    content, path = decode_bytes(head[:cut])
+    if on_decode is not None: on_decode(path)
+    return size, digest.hexdigest(), content, size - cut
+
+
+def _encode_line(obj):
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def write_merge_jsonl(file_paths, folder_path, out, on_file=None, cancel=None, plan=None, workers=1,
+                      max_buffered_bytes=DEFAULT_MAX_BUFFERED_BYTES, on_decode=None):
+    """Writes the JSON Lines format to the binary stream ``out``; reads overlap with ``workers > 1``."""
+    aliases = plan.aliases if plan is not None else {}
+    limits = plan.limits if plan is not None else {}
+    result = MergeResult()
+    out.write(_encode_line({"codemerger": JSONL, "version": JSONL_VERSION, "root": os.path.abspath(folder_path)}))
+    reader = lambda file_path, st=None: read_record(file_path, st, limits.get(file_path), on_decode)
+    for file_path, record, error in iter_contents(file_paths, workers, max_buffered_bytes, cancel, reader):
+        rel_path = relative_path(file_path, folder_path).replace(os.sep, "/")
+        if error is not None:
+            out.write(_encode_line({"path": rel_path, "error": str(error)}))
+            result.fail(file_path, error)
+        else:
+            size, sha256, content, omitted = record
+            entry = {"path": rel_path, "size": size, "sha256": sha256, "content": content}
+            if file_path in aliases: entry["duplicates"] = [alias.replace(os.sep, "/") for alias in aliases[file_path]]
+            if omitted: entry["truncated"] = omitted
+            out.write(_encode_line(entry))
+            result.processed += 1
+        if on_file is not None: on_file(file_path, error is None)
+    return result
+
+
+class JsonlArchive:
+    """A JSONL merge opened by read_jsonl: ``root`` plus its file records, parsed lazily.
+
+    Each ``records()`` call reads the file again and yields one dict per file
+    record, in output order, so only one file's content is held at a time.
+    """
+
+    def __init__(self, input_path, root):
+        self.input_path = input_path
+        self.root = root
+
+    def records(self):
+        with open_input(self.input_path) as f:
+            next(f, None) # Header, checked by read_jsonl
+            for line in f:
+                if line.strip(): yield json.loads(line)
+
+    def full_path(self, rel_path):
+        return os.path.join(self.root, *rel_path.split("/"))
+
+    def file_paths(self, include_duplicates=True):
+        """Full paths of every file in the merge (readable ones, plus their collapsed duplicates)."""
+        paths = []
+        for record in self.records():
+            if "error" in record: continue
+            paths.append(self.full_path(record["path"]))
+            if include_duplicates: paths.extend(self.full_path(alias) for alias in record.get("duplicates", ()))
+        return paths
+
+
+def read_jsonl(input_path):
+    """Opens a file written by write_merge_jsonl (optionally compressed); raises InputError if it is not one.
+
+    Only the header is read here; the records are parsed as JsonlArchive.records() is iterated.
+    """
+    with open_input(input_path) as f:
+        try:
+            header = json.loads(f.readline() or b"null")
+        except ValueError:
+            header = None
+    if not isinstance(header, dict) or header.get("codemerger") != JSONL:
+        raise InputError(f"{input_path} is not a CodeMerger JSONL file.", "Not a CodeMerger JSONL file")
+    if header.get("version", 0) > JSONL_VERSION:
+        raise InputError(f"{input_path} was written by a newer CodeMerger (format version {header['version']}).",
+                         "Unsupported JSONL version")
+    return JsonlArchive(input_path, header["root"])
+
+
+# --- Tar ---
+
+def _read_payload(f, size):
+    """Copies up to ``size`` bytes of ``f`` into a spooled temp file; returns it (rewound) and the bytes copied."""
+    payload = tempfile.SpooledTemporaryFile(max_size=TAR_SPOOL_BYTES)
+    copied = 0
+    try:
+        while copied < size:
+            chunk = f.read(min(COPY_CHUNK_SIZE, size - copied))
+            if not chunk: break # Shrunk since the stat: store what is there
+            payload.write(chunk)
+            copied += len(chunk)
+    except BaseException:
+        payload.close()
+        raise
+    payload.seek(0)
+    return payload, copied
+
+
+def write_merge_tar(file_paths, folder_path, out, on_file=None, cancel=None, plan=None):
+    """Writes the files themselves (raw bytes) as a tar stream to the binary stream ``out``.
+
+    Truncated files keep their head up to the cut and carry a pax ``comment``
+    saying how many bytes were dropped. Each file is read in full (into
+    memory, or a temp file above TAR_SPOOL_BYTES) before its header is
+    written, so a file that fails or shrinks mid-read never leaves a broken
+    member behind: unreadable files are left out and counted as errors.
+    """
+    aliases = plan.aliases if plan is not None else {}
+    limits = plan.limits if plan is not None else {}
+    result = MergeResult()
+    with tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        for file_path in file_paths:
+            check_cancelled(cancel)
+            rel_path = relative_path(file_path, folder_path).replace(os.sep, "/")
+            try:
+                with open(file_path, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    size = st.st_size
+                    limit = limits.get(file_path)
+                    truncated = limit is not None and size > limit
+                    if truncated:
+                        size = truncation_point(f.read(limit), st.st_size, limit)
+                        f.seek(0)
+                    payload, copied = _read_payload(f, size)
+            except OSError as e:
+                result.fail(file_path, e)
+                if on_file is not None: on_file(file_path, False)
+                continue
+            with payload:
+                info = tarfile.TarInfo(rel_path)
+                info.size, info.mtime, info.mode = copied, int(st.st_mtime), 0o644
+                if truncated:
+                    info.pax_headers = {"comment": f"codemerger: truncated, {st.st_size - copied} more bytes"}
+                tar.addfile(info, payload)
+            for alias in aliases.get(file_path, ()):
+                link = tarfile.TarInfo(alias.replace(os.sep, "/"))
+                link.type, link.linkname, link.mtime, link.mode = tarfile.LNKTYPE, rel_path, info.mtime, info.mode
+                tar.addfile(link)
+            result.processed += 1
+            if on_file is not None: on_file(file_path, True)
+    return result
+
+
+# --- Dispatch ---
+
+def write_merge_format(file_paths, folder_path, out, fmt=TEXT, on_file=None, cancel=None, plan=None, workers=1, on_decode=None):
+    """Writes ``fmt`` ('text', 'jsonl' or 'tar') to the binary stream ``out``; returns a MergeResult.
+
+    ``on_decode(path)`` counts decoding paths for the formats that decode (not tar, which stores raw bytes).
+    """
+    if fmt == TEXT: return write_merge_stream(file_paths, folder_path, out, on_file=on_file, cancel=cancel, plan=plan, on_decode=on_decode)
+    if fmt == JSONL:
+        return write_merge_jsonl(file_paths, folder_path, out, on_file=on_file, cancel=cancel, plan=plan, workers=workers, on_decode=on_decode)
+    if fmt == TAR: return write_merge_tar(file_paths, folder_path, out, on_file=on_file, cancel=cancel, plan=plan)
+    raise InputError(f"Unknown output format '{fmt}' (expected one of {', '.join(FORMATS)}).", "Unknown format")
+
+
+def save_merge(file_paths, folder_path, output_path, fmt=None, compression=None, on_file=None, cancel=None, plan=None, workers=1,
+               on_decode=None):
+    """Writes the merge to ``output_path``; format/compression default to what the file name implies."""
+    detected_fmt, detected_compression = detect_format(output_path)
+    fmt = fmt or detected_fmt
+    compression = compression or detected_compression
+    with open_output(output_path, compression) as out:
+        return write_merge_format(file_paths, folder_path, out, fmt, on_file, cancel, plan, workers, on_decode)
@@ -0,0 +1,100 @@
+"""Merge output spooled to a temp file and read back through mmap, a line range at a time.
+
+A Tk Text widget holding a whole large merge costs tens of seconds and
+gigabytes of RAM, so merges past the inline limit are written to a temp file
+instead (MergeSpool). MappedOutput maps that file and keeps an index of where
+every line starts, so any range of lines can be decoded on demand without
+reading the rest; the GUI (outputview.LazyOutputView) keeps only the visible
+lines plus a margin in the widget. The block starts recorded while writing
+(each ``--- File:`` header's byte offset and line) make the file-jump index.
+Nothing here imports tkinter.
+"""
+import array
+import mmap
+import os
+import tempfile
+from itertools import accumulate
+
+INDEX_CHUNK_SIZE = 4 * 1024 * 1024 # Bytes scanned per step when indexing line starts
+
+
+def index_line_starts(data):
+    """``array('Q')`` of the byte offset of every line in ``data`` (bytes or mmap); the first is 0."""
+    starts = array.array('Q', [0])
+    for offset in range(0, len(data), INDEX_CHUNK_SIZE):
+        pieces = data[offset:offset + INDEX_CHUNK_SIZE].split(b"\n")
+        pieces.pop() # Text after the chunk's last newline continues in the next chunk
+        positions = accumulate((len(piece) + 1 for piece in pieces), initial=offset)
+        next(positions) # The chunk's own start is only a line start if the previous chunk ended one
+        starts.extend(positions)
+    return starts
+
+
+class MergeSpool:
+    """Writes merged blocks to a temp file, recording where each file's block starts.
+
+    ``blocks`` is ``[(full path, byte offset, 0-based line), ...]`` in output
+    order. finish() turns the spool into a MappedOutput; discard() deletes it.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix="codemerger-output-", suffix=".txt", dir=directory)
+        self.file = os.fdopen(fd, 'wb')
+        self.blocks = []
+        self.size = 0
+        self.lines = 0 # Newlines written so far, i.e. the 0-based line being written
+
+    def _write(self, text):
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.size += len(data)
+        self.lines += text.count("\n")
+
+    def add_block(self, file_path, block):
+        """Appends one ``--- File: ... ---`` block, separated from the previous one by a newline."""
+        if self.blocks: self._write("\n")
+        self.blocks.append((file_path, self.size, self.lines))
+        self._write(block)
+
+    def finish(self):
+        self.file.close()
+        return MappedOutput(self.path, self.blocks)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class MappedOutput:
+    """A spooled merge, memory-mapped read-only; close() unmaps and deletes the temp file."""
+
+    def __init__(self, path, blocks):
+        self.path = path
+        self.blocks = blocks
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file; an empty bytes object behaves the same here
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.line_starts = index_line_starts(self.data)
+
+    @property
+    def line_count(self):
+        return len(self.line_starts)
+
+    def lines(self, start, end):
+        """Text of lines ``start`` up to (not including) ``end``, 0-based, with their line breaks."""
+        start = max(0, min(start, self.line_count))
+        end = max(start, min(end, self.line_count))
+        stop = self.line_starts[end] if end < self.line_count else self.size
+        return self.data[self.line_starts[start]:stop].decode('utf-8', errors='replace')
+
+    def close(self):
+        if self.size: self.data.close()
+        self._file.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
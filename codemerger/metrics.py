@@ -0,0 +1,341 @@
+"""Phase timings, read latency histograms and profiling for one scan/merge run.
+
+A RunMetrics is filled in as a run goes: ``with metrics.phase("read"):``
+blocks accumulate wall time per phase, ``metrics.reader(reader)`` wraps a
+merge reader to record each file's read latency, and counters track files,
+bytes, skipped and errored files, and ``count_decode`` tallies files per
+decoding path (see decoding.py). Phases of a run:
+
+* ``walk``     - listing directories (scan time minus ``filter``)
+* ``filter``   - extension/exclude/glob/.gitignore decisions (see
+                 InstrumentedFilter); only split out of ``walk`` with
+                 ``filter_timing``, as timing every decision slows the scan
+* ``analyze``  - pre-merge checks (analysis.analyze_files)
+* ``read``     - reading and decoding files, summed over the read pool's
+                 threads (so it can exceed the run's wall time)
+* ``assemble`` - building the merged blocks in order, including waiting on reads
+* ``render``   - filling the GUI's file list or output area
+* ``save``     - writing the output file(s)
+
+``MetricsLog`` appends each finished run to a JSON lines file, and
+``ProfileCapture`` runs cProfile and tracemalloc around a single run. Nothing
+here imports tkinter; the GUI shows ``RunMetrics.summary_lines()``.
+"""
+import cProfile
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from .core import read_file
+from .decoding import PATHS
+
+PHASES = ("walk", "filter", "analyze", "read", "assemble", "render", "save")
+HISTOGRAM_BUCKETS = 24 # Power-of-two microsecond buckets: <1us ... >=2**23 us (~8 s)
+PROFILE_TOP_ALLOCATIONS = 25
+
+
+class LatencyHistogram:
+    """Counts of durations in power-of-two microsecond buckets; cheap enough to record every file."""
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = int(seconds * 1_000_000)
+        self.counts[min(micros.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.total += 1
+        if seconds > self.max: self.max = seconds
+
+    @staticmethod
+    def bucket_limit(index):
+        """Upper bound of bucket ``index`` in seconds."""
+        return (1 << index) / 1_000_000
+
+    def percentile(self, p):
+        """Upper bound (seconds) of the bucket holding the ``p``-th percentile, or 0.0 if empty."""
+        if not self.total: return 0.0
+        rank = p / 100 * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank: return min(self.bucket_limit(index), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.total,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p90_ms": round(self.percentile(90) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            # Upper bound in microseconds -> files, non-empty buckets only
+            "buckets_us": {str(1 << index): count for index, count in enumerate(self.counts) if count},
+        }
+
+
+class _TimedRules:
+    """A DirectoryFilter whose keep_file/keep_dir calls add to ``seconds``."""
+
+    __slots__ = ("rules", "seconds")
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.seconds = 0.0
+
+    def keep_file(self, name):
+        start = time.perf_counter()
+        keep = self.rules.keep_file(name)
+        self.seconds += time.perf_counter() - start
+        return keep
+
+    def keep_dir(self, name):
+        start = time.perf_counter()
+        keep = self.rules.keep_dir(name)
+        self.seconds += time.perf_counter() - start
+        return keep
+
+
+class InstrumentedFilter:
+    """Wraps a filters.FileFilter to measure the time spent deciding what to keep.
+
+    Each directory is scanned by a single thread, so its rules object can sum
+    its own time without locking; ``seconds`` adds them up afterwards.
+    """
+
+    def __init__(self, file_filter):
+        self.file_filter = file_filter
+        self._rules = []
+        self._setup_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.file_filter, name)
+
+    def directory(self, dir_path):
+        start = time.perf_counter()
+        rules = _TimedRules(self.file_filter.directory(dir_path))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._setup_seconds += elapsed # Compiling rules, loading .gitignore files
+            self._rules.append(rules)
+        return rules
+
+    @property
+    def seconds(self):
+        with self._lock:
+            return self._setup_seconds + sum(rules.seconds for rules in self._rules)
+
+
+class RunMetrics:
+    """Everything measured during one run (``operation``: 'preview', 'combine', 'save', 'copy', ...)."""
+
+    def __init__(self, operation, folder_path=None, filter_timing=False):
+        self.operation = operation
+        self.folder_path = folder_path
+        self.filter_timing = filter_timing # Whether scans time the filter separately (two clock reads per entry)
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.phases = {} # phase name -> seconds
+        self.counts = {"files": 0, "bytes": 0, "skipped": 0, "duplicates": 0, "errors": 0}
+        self.read_latency = LatencyHistogram()
+        self.decode_paths = {} # decoding path (decoding.PATHS, or 'cached') -> files
+        self.wall_seconds = None
+        self.profile_paths = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def count_decode(self, path):
+        """``on_decode`` callback for readers and writers: counts files per decoding path."""
+        with self._lock:
+            self.decode_paths[path] = self.decode_paths.get(path, 0) + 1
+
+    def scan(self, func, file_filter):
+        """Runs ``func(filter)`` (a find_files call) and splits its time into walk and filter."""
+        if not self.filter_timing:
+            with self.phase("walk"):
+                return func(file_filter)
+        instrumented = InstrumentedFilter(file_filter)
+        start = time.perf_counter()
+        try:
+            return func(instrumented)
+        finally:
+            self._add_scan_time(time.perf_counter() - start, instrumented)
+
+    def iter_scan(self, func, file_filter):
+        """Like scan, for a lazy ``func(filter)`` (an iter_files call): only time spent producing paths counts."""
+        instrumented = InstrumentedFilter(file_filter) if self.filter_timing else None
+        iterator = iter(func(instrumented or file_filter))
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    file_path = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield file_path
+        finally:
+            self._add_scan_time(elapsed, instrumented)
+
+    def _add_scan_time(self, elapsed, instrumented):
+        filter_seconds = instrumented.seconds if instrumented is not None else 0.0
+        if instrumented is not None: self.add_time("filter", filter_seconds)
+        self.add_time("walk", max(0.0, elapsed - filter_seconds))
+
+    def reader(self, reader=None):
+        """Wraps a merge ``reader`` to record per-file latency, bytes and errors (thread-safe).
+
+        The default is core.read_file reporting its decoding paths here; pass
+        a reader built with ``on_decode=self.count_decode`` to keep that.
+        """
+        if reader is None: reader = functools.partial(read_file, on_decode=self.count_decode)
+        def timed_read(file_path, st=None, limit=None):
+            start = time.perf_counter()
+            try:
+                content = reader(file_path, st) if limit is None else reader(file_path, st, limit=limit)
+            except Exception:
+                self.add_time("read", time.perf_counter() - start)
+                self.count("errors")
+                raise
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases["read"] = self.phases.get("read", 0.0) + elapsed
+                self.read_latency.record(elapsed)
+                self.counts["files"] += 1
+                # Encoded size (str.isascii is O(1), so ASCII content is not encoded just to measure it)
+                self.counts["bytes"] += len(content) if content.isascii() else len(content.encode("utf-8"))
+            return content
+        return timed_read
+
+    def add_analysis(self, analysis):
+        """Counts the files analysis.analyze_files left out of the merge."""
+        self.count("skipped", len(analysis.skipped()))
+        self.count("duplicates", analysis.action_counts["alias"])
+
+    def finish(self):
+        """Stops the run clock (idempotent: the first call wins)."""
+        if self.wall_seconds is None: self.wall_seconds = time.perf_counter() - self._start
+        return self
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "operation": self.operation,
+                "folder": self.folder_path,
+                "started": self.started.isoformat(timespec="milliseconds"),
+                "wall_s": round(self.wall_seconds, 6) if self.wall_seconds is not None else None,
+                "phases_s": {name: round(self.phases[name], 6) for name in _phase_order(self.phases)},
+                "counts": dict(self.counts),
+                "decoding": dict(self.decode_paths),
+                "read_latency": self.read_latency.to_dict(),
+                "profile": list(self.profile_paths),
+            }
+
+    def summary_lines(self):
+        """Human-readable lines for the stats panel / stderr."""
+        lines = [f"{self.operation}: {self.wall_seconds or 0:.3f} s wall"]
+        with self._lock:
+            phases = [(name, self.phases[name]) for name in _phase_order(self.phases)]
+            counts = dict(self.counts)
+            histogram = self.read_latency
+            decode_paths = dict(self.decode_paths)
+            if phases:
+                lines.append("  ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in phases))
+            found = f"{counts['found']} file(s) found, " if "found" in counts else ""
+            lines.append(f"{found}{counts['files']} file(s) read, {counts['bytes'] / (1024 * 1024):.2f} MB, "
+                         f"{counts['skipped']} skipped, {counts['duplicates']} duplicate(s), {counts['errors']} error(s)")
+            if histogram.total:
+                lines.append(f"read latency p50 {histogram.percentile(50) * 1000:.2f} ms, p90 {histogram.percentile(90) * 1000:.2f} ms, "
+                             f"p99 {histogram.percentile(99) * 1000:.2f} ms, max {histogram.max * 1000:.2f} ms")
+        if decode_paths:
+            ordered = [path for path in PATHS if path in decode_paths] + sorted(path for path in decode_paths if path not in PATHS)
+            lines.append("decoding: " + ", ".join(f"{path} {decode_paths[path]}" for path in ordered))
+        lines.extend(f"profile: {path}" for path in self.profile_paths)
+        return lines
+
+
+def _phase_order(phases):
+    return [name for name in PHASES if name in phases] + sorted(name for name in phases if name not in PHASES)
+
+
+class MetricsLog:
+    """Appends finished runs to a JSON lines file, one object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, metrics):
+        line = json.dumps(metrics.finish().to_dict(), separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def default_metrics_log():
+    """MetricsLog at $CODEMERGER_METRICS_LOG, or None if that is unset."""
+    path = os.environ.get("CODEMERGER_METRICS_LOG")
+    return MetricsLog(path) if path else None
+
+
+class ProfileCapture:
+    """Opt-in cProfile + tracemalloc capture of a single run.
+
+    Used as a context manager on the thread doing the run. cProfile only sees
+    that thread; work done on the read/scan pools shows up as waiting there.
+    Writes ``<prefix>.prof`` (open with pstats or snakeviz) and
+    ``<prefix>.memory.txt`` (peak and top allocation sites) into ``directory``.
+    """
+
+    def __init__(self, directory, label, metrics=None):
+        self.directory = directory
+        self.label = label
+        self.metrics = metrics
+        self.profiler = cProfile.Profile()
+        self.paths = []
+
+    def __enter__(self):
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing: tracemalloc.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not self._was_tracing: tracemalloc.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        prefix = os.path.join(self.directory, f"codemerger-{self.label}-{stamp}")
+        self.profiler.dump_stats(prefix + ".prof")
+        with open(prefix + ".memory.txt", "w", encoding="utf-8") as f:
+            f.write(f"peak traced: {peak / (1024 * 1024):.2f} MB, still allocated: {current / (1024 * 1024):.2f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        self.paths = [prefix + ".prof", prefix + ".memory.txt"]
+        if self.metrics is not None: self.metrics.profile_paths.extend(self.paths)
+        return False
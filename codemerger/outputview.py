@@ -0,0 +1,199 @@
+"""Per-file block bookkeeping and windowed display for the output Text widget.
+
+Each ``--- File: ... ---`` block shown in the widget starts at a named mark,
+so a single block can be replaced, removed or inserted in place (live
+refresh) without regenerating or re-inserting the rest of the output.
+
+Merges too large to insert whole are spooled to disk
+(mappedoutput.MappedOutput) and shown by LazyOutputView, which keeps only
+the lines around the viewport in the widget and drives the scrollbar over
+the whole merge.
+"""
+
+WINDOW_MARGIN_LINES = 2000 # Lines kept loaded above and below the viewport
+RECENTER_LINES = WINDOW_MARGIN_LINES // 4 # Reload once the viewport gets this close to a loaded edge
+
+
+class OutputBlocks:
+    """Tracks where each file's block starts inside a tk.Text widget."""
+
+    def __init__(self, text):
+        self.text = text
+        self.marks = {} # full path -> mark name
+        self.order = [] # full paths in output order
+        self._next_id = 0
+
+    def __contains__(self, file_path):
+        return file_path in self.marks
+
+    def clear(self):
+        for mark in self.marks.values(): self.text.mark_unset(mark)
+        self.marks = {}
+        self.order = []
+
+    def _new_mark(self, file_path, index):
+        mark = f"block{self._next_id}"
+        self._next_id += 1
+        self.text.mark_set(mark, index)
+        self.marks[file_path] = mark
+        return mark
+
+    def load(self, block_lines):
+        """Marks the blocks of freshly inserted output; ``block_lines`` is ``[(path, first line), ...]``."""
+        self.clear()
+        for file_path, line in block_lines:
+            self._new_mark(file_path, f"{line}.0")
+            self.order.append(file_path)
+
+    def _end_of(self, position):
+        """Index just past the block at ``position`` in self.order (its trailing separator included)."""
+        if position + 1 < len(self.order):
+            return self.text.index(self.marks[self.order[position + 1]])
+        return self.text.index("end-1c")
+
+    # --- Edits (the caller makes the widget editable around these) ---
+    def replace(self, file_path, block):
+        position = self.order.index(file_path)
+        start = self.text.index(self.marks[file_path])
+        self.text.delete(start, self._end_of(position))
+        is_last = position == len(self.order) - 1
+        self.text.insert(start, block if is_last else block + "\n")
+        # The start mark has right gravity and was pushed past the new text; put it back
+        self.text.mark_set(self.marks[file_path], start)
+
+    def remove(self, file_path):
+        position = self.order.index(file_path)
+        start = self.text.index(self.marks[file_path])
+        if position == len(self.order) - 1 and position > 0:
+            start = self.text.index(f"{start}-1c") # Drop the separator before the new last block
+        self.text.delete(start, self._end_of(position))
+        self.text.mark_unset(self.marks.pop(file_path))
+        del self.order[position]
+
+    def insert(self, file_path, block, before=None):
+        """Adds a block in front of the block of ``before`` (a path already shown), or at the end."""
+        if before is not None and before in self.marks:
+            start = self.text.index(self.marks[before])
+            self.text.insert(start, block + "\n")
+            self.order.insert(self.order.index(before), file_path)
+        else:
+            start = self.text.index("end-1c")
+            if self.order:
+                self.text.insert(start, "\n")
+                start = self.text.index("end-1c")
+            self.text.insert(start, block)
+            self.order.append(file_path)
+        self._new_mark(file_path, start)
+
+    def apply(self, changes, include):
+        """Patches the shown output with a watch.Changes batch.
+
+        ``include(path)`` says whether a file belongs in the output after the
+        change. Shown blocks that no longer do are removed (deleted files,
+        files the analysis now skips or collapses), shown blocks with a new
+        block in ``changes.blocks`` are replaced, and included files not shown
+        yet are inserted at their scan-order position. Returns the number of blocks touched.
+        """
+        touched = 0
+        for file_path in [path for path in self.order if not include(path)]:
+            self.remove(file_path)
+            touched += 1
+        for file_path, block in changes.blocks.items():
+            if file_path in self.marks:
+                self.replace(file_path, block)
+                touched += 1
+        # The next already-shown file in scan order is the insertion point of each new block
+        next_shown = None
+        for file_path in reversed(changes.files):
+            if file_path not in self.marks and file_path in changes.blocks and include(file_path):
+                self.insert(file_path, changes.blocks[file_path], before=next_shown)
+                touched += 1
+            if file_path in self.marks:
+                next_shown = file_path
+        return touched
+
+
+class LazyOutputView:
+    """Shows a MappedOutput in a tk.Text a window of lines at a time.
+
+    Only the viewport plus WINDOW_MARGIN_LINES either side is inserted;
+    when scrolling brings the viewport near a loaded edge the window is
+    reloaded around it. While active the view takes over the widget's
+    yscrollcommand and the scrollbar's command, so the scrollbar spans the
+    whole merge; reset() hands them back.
+    """
+
+    def __init__(self, text, scrollbar):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.output = None
+        self.first = 0 # First loaded line of the output (0-based)
+        self.last = 0 # One past the last loaded line
+        self._recenter_pending = False
+
+    @property
+    def active(self):
+        return self.output is not None
+
+    def show(self, output, line=0):
+        """Displays ``output`` (a mappedoutput.MappedOutput) with 0-based ``line`` at the top."""
+        self.output = output
+        self.text.configure(yscrollcommand=self._on_text_scroll)
+        self.scrollbar.configure(command=self.yview)
+        self.go_to(line)
+
+    def reset(self):
+        """Detaches from the output (the caller closes it) and restores plain scrolling."""
+        self.output = None
+        self.first = self.last = 0
+        self.text.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.configure(command=self.text.yview)
+
+    def go_to(self, line):
+        """Scrolls so that 0-based output ``line`` is at the top, loading the window around it."""
+        line = max(0, min(line, self.output.line_count - 1))
+        self._load(line - WINDOW_MARGIN_LINES)
+        self.text.yview(f"{line - self.first + 1}.0")
+
+    def top_line(self):
+        """0-based output line at the top of the viewport."""
+        return self.first + int(self.text.index("@0,0").split(".")[0]) - 1
+
+    def _load(self, first):
+        visible = max(1, self.text.winfo_height() // 10) # Generous guess: no font is under 10 px tall
+        self.first = max(0, first)
+        self.last = min(self.output.line_count, self.first + 2 * WINDOW_MARGIN_LINES + visible)
+        window = self.output.lines(self.first, self.last)
+        if window.endswith("\n"): window = window[:-1] # The widget adds its own final newline
+        state = self.text.cget("state")
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", window)
+        self.text.configure(state=state)
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto' positions over the whole output, 'scroll' scrolls the widget."""
+        if not self.active: return
+        if args and args[0] == "moveto":
+            self.go_to(int(float(args[1]) * self.output.line_count))
+        else:
+            self.text.yview(*args) # Reaching a loaded edge recenters via _on_text_scroll
+
+    def _on_text_scroll(self, first, last):
+        """yscrollcommand: maps the widget's view onto the whole output for the scrollbar."""
+        if not self.active: return
+        loaded = self.last - self.first
+        top = self.first + float(first) * loaded
+        bottom = self.first + float(last) * loaded
+        total = self.output.line_count
+        self.scrollbar.set(top / total, bottom / total)
+        near_top = self.first > 0 and top - self.first < RECENTER_LINES
+        near_bottom = self.last < total and self.last - bottom < RECENTER_LINES
+        if (near_top or near_bottom) and not self._recenter_pending:
+            # Reloading from inside the widget's own scroll callback would re-enter it
+            self._recenter_pending = True
+            self.text.after_idle(self._recenter)
+
+    def _recenter(self):
+        self._recenter_pending = False
+        if self.active: self.go_to(self.top_line())
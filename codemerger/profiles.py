@@ -0,0 +1,130 @@
+"""Named merge profiles: everything needed to repeat a merge without the GUI.
+
+A profile records the target folder, extensions, excludes, include globs,
+.gitignore handling, the pre-merge check settings, where to write the output
+(and in which format and compression) and which files were unchecked in the
+preview. Unchecked files are stored rather than checked ones, so files added
+to the tree later are merged by default, just as a live refresh keeps them
+checked.
+
+Profiles live in one JSON file in the user config directory (see
+default_config_dir); batch.run_batch runs a list of them in parallel.
+"""
+import json
+import os
+import sys
+import tempfile
+
+from .core import DEFAULT_EXCLUDED_FOLDERS, DEFAULT_EXTENSION
+from .errors import InputError
+from .formats import output_suffix
+
+PROFILES_FILE = "profiles.json"
+
+
+def default_config_dir():
+    """Per-user config location (overridable with CODEMERGER_CONFIG_DIR)."""
+    override = os.environ.get("CODEMERGER_CONFIG_DIR")
+    if override: return override
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "CodeMerger")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Application Support/CodeMerger")
+    return os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "codemerger")
+
+
+class MergeProfile:
+    """One saved merge configuration; ``output`` None means '<name>.txt' in the batch output directory.
+
+    ``format`` and ``compression`` None mean whatever the output name implies
+    (formats.detect_format); without an output, the default name gets their
+    suffix instead of '.txt' (e.g. '<name>.jsonl.gz').
+    """
+
+    FIELDS = ("folder", "extension", "exclude", "include", "gitignore", "analyze", "max_file_kb", "output", "unchecked",
+              "format", "compression")
+
+    def __init__(self, name, folder, extension=DEFAULT_EXTENSION, exclude=DEFAULT_EXCLUDED_FOLDERS, include="",
+                 gitignore=False, analyze=False, max_file_kb=None, output=None, unchecked=(), format=None, compression=None):
+        self.name = name
+        self.folder = folder
+        self.extension = extension
+        self.exclude = exclude
+        self.include = include
+        self.gitignore = gitignore
+        self.analyze = analyze
+        self.max_file_kb = max_file_kb # None: analysis.DEFAULT_MAX_FILE_BYTES
+        self.output = output
+        self.unchecked = list(unchecked) # '/'-separated relative paths
+        self.format = format # formats.FORMATS
+        self.compression = compression # formats.GZIP, formats.ZSTD or None
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        if not isinstance(data, dict) or not data.get("folder"):
+            raise InputError(f"Profile '{name}' is missing its folder.", "Invalid profile")
+        return cls(name, **{field: data[field] for field in cls.FIELDS if field in data})
+
+    def output_path(self, output_dir="."):
+        """Where a batch run writes this profile's merge (relative outputs resolve against ``output_dir``)."""
+        output = self.output or safe_file_name(self.name) + output_suffix(self.format, self.compression)
+        return output if os.path.isabs(output) else os.path.join(output_dir, output)
+
+
+def safe_file_name(name):
+    return "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in name) or "profile"
+
+
+class ProfileStore:
+    """The profiles file: ``{name: profile fields}``, rewritten atomically on every change."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_config_dir(), PROFILES_FILE)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            raise InputError(f"Profiles file {self.path} is corrupt: {e}", "Corrupt profiles file") from None
+        return data if isinstance(data, dict) else {}
+
+    def _store(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so a crash never leaves a half-written file behind
+        fd, tmp_path = tempfile.mkstemp(prefix=".profiles-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def names(self):
+        return sorted(self._load())
+
+    def get(self, name):
+        data = self._load()
+        if name not in data:
+            raise InputError(f"No profile named '{name}'.", "Unknown profile")
+        return MergeProfile.from_dict(name, data[name])
+
+    def all(self):
+        return [MergeProfile.from_dict(name, fields) for name, fields in sorted(self._load().items())]
+
+    def save(self, profile):
+        data = self._load()
+        data[profile.name] = profile.to_dict()
+        self._store(data)
+
+    def delete(self, name):
+        data = self._load()
+        if data.pop(name, None) is not None: self._store(data)
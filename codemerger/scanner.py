@@ -0,0 +1,162 @@
+"""Directory scanner built on os.scandir.
+
+Each directory is listed with a single ``scandir()`` call and classified from
+the cached ``DirEntry`` type information, so no extra ``stat``/``isdir`` calls
+are made per entry. Results are in the same order as the old ``os.walk``
+loop: a directory's own files first, then each kept subdirectory's subtree,
+in listing order. Independent subtrees can be listed on a thread pool; the
+results are stitched back together in that same order.
+
+Which entries are kept is decided by a filters.FileFilter, compiled once per
+scan; excluded folders are pruned before they are ever listed. A ``lister``
+(see cache.CachedLister) can stand in for ``scandir`` to serve unchanged
+directories from a persistent cache; it returns the raw listing from
+``list_directory`` and the filter is applied here.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .errors import check_cancelled
+
+# Listing directories is dominated by syscall latency, so threads overlap well
+DEFAULT_SCAN_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+
+# Entry kinds in a raw listing
+KIND_FILE = 0
+KIND_DIR = 1
+KIND_DIR_LINK = 2 # Symlinked directory: listed but never descended into
+
+
+def list_directory(dir_path):
+    """Raw, unfiltered listing of one directory as ``[(name, kind), ...]``."""
+    listing = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir: kind = KIND_FILE
+            elif entry.is_symlink(): kind = KIND_DIR_LINK
+            else: kind = KIND_DIR
+            listing.append((entry.name, kind))
+    return listing
+
+
+def filter_listing(dir_path, listing, file_filter):
+    """Applies the scan rules to a raw listing; same result as ``scan_directory``."""
+    rules = file_filter.directory(dir_path)
+    keep_file, keep_dir = rules.keep_file, rules.keep_dir
+    files = []
+    subdirs = []
+    for name, kind in listing:
+        if kind == KIND_FILE:
+            if keep_file(name): files.append(os.path.join(dir_path, name))
+        elif kind == KIND_DIR and keep_dir(name):
+            subdirs.append(os.path.join(dir_path, name))
+    return files, subdirs
+
+
+def scan_directory(dir_path, file_filter, lister=None):
+    """Lists one directory: returns ``(matching file paths, subdirectory paths to descend into)``."""
+    if lister is not None:
+        try:
+            return filter_listing(dir_path, lister(dir_path), file_filter)
+        except OSError:
+            return [], []
+    rules = file_filter.directory(dir_path)
+    keep_file, keep_dir = rules.keep_file, rules.keep_dir
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Hidden/excluded folders are pruned; symlinked folders are not followed (as os.walk)
+                    if not keep_dir(name) or entry.is_symlink(): continue
+                    subdirs.append(entry.path)
+                elif keep_file(name):
+                    files.append(entry.path)
+    except OSError:
+        pass # Unreadable directory: skipped, as os.walk does
+    return files, subdirs
+
+
+def iter_scan(folder_path, file_filter, cancel=None, lister=None):
+    """Yields matching file paths depth-first, one directory listing at a time."""
+    stack = [folder_path]
+    while stack:
+        check_cancelled(cancel)
+        files, subdirs = scan_directory(stack.pop(), file_filter, lister)
+        yield from files
+        stack.extend(reversed(subdirs))
+
+
+def scan_listings(folder_path, file_filter, cancel=None, workers=DEFAULT_SCAN_WORKERS, on_progress=None, lister=None):
+    """Lists every kept directory under ``folder_path``; returns ``{dir path: (files, subdirs)}``.
+
+    Subtrees are listed concurrently when ``workers > 1``. ``on_progress(files_found)``
+    is called after each directory has been listed.
+    """
+    listings = {} # dir path -> (files, subdirs)
+    files_found = 0
+    if workers <= 1:
+        stack = [folder_path]
+        while stack:
+            check_cancelled(cancel)
+            dir_path = stack.pop()
+            files, subdirs = listings[dir_path] = scan_directory(dir_path, file_filter, lister)
+            files_found += len(files)
+            if on_progress is not None: on_progress(files_found)
+            stack.extend(subdirs)
+        return listings
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="codemerger-scan") as executor:
+        pending = {executor.submit(scan_directory, folder_path, file_filter, lister): folder_path}
+        try:
+            while pending:
+                check_cancelled(cancel)
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path = pending.pop(future)
+                    files, subdirs = listings[dir_path] = future.result()
+                    files_found += len(files)
+                    if on_progress is not None: on_progress(files_found)
+                    for subdir in subdirs:
+                        pending[executor.submit(scan_directory, subdir, file_filter, lister)] = subdir
+        finally:
+            for future in pending: future.cancel()
+    return listings
+
+
+def flatten_listings(folder_path, listings):
+    """Stitches per-directory listings back together depth-first, exactly like ``iter_scan``."""
+    found_files = []
+    stack = [folder_path]
+    while stack:
+        listing = listings.get(stack.pop())
+        if listing is None: continue
+        files, subdirs = listing
+        found_files.extend(files)
+        stack.extend(reversed(subdirs))
+    return found_files
+
+
+def scan_parallel(folder_path, file_filter, cancel=None, workers=DEFAULT_SCAN_WORKERS, on_progress=None, lister=None):
+    """Lists subtrees concurrently and returns all matching paths in ``iter_scan`` order.
+
+    ``on_progress(files_found)`` is called after each directory has been listed.
+    """
+    if workers <= 1:
+        found_files = []
+        for file_path in iter_scan(folder_path, file_filter, cancel, lister):
+            found_files.append(file_path)
+            if on_progress is not None: on_progress(len(found_files))
+        return found_files
+    listings = scan_listings(folder_path, file_filter, cancel, workers, on_progress, lister)
+    return flatten_listings(folder_path, listings)
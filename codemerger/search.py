@@ -0,0 +1,144 @@
+"""Indexes for searching the preview list and the merged output.
+
+PathIndex answers the preview filter box: relative paths are split into
+words at ``/ . _ -`` and the sorted list of distinct words, each with the ids
+of the files containing it, is built once per preview. A query term is found
+by bisecting that list for the words it starts, so a keystroke costs a couple
+of binary searches plus merging the matched words' id lists, instead of a pass
+over every path. Results are cached per term.
+
+ContentIndex answers "find in output": the merged text as UTF-8 bytes (an
+mmap for spooled outputs), its line starts and each block's start offset.
+Matches are found with C-level bytes/regex search over the buffer and mapped
+back to a file, line and column by bisection, never by scanning the Text
+widget. Nothing here imports tkinter.
+"""
+import bisect
+import os
+import re
+
+from .mappedoutput import index_line_starts
+
+_WORD_SPLIT = re.compile(r"[/._\-\s]+")
+
+
+def _words(text):
+    return [word for word in _WORD_SPLIT.split(text) if word]
+
+
+class PathIndex:
+    """Word-prefix search over the relative paths of a FileSelection (ids are positions in ``rel_paths``).
+
+    Each whitespace-separated query term must occur in the path, starting at
+    the beginning of a word: ``util`` matches ``src/utils/io.py``, ``src/ut``
+    and ``.py`` match too, ``tils`` does not. Matching ignores case.
+    """
+
+    def __init__(self, rel_paths):
+        self.paths = [rel_path.replace(os.sep, "/").lower() for rel_path in rel_paths]
+        postings = {}
+        for file_id, path in enumerate(self.paths):
+            for word in set(_words(path)):
+                postings.setdefault(word, []).append(file_id)
+        self.words = sorted(postings)
+        self.postings = [postings[word] for word in self.words]
+        self._term_cache = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _prefix_range(self, prefix):
+        lo = bisect.bisect_left(self.words, prefix)
+        return lo, bisect.bisect_left(self.words, prefix + "\U0010ffff", lo)
+
+    def _term_ids(self, term):
+        """Sorted ids of the files matching one lowercase term."""
+        ids = self._term_cache.get(term)
+        if ids is not None: return ids
+        words = _words(term)
+        if not words:
+            # Only separators (e.g. '/'): nothing to bisect on, check every path
+            ids = [file_id for file_id, path in enumerate(self.paths) if term in path]
+        else:
+            # Words followed by a separator in the term are whole words of the path; the last may be cut short.
+            # Start from whichever of them has the fewest files, then check the whole term against those paths.
+            whole = words if _WORD_SPLIT.match(term[-1]) else words[:-1]
+            candidates = None # (file count, lo, hi) of the postings to start from
+            if len(whole) < len(words):
+                lo, hi = self._prefix_range(words[-1])
+                candidates = (sum(map(len, self.postings[lo:hi])), lo, hi)
+            for word in whole:
+                index = bisect.bisect_left(self.words, word)
+                if index == len(self.words) or self.words[index] != word:
+                    candidates = (0, 0, 0) # No path has this word
+                    break
+                if candidates is None or len(self.postings[index]) < candidates[0]:
+                    candidates = (len(self.postings[index]), index, index + 1)
+            _, lo, hi = candidates
+            # Posting lists are already sorted; only a union of several needs re-sorting
+            ids = self.postings[lo] if hi - lo == 1 else sorted(set().union(*self.postings[lo:hi]))
+            if term != words[0]:
+                paths = self.paths
+                ids = [file_id for file_id in ids if term in paths[file_id]]
+        self._term_cache[term] = ids
+        return ids
+
+    def match(self, query):
+        """Sorted ids of the files matching every term of ``query``; None for an empty query (no filter)."""
+        terms = set(query.replace("\\", "/").lower().split())
+        if not terms: return None
+        results = sorted((self._term_ids(term) for term in terms), key=len)
+        if len(results) == 1: return list(results[0])
+        ids = set(results[0]) # Intersect starting from the smallest result
+        for term_ids in results[1:]:
+            ids.intersection_update(term_ids)
+            if not ids: return []
+        return sorted(ids)
+
+
+class ContentIndex:
+    """Find-next over merged output; ``blocks`` is ``[(full path, byte offset, 0-based line), ...]``.
+
+    Searches are smart-case: case-insensitive unless the query contains an
+    uppercase letter (case folding is ASCII-only).
+    """
+
+    def __init__(self, data, blocks, line_starts=None):
+        self.data = data
+        self.blocks = blocks
+        self.line_starts = line_starts if line_starts is not None else index_line_starts(data)
+        self._block_offsets = [offset for _, offset, _ in blocks]
+
+    @classmethod
+    def from_text(cls, text, block_lines):
+        """Indexes output text whose blocks start at ``[(full path, 0-based line), ...]``."""
+        data = text.encode('utf-8')
+        line_starts = index_line_starts(data)
+        return cls(data, [(file_path, line_starts[line], line) for file_path, line in block_lines], line_starts)
+
+    def find(self, query, start=0):
+        """``(start, end)`` byte offsets of the first match at or after ``start``, wrapping around; None if none."""
+        needle = query.encode('utf-8')
+        if not needle: return None
+        if query != query.lower():
+            position = self.data.find(needle, start)
+            if position < 0 and start: position = self.data.find(needle, 0)
+            return (position, position + len(needle)) if position >= 0 else None
+        pattern = re.compile(re.escape(needle), re.IGNORECASE)
+        found = pattern.search(self.data, start) or (pattern.search(self.data) if start else None)
+        return found.span() if found else None
+
+    def file_at(self, offset):
+        """Full path of the block containing byte ``offset`` (None before the first block)."""
+        index = bisect.bisect_right(self._block_offsets, offset) - 1
+        return self.blocks[index][0] if index >= 0 else None
+
+    def position(self, offset):
+        """``(0-based line, column in characters)`` of byte ``offset``."""
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        line_start = self.line_starts[line]
+        return line, len(self.data[line_start:offset].decode('utf-8', errors='replace'))
+
+    def length(self, start, end):
+        """Length in characters of the match between byte offsets ``start`` and ``end``."""
+        return len(self.data[start:end].decode('utf-8', errors='replace'))
@@ -0,0 +1,205 @@
+"""Compact, Tk-free selection state for the preview file list.
+
+One byte per file in a ``bytearray`` indexed by file id (the position in the
+scan results) replaces a ``tk.BooleanVar`` per file. Files are grouped into a
+directory tree so whole subtrees can be toggled; because the scan walks the
+tree top-down, each directory's files occupy a contiguous id range and
+toggling or counting a subtree is a single slice operation. Optional per-file
+sizes and token estimates are summed per subtree through prefix sums.
+"""
+import itertools
+import os
+
+from .core import relative_path
+
+CHECKED = 1
+UNCHECKED = 0
+
+# Tri-state of a directory node
+STATE_ALL = "all"
+STATE_NONE = "none"
+STATE_SOME = "some"
+
+
+class DirNode:
+    """A directory in the preview tree; ``key`` is its relative path ('' for the root)."""
+
+    __slots__ = ("key", "name", "parent", "subdirs", "files", "first", "stop", "count", "_ids")
+
+    def __init__(self, key, name, parent):
+        self.key = key
+        self.name = name
+        self.parent = parent
+        self.subdirs = {} # name -> DirNode, in scan order
+        self.files = [] # ids of files directly in this directory
+        self.first = None # lowest file id in the subtree
+        self.stop = None # highest file id in the subtree + 1
+        self.count = 0 # number of files in the subtree
+        self._ids = None # explicit subtree ids, only if the range is not contiguous
+
+    @property
+    def contiguous(self):
+        return self.count == 0 or self.stop - self.first == self.count
+
+
+class FileSelection:
+    """Checked/unchecked state for every file found by a scan.
+
+    Files start checked, except that when ``previous`` (an older FileSelection
+    of the same tree) is given, files it knew keep their state there.
+    """
+
+    def __init__(self, file_paths, folder_path, previous=None):
+        self.paths = list(file_paths)
+        self.rel_paths = [relative_path(p, folder_path) for p in self.paths]
+        self.checked = bytearray([CHECKED]) * len(self.paths)
+        if previous is not None:
+            unchecked = {path for path, flag in zip(previous.paths, previous.checked) if not flag}
+            if unchecked:
+                for file_id, path in enumerate(self.paths):
+                    if path in unchecked: self.checked[file_id] = UNCHECKED
+        self.sizes = None # per file id, see set_stats
+        self.tokens = None
+        self._size_sums = self._token_sums = None
+        self.root = DirNode("", "", None)
+        self.dirs = {"": self.root}
+        self.file_dirs = [] # file id -> DirNode it lives in
+        for file_id, rel_path in enumerate(self.rel_paths):
+            self._add(file_id, rel_path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _add(self, file_id, rel_path):
+        parts = rel_path.replace(os.sep, "/").split("/")
+        node = self.root
+        self._extend(node, file_id)
+        for part in parts[:-1]:
+            child = node.subdirs.get(part)
+            if child is None:
+                key = f"{node.key}/{part}" if node.key else part
+                child = node.subdirs[part] = self.dirs[key] = DirNode(key, part, node)
+            node = child
+            self._extend(node, file_id)
+        node.files.append(file_id)
+        self.file_dirs.append(node)
+
+    @staticmethod
+    def _extend(node, file_id):
+        if node.first is None: node.first = file_id
+        node.stop = file_id + 1
+        node.count += 1
+
+    # --- Queries ---
+
+    def file_name(self, file_id):
+        return os.path.basename(self.rel_paths[file_id])
+
+    def is_checked(self, file_id):
+        return self.checked[file_id] == CHECKED
+
+    def subtree_ids(self, node):
+        """All file ids below ``node``, as a range when possible."""
+        if node.contiguous:
+            return range(node.first or 0, node.stop or 0)
+        if node._ids is None:
+            ids, stack = [], [node]
+            while stack:
+                current = stack.pop()
+                ids.extend(current.files)
+                stack.extend(current.subdirs.values())
+            node._ids = sorted(ids)
+        return node._ids
+
+    def checked_count(self, node=None):
+        if node is None:
+            return self.checked.count(CHECKED)
+        if node.contiguous:
+            return self.checked.count(CHECKED, node.first or 0, node.stop or 0)
+        return sum(self.checked[i] for i in self.subtree_ids(node))
+
+    def dir_state(self, node):
+        checked = self.checked_count(node)
+        if checked == 0: return STATE_NONE
+        if checked == node.count: return STATE_ALL
+        return STATE_SOME
+
+    def has_stats(self):
+        return self.tokens is not None
+
+    def _subtree_sum(self, values, sums, node):
+        if node.contiguous: return sums[node.stop or 0] - sums[node.first or 0]
+        return sum(values[i] for i in self.subtree_ids(node))
+
+    def file_stats(self, file_id):
+        """``(size in bytes, tokens)`` of one file."""
+        return self.sizes[file_id], self.tokens[file_id]
+
+    def dir_stats(self, node):
+        """``(size in bytes, tokens)`` summed over a subtree."""
+        return self._subtree_sum(self.sizes, self._size_sums, node), self._subtree_sum(self.tokens, self._token_sums, node)
+
+    def selected_tokens(self):
+        return sum(itertools.compress(self.tokens, self.checked)) if self.tokens is not None else 0
+
+    def selected_paths(self):
+        """Full paths of checked files, in scan order."""
+        return [path for path, flag in zip(self.paths, self.checked) if flag]
+
+    def unchecked_rel_paths(self):
+        """'/'-separated relative paths of unchecked files, e.g. for a saved profile."""
+        return [rel_path.replace(os.sep, "/") for rel_path, flag in zip(self.rel_paths, self.checked) if not flag]
+
+    # --- Updates ---
+
+    def set_stats(self, sizes, tokens):
+        """Sets per-file sizes and token counts (lists in file id order)."""
+        self.sizes = list(sizes)
+        self.tokens = list(tokens)
+        self._size_sums = list(itertools.accumulate(self.sizes, initial=0))
+        self._token_sums = list(itertools.accumulate(self.tokens, initial=0))
+
+    def update_tokens(self, counts):
+        """Replaces the token counts of some files (``{full path: tokens}``), e.g. exact counts after a merge."""
+        if self.tokens is None or not counts: return
+        for file_id, path in enumerate(self.paths):
+            tokens = counts.get(path)
+            if tokens is not None: self.tokens[file_id] = tokens
+        self._token_sums = list(itertools.accumulate(self.tokens, initial=0))
+
+    def set_file(self, file_id, value):
+        self.checked[file_id] = CHECKED if value else UNCHECKED
+
+    def toggle_file(self, file_id):
+        self.checked[file_id] ^= 1
+        return self.checked[file_id] == CHECKED
+
+    def set_dir(self, node, value):
+        flag = CHECKED if value else UNCHECKED
+        if node.contiguous:
+            self.checked[node.first or 0:node.stop or 0] = bytes([flag]) * node.count
+        else:
+            for file_id in self.subtree_ids(node):
+                self.checked[file_id] = flag
+
+    def toggle_dir(self, node):
+        """Checks the whole subtree unless it is already fully checked; returns the new value."""
+        value = self.dir_state(node) != STATE_ALL
+        self.set_dir(node, value)
+        return value
+
+    def set_all(self, value):
+        self.set_dir(self.root, value)
+
+    def set_files(self, file_ids, value):
+        """Checks or unchecks the given files (e.g. the matches of the filter box)."""
+        flag = CHECKED if value else UNCHECKED
+        checked = self.checked
+        for file_id in file_ids: checked[file_id] = flag
+
+    def uncheck_rel_paths(self, rel_paths):
+        """Unchecks the files with these '/'-separated relative paths; unknown paths are ignored."""
+        wanted = set(rel_paths)
+        if not wanted: return
+        for file_id, rel_path in enumerate(self.rel_paths):
+            if rel_path.replace(os.sep, "/") in wanted: self.checked[file_id] = UNCHECKED
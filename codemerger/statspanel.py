@@ -0,0 +1,61 @@
+"""Collapsible panel showing the metrics of the last runs (metrics.RunMetrics).
+
+Collapsed it is a single header row; expanded it lists, per operation
+(preview, combine, save, ...), the most recent run's phase timings, counts
+and read latency percentiles. The "Profile next run" box is read by the app
+before it starts a run; see metrics.ProfileCapture.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+PANEL_HEIGHT_LINES = 8
+
+
+class StatsPanel(ttk.Frame):
+    """Header toggle plus a read-only text area with the latest metrics of each operation."""
+
+    def __init__(self, master, text_options=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columnconfigure(0, weight=1)
+        self.expanded = False
+        self.runs = {} # operation -> RunMetrics, in first-seen order
+
+        header = ttk.Frame(self)
+        header.grid(row=0, column=0, sticky="ew")
+        self.toggle_button = ttk.Button(header, text="▸ Stats", width=10, command=self.toggle)
+        self.toggle_button.pack(side=tk.LEFT)
+        self.summary_var = tk.StringVar(value="No runs yet.")
+        ttk.Label(header, textvariable=self.summary_var).pack(side=tk.LEFT, padx=(10, 0))
+        self.profile_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(header, text="Profile next run", variable=self.profile_var).pack(side=tk.RIGHT)
+
+        self.text = tk.Text(self, height=PANEL_HEIGHT_LINES, wrap=tk.NONE, relief=tk.FLAT, **(text_options or {}))
+        self.text.configure(state=tk.DISABLED)
+
+    def toggle(self):
+        self.expanded = not self.expanded
+        if self.expanded:
+            self.text.grid(row=1, column=0, sticky="ew", pady=(5, 0))
+            self.toggle_button.config(text="▾ Stats")
+        else:
+            self.text.grid_remove()
+            self.toggle_button.config(text="▸ Stats")
+
+    def take_profile_request(self):
+        """True once if the user asked to profile the next run (the box is then cleared)."""
+        requested = self.profile_var.get()
+        if requested: self.profile_var.set(False)
+        return requested
+
+    def show(self, metrics):
+        """Records a finished run and redraws the panel."""
+        self.runs[metrics.operation] = metrics.finish()
+        self.summary_var.set(metrics.summary_lines()[0])
+        lines = []
+        for run in self.runs.values():
+            if lines: lines.append("")
+            lines.extend(run.summary_lines())
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", "\n".join(lines))
+        self.text.configure(state=tk.DISABLED)
@@ -0,0 +1,180 @@
+"""Byte-level merge writer: copies file contents straight to the destination.
+
+The text path (core.write_merge) decodes every file into a ``str`` and
+re-encodes it. For saving, that is wasted work: here each file is opened in
+binary mode and normalized as bytes (decoding.normalize_bytes), so ASCII and
+valid UTF-8 files are written as slices of their own bytes and only legacy
+or UTF-16/32 files are ever transcoded. Files larger than COPY_CHUNK_SIZE are
+not read whole: the surrounding whitespace is located by reading just the
+first and last chunks, and the bytes in between are copied through a fixed
+size buffer. Such a file is copied as-is while its chunks are pure ASCII; at
+the first non-ASCII chunk the rest of the file is checked once for UTF-8
+validity to choose between copying and the fallback decoder. The full merge
+is never held in memory.
+
+Known differences from the text path: for files larger than COPY_CHUNK_SIZE
+only ASCII whitespace is stripped from the ends (``str.strip`` would also
+remove e.g. U+00A0), and a read error in the middle of such a file leaves the
+part already copied in the output, followed by the error block.
+"""
+import codecs
+import os
+
+from .core import MergeResult, check_cancelled, format_error_block, format_header, format_truncation, relative_path, truncation_point
+from .decoding import ASCII, BOM, LEGACY, STRIP_BYTES, UTF8, detect_wide, normalize_bytes, scan_utf8, stream_decoder
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _ReadError(Exception):
+    """A source file failed while being copied (errors writing ``out`` are not wrapped and propagate)."""
+
+
+class _Source:
+    """The parts of a binary file copy_content uses, with OSErrors turned into _ReadError."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def _call(self, method, *args):
+        try:
+            return method(*args)
+        except OSError as e:
+            raise _ReadError(e) from e
+
+    def read(self, n=-1):
+        return self._call(self.f.read, n)
+
+    def seek(self, offset):
+        return self._call(self.f.seek, offset)
+
+    def size(self):
+        return self._call(os.fstat, self.f.fileno()).st_size
+
+
+def content_range(f, size, start=0):
+    """Returns ``(start, end)`` of the file's bytes from ``start`` on, leading/trailing whitespace excluded."""
+    while start < size:
+        f.seek(start)
+        chunk = f.read(min(COPY_CHUNK_SIZE, size - start))
+        if not chunk: break
+        kept = chunk.lstrip(STRIP_BYTES)
+        if kept:
+            start += len(chunk) - len(kept)
+            break
+        start += len(chunk)
+    if start >= size:
+        return 0, 0
+    end = size
+    while end > start:
+        n = min(COPY_CHUNK_SIZE, end - start)
+        f.seek(end - n)
+        chunk = f.read(n)
+        kept = chunk.rstrip(STRIP_BYTES)
+        if kept:
+            end -= len(chunk) - len(kept)
+            break
+        end -= n
+    return start, end
+
+
+def _iter_chunks(f, start, end):
+    f.seek(start)
+    while start < end:
+        chunk = f.read(min(COPY_CHUNK_SIZE, end - start))
+        if not chunk: return
+        start += len(chunk)
+        yield chunk
+
+
+def copy_range(f, start, end, out, path=None):
+    """Copies ``f[start:end]`` to the binary stream ``out``, normalizing only where needed.
+
+    ``path`` is the file's decoding path if already known (e.g. BOM); with
+    None it is found on the way (ASCII, or UTF-8/legacy at the first
+    non-ASCII chunk). Returns the path taken.
+    """
+    decoder = stream_decoder(path) if path is not None else None
+    pending_cr = False # Previous chunk ended in '\r': a leading '\n' belongs to that line break
+    position = start
+    for chunk in _iter_chunks(f, start, end):
+        if path is None and not chunk.isascii():
+            # Everything before was ASCII, valid either way; the rest decides between UTF-8 and the fallback
+            path = UTF8 if scan_utf8(_iter_chunks(f, position, end)) else LEGACY
+            decoder = stream_decoder(path)
+            f.seek(position + len(chunk))
+        position += len(chunk)
+        if pending_cr and chunk.startswith(b"\n"):
+            chunk = chunk[1:]
+        pending_cr = chunk.endswith(b"\r")
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        out.write(chunk if decoder is None else decoder.decode(chunk).encode("utf-8"))
+    if decoder is not None:
+        out.write(decoder.decode(b"", final=True).encode("utf-8"))
+    return path or ASCII
+
+
+def copy_content(f, cut, out):
+    """Writes the normalized content of ``f[:cut]`` to ``out``; returns its decoding path (see decoding.PATHS)."""
+    f.seek(0)
+    head = f.read(min(COPY_CHUNK_SIZE, cut))
+    if len(head) >= cut or detect_wide(head) is not None:
+        # Small files (most of them) and UTF-16/32 ones are normalized in memory
+        if len(head) < cut: head += f.read(cut - len(head))
+        data, path = normalize_bytes(head)
+        out.write(data)
+        return path
+    skip = len(codecs.BOM_UTF8) if head.startswith(codecs.BOM_UTF8) else 0
+    start, end = content_range(f, cut, skip)
+    return copy_range(f, start, end, out, BOM if skip else None)
+
+
+def write_merge_stream(file_paths, folder_path, out, on_file=None, cancel=None, plan=None, on_decode=None):
+    """Writes the merged output for ``file_paths`` to the binary stream ``out``.
+
+    Produces the same blocks as core.write_merge, in the same order, with
+    constant memory. ``on_file(file_path, ok)`` is called after each block.
+    ``plan`` is a core.MergePlan (duplicates and truncation), as for write_merge.
+    ``on_decode(path)`` gets each file's decoding path (see decoding.PATHS).
+    """
+    result = MergeResult()
+    aliases = plan.aliases if plan is not None else {}
+    limits = plan.limits if plan is not None else {}
+    first = True
+    for file_path in file_paths:
+        check_cancelled(cancel)
+        rel_path = relative_path(file_path, folder_path)
+        if not first: out.write(b"\n")
+        first = False
+        try:
+            f = open(file_path, "rb")
+        except Exception as e:
+            out.write(format_error_block(rel_path, e).encode("utf-8"))
+            result.fail(file_path, e)
+            if on_file is not None: on_file(file_path, False)
+            continue
+        started = False # Whether part of the block is already written
+        try:
+            with f:
+                source = _Source(f)
+                size = source.size()
+                cut = size
+                limit = limits.get(file_path)
+                if limit is not None:
+                    cut = truncation_point(source.read(limit), size, limit)
+                out.write(format_header(rel_path, aliases.get(file_path)).encode("utf-8"))
+                started = True
+                path = copy_content(source, cut, out)
+                if cut < size: out.write(format_truncation(size - cut).encode("utf-8"))
+                out.write(f"\n--- End File: {rel_path} ---\n".encode("utf-8"))
+        except _ReadError as e:
+            if started: out.write(b"\n")
+            out.write(format_error_block(rel_path, e.__cause__).encode("utf-8"))
+            result.fail(file_path, e.__cause__)
+            if on_file is not None: on_file(file_path, False)
+            continue
+        result.processed += 1
+        if on_decode is not None: on_decode(path)
+        if on_file is not None: on_file(file_path, True)
+    return result
@@ -0,0 +1,68 @@
+"""Run long scans/merges off the Tk main thread.
+
+The worker never touches Tk: it reports through a ``queue.Queue`` that the
+GUI drains from ``root.after`` callbacks, and stops when ``cancel`` is set.
+"""
+import queue
+import threading
+import time
+
+from .core import MergeCancelled
+
+# Message kinds put on the queue by the worker
+PROGRESS = "progress"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+class BackgroundTask:
+    """Runs ``func(task)`` on a daemon thread; results come back via ``poll()``."""
+
+    def __init__(self, func, progress_interval=0.1):
+        self.func = func
+        self.cancel_event = threading.Event()
+        self.messages = queue.Queue()
+        self.progress_interval = progress_interval
+        self._last_progress = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    # --- Worker side ---
+    def _run(self):
+        try:
+            result = self.func(self)
+        except MergeCancelled:
+            self.messages.put((CANCELLED, None))
+        except Exception as e:
+            self.messages.put((ERROR, e))
+        else:
+            if self.cancel_event.is_set(): self.messages.put((CANCELLED, result))
+            else: self.messages.put((DONE, result))
+
+    def progress(self, text, force=False):
+        """Queues a status update, dropping those that arrive faster than ``progress_interval``."""
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.messages.put((PROGRESS, text))
+
+    # --- Caller side ---
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def poll(self):
+        """Returns all queued ``(kind, payload)`` messages without blocking."""
+        drained = []
+        while True:
+            try:
+                drained.append(self.messages.get_nowait())
+            except queue.Empty:
+                return drained
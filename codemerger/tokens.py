@@ -0,0 +1,181 @@
+"""Token estimates for fitting merged output into LLM context windows.
+
+By default tokens are estimated with a tokenizer-free heuristic (runs of up
+to four word characters, and each punctuation character, count as one
+token), which tracks BPE tokenizers closely on source code and needs no
+third-party package. If ``tiktoken`` is installed, an exact encoding can be
+selected by name instead.
+
+Counting is incremental: a TokenCounter remembers each file's count together
+with its size and mtime, so after an edit only the changed files are counted
+again; the counts can be persisted in cache.MergeCache between runs. Files
+that have not been read yet are estimated from their size alone.
+"""
+import math
+import os
+import re
+import threading
+
+from .core import DEFAULT_MAX_BUFFERED_BYTES, MergeResult, format_block, iter_blocks, read_file, relative_path
+from .errors import InputError
+
+HEURISTIC_TOKENIZER = "heuristic"
+# Size-only estimate for files whose content has not been counted yet (estimate_tokens averages
+# about this many bytes per token on typical source code)
+BYTES_PER_TOKEN = 3.2
+_PIECE_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Heuristic token count of ``text``."""
+    return len(_PIECE_RE.findall(text))
+
+
+def estimate_from_size(size):
+    return math.ceil(size / BYTES_PER_TOKEN)
+
+
+def load_tokenizer(name=HEURISTIC_TOKENIZER):
+    """Returns ``count(text) -> int`` for ``name``: 'heuristic' or a tiktoken encoding (e.g. 'cl100k_base')."""
+    if not name or name == HEURISTIC_TOKENIZER: return estimate_tokens
+    try:
+        import tiktoken
+    except ImportError:
+        raise InputError(f"The '{name}' tokenizer needs the optional 'tiktoken' package.", "tiktoken not installed") from None
+    try:
+        encoding = tiktoken.get_encoding(name)
+    except (KeyError, ValueError) as e:
+        raise InputError(f"Unknown tokenizer '{name}': {e}", "Unknown tokenizer") from None
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenCounter:
+    """Per-file token counts, remembered by size and mtime so unchanged files are never counted twice."""
+
+    def __init__(self, tokenizer=HEURISTIC_TOKENIZER, known=None):
+        self.tokenizer = tokenizer
+        self.count = load_tokenizer(tokenizer)
+        self.known = dict(known or {}) # full path -> (size, mtime_ns, tokens)
+        self.updated = {} # entries added since construction, for cache.MergeCache.store_token_counts
+        self._header_tokens = {}
+        # Read pool threads and a live refresh's watcher thread record counts concurrently
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, cache, folder_path, tokenizer=HEURISTIC_TOKENIZER):
+        """A counter seeded with the counts ``cache`` (a MergeCache, or None) holds for ``folder_path``."""
+        known = cache.token_counts(folder_path, tokenizer) if cache is not None else None
+        return cls(tokenizer, known)
+
+    def save(self, cache, folder_path):
+        """Persists the counts made since the last save (no-op without a cache)."""
+        with self._lock:
+            updated, self.updated = self.updated, {}
+        if cache is not None and updated: cache.store_token_counts(folder_path, self.tokenizer, updated)
+
+    def lookup(self, file_path, st):
+        """The counted tokens of the file's content, if its size and mtime are unchanged; else None."""
+        entry = self.known.get(file_path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns: return entry[2]
+        return None
+
+    def file_tokens(self, file_path, st):
+        """Counted tokens if known, otherwise an estimate from the file size (no read)."""
+        tokens = self.lookup(file_path, st)
+        return estimate_from_size(st.st_size) if tokens is None else tokens
+
+    def record(self, file_path, st, content):
+        tokens = self.count(content)
+        with self._lock:
+            self.known[file_path] = self.updated[file_path] = (st.st_size, st.st_mtime_ns, tokens)
+        return tokens
+
+    def reader(self, reader=read_file):
+        """Wraps a merge ``reader`` so every file it reads is counted (unless already known).
+
+        Heads read with a ``limit`` are passed through uncounted: their count
+        is not the file's, which is what ``known`` is keyed by.
+        """
+        def read_and_count(file_path, st=None, limit=None):
+            if limit is not None: return reader(file_path, st, limit=limit)
+            if st is None: st = os.stat(file_path)
+            content = reader(file_path, st)
+            if self.lookup(file_path, st) is None: self.record(file_path, st, content)
+            return content
+        return read_and_count
+
+    def block_tokens(self, file_path, rel_path, block, ok=True, aliases=None):
+        """Tokens of a formatted block: the file's counted content plus its header/footer lines."""
+        entry = self.known.get(file_path)
+        if not ok or entry is None: return self.count(block)
+        if aliases: return entry[2] + self.count(format_block(rel_path, "", aliases))
+        overhead = self._header_tokens.get(rel_path)
+        if overhead is None: overhead = self._header_tokens[rel_path] = self.count(format_block(rel_path, ""))
+        return entry[2] + overhead
+
+    def file_stats(self, file_paths):
+        """Returns ``(sizes, tokens)`` lists for ``file_paths``: one stat per file, no reads."""
+        sizes, tokens = [], []
+        for file_path in file_paths:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                sizes.append(0)
+                tokens.append(0)
+                continue
+            sizes.append(st.st_size)
+            tokens.append(self.file_tokens(file_path, st))
+        return sizes, tokens
+
+
+# --- Chunked Output ---
+
+def chunk_path(output_path, index):
+    """``out.txt`` -> ``out.part001.txt`` for chunk ``index`` (1-based)."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.part{index:03d}{ext}"
+
+
+class ChunkResult(MergeResult):
+    """MergeResult plus the token total of each chunk written."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunk_tokens = []
+        self.oversized = 0 # blocks that alone exceed the budget (each got a chunk of its own)
+
+
+def write_merge_chunks(file_paths, folder_path, open_chunk, max_tokens, counter, on_file=None, cancel=None,
+                       workers=1, max_buffered_bytes=DEFAULT_MAX_BUFFERED_BYTES, reader=read_file, plan=None):
+    """Streams the merge into consecutive chunks of at most ``max_tokens`` tokens each.
+
+    Chunks only ever break between ``--- File:`` blocks; a single block larger
+    than the budget gets a chunk of its own. ``open_chunk(index)`` (1-based)
+    returns a text stream, which is closed here once the chunk is full.
+    Blocks are packed greedily in input order in a single pass.
+    """
+    result = ChunkResult()
+    out = None
+    blocks_in_chunk = 0
+    try:
+        for file_path, block, ok in iter_blocks(file_paths, folder_path, result, cancel, workers,
+                                                max_buffered_bytes, counter.reader(reader), plan):
+            if plan is not None and file_path in plan.limits:
+                tokens = counter.count(block) # Truncated: the file's full-content count does not apply
+            else:
+                file_aliases = plan.aliases.get(file_path) if plan is not None else None
+                tokens = counter.block_tokens(file_path, relative_path(file_path, folder_path), block, ok, file_aliases)
+            if out is None or (blocks_in_chunk and result.chunk_tokens[-1] + tokens > max_tokens):
+                if out is not None: out.close()
+                out = open_chunk(len(result.chunk_tokens) + 1)
+                result.chunk_tokens.append(0)
+                blocks_in_chunk = 0
+            if blocks_in_chunk: out.write("\n")
+            out.write(block)
+            blocks_in_chunk += 1
+            result.chunk_tokens[-1] += tokens
+            if tokens > max_tokens: result.oversized += 1
+            if on_file is not None: on_file(file_path, ok)
+    finally:
+        if out is not None: out.close()
+    return result
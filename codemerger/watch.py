@@ -0,0 +1,385 @@
+"""Live refresh of a previewed tree: inotify on Linux, stat polling elsewhere.
+
+A WatchSession keeps the per-directory listings of the scanned tree. The
+watcher thread turns filesystem activity into two sets, directories whose
+listing may have changed and files whose content may have changed. After a
+short quiet period it re-lists only those directories, recomposes the file
+list in scan order and reports a Changes batch: added, removed and modified
+paths, plus freshly formatted blocks for the added/modified files. Nothing in
+here touches Tk; the GUI drains the batches from a queue.
+
+With .gitignore handling on, the ignore files are watched too: each kept
+directory's .gitignore, and those outside the tree (parent .gitignores,
+.git/info/exclude, core.excludesFile). An edit to one re-filters every
+directory its rules reach.
+
+When the shown merge went through the pre-merge checks, the session holds
+its MergePlan and AnalysisOptions (set_plan). Changed files are analyzed
+again before their blocks are built, together with the files they were
+collapsed with, so truncation, skipping and the duplicates line stay as a
+fresh merge would make them. Duplicates are only looked for within a batch:
+a changed file that now matches an untouched one keeps its own block.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+from .analysis import analyze_files
+from .core import MergePlan, format_block, format_error_block, read_file, relative_path
+from .filters import GITIGNORE_NAME
+from .scanner import flatten_listings, scan_directory, scan_listings
+
+DEBOUNCE_SECONDS = 0.3 # Quiet period before a batch of events is processed
+POLL_INTERVAL_SECONDS = 2.0 # Polling backend: time between sweeps
+
+
+class Changes:
+    """One batch of changes to the watched tree."""
+
+    def __init__(self, files, added, removed, modified, blocks, stats=None, plan=None, excluded=frozenset()):
+        self.files = files # full, ordered file list after the change
+        self.added = added # sets of full paths
+        self.removed = removed
+        self.modified = modified
+        # full path -> formatted block, for added and modified files plus any file whose analysis
+        # outcome changed with them (e.g. the primary of a modified duplicate)
+        self.blocks = blocks
+        self.stats = stats # (sizes, tokens) lists for self.files, if the session counts tokens
+        self.plan = plan # updated MergePlan, if the session has one
+        self.excluded = excluded # full paths the analysis leaves out (skipped or collapsed duplicates)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+
+class WatchSession:
+    """Listings of the watched tree, re-listed one directory at a time as events arrive."""
+
+    def __init__(self, folder_path, file_filter, reader=read_file, counter=None):
+        self.folder_path = folder_path
+        self.file_filter = file_filter
+        self.counter = counter # tokens.TokenCounter: re-reads are counted, and each batch carries file stats
+        self.reader = counter.reader(reader) if counter is not None else reader
+        self.ignore_files = frozenset(file_filter.outer_ignore_files()) # affect the whole tree when they change
+        self.listings = scan_listings(folder_path, file_filter, workers=1)
+        self.files = flatten_listings(folder_path, self.listings)
+        self.backend = None
+        self.plan = None
+        self.analysis_options = None
+        self.excluded = frozenset()
+        self._lock = threading.Lock() # set_plan comes from the GUI thread, apply from the watcher's
+
+    def set_plan(self, plan, analysis_options, excluded=()):
+        """Adopts the MergePlan of the shown merge; ``excluded`` are the files its analysis left out."""
+        with self._lock:
+            self.plan = plan
+            self.analysis_options = analysis_options
+            self.excluded = frozenset(excluded)
+
+    def directories(self):
+        return list(self.listings)
+
+    def _add_subtree(self, dir_path):
+        new_listings = scan_listings(dir_path, self.file_filter, workers=1)
+        self.listings.update(new_listings)
+        if self.backend is not None:
+            for new_dir in new_listings: self.backend.watch(new_dir)
+
+    def _drop_subtree(self, dir_path):
+        listing = self.listings.pop(dir_path, None)
+        if self.backend is not None: self.backend.unwatch(dir_path)
+        if listing is not None:
+            for subdir in listing[1]: self._drop_subtree(subdir)
+
+    def apply(self, dirty_dirs, modified_files):
+        """Re-lists ``dirty_dirs`` and returns the resulting Changes."""
+        with self._lock:
+            return self._apply(dirty_dirs, modified_files)
+
+    def _related(self, file_paths):
+        """Files whose block depends on ``file_paths`` through the plan: their primary or their duplicates."""
+        related = set()
+        for primary, aliases in self.plan.aliases.items():
+            alias_paths = {os.path.join(self.folder_path, alias) for alias in aliases}
+            if primary in file_paths: related |= alias_paths
+            if alias_paths & file_paths: related.add(primary)
+        return related
+
+    def _reanalyze(self, batch, removed):
+        """Runs the analysis on ``batch`` (full paths in scan order); returns the blocks' MergePlan."""
+        gone = set(batch) | removed
+        analysis = analyze_files(batch, self.folder_path, self.analysis_options)
+        aliases = {path: names for path, names in self.plan.aliases.items() if path not in gone}
+        aliases.update(analysis.plan.aliases)
+        limits = {path: limit for path, limit in self.plan.limits.items() if path not in gone}
+        limits.update((path, self.analysis_options.max_file_bytes) for path in analysis.plan.limits)
+        self.plan = MergePlan(aliases, limits)
+        self.excluded = frozenset((self.excluded - gone) | (set(batch) - set(analysis.files)))
+
+    def _apply(self, dirty_dirs, modified_files):
+        if self.file_filter.use_gitignore:
+            # A changed .gitignore can change what is kept anywhere below it: re-list that whole subtree
+            dirty_dirs = set(dirty_dirs)
+            for file_path in modified_files:
+                if file_path in self.ignore_files: changed_dir = self.folder_path
+                elif os.path.basename(file_path) == GITIGNORE_NAME: changed_dir = os.path.dirname(file_path)
+                else: continue
+                self.file_filter.forget(changed_dir)
+                prefix = os.path.join(changed_dir, '')
+                dirty_dirs.update(d for d in self.listings if d == changed_dir or d.startswith(prefix))
+        for dir_path in sorted(dirty_dirs, key=len):
+            old = self.listings.get(dir_path)
+            if old is None: continue # Not part of the kept tree (excluded, or already dropped)
+            files, subdirs = self.listings[dir_path] = scan_directory(dir_path, self.file_filter)
+            old_subdirs = set(old[1])
+            for subdir in old_subdirs.difference(subdirs): self._drop_subtree(subdir)
+            for subdir in subdirs:
+                if subdir not in old_subdirs: self._add_subtree(subdir)
+
+        old_files = set(self.files)
+        self.files = flatten_listings(self.folder_path, self.listings)
+        new_files = set(self.files)
+        added = new_files - old_files
+        removed = old_files - new_files
+        modified = (set(modified_files) & new_files) - added
+
+        changed = added | modified
+        reader = self.reader
+        if self.plan is not None and self.analysis_options is not None:
+            changed |= self._related(changed | removed) & new_files
+            if changed: self._reanalyze([path for path in self.files if path in changed], removed)
+            reader = self.plan.reader(reader)
+        aliases = self.plan.aliases if self.plan is not None else {}
+        blocks = {}
+        for file_path in changed - self.excluded:
+            rel_path = relative_path(file_path, self.folder_path)
+            try:
+                blocks[file_path] = format_block(rel_path, reader(file_path), aliases.get(file_path))
+            except Exception as e:
+                blocks[file_path] = format_error_block(rel_path, e)
+        stats = self.counter.file_stats(self.files) if self.counter is not None else None
+        return Changes(self.files, added, removed, modified, blocks, stats, self.plan, self.excluded)
+
+
+# --- Backends ---
+
+class InotifyBackend:
+    """Linux inotify through ctypes: one watch per kept directory."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_ONLYDIR = 0x01000000
+
+    LISTING_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    CONTENT_EVENTS = IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB
+    MASK = LISTING_EVENTS | CONTENT_EVENTS | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, session):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self.session = session
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs_by_wd = {}
+        self.wds_by_dir = {}
+        try:
+            for dir_path in session.directories(): self.watch(dir_path)
+            # Only events naming one of these files matter there; listing events outside the tree are ignored
+            for dir_path in {os.path.dirname(path) for path in session.ignore_files}: self.watch(dir_path)
+        except OSError:
+            self.close()
+            raise
+
+    def watch(self, dir_path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            if errno == 28: # ENOSPC: fs.inotify.max_user_watches exhausted
+                raise OSError(errno, "inotify watch limit reached")
+            return # Directory vanished in the meantime; its parent's event covers it
+        self.dirs_by_wd[wd] = dir_path
+        self.wds_by_dir[dir_path] = wd
+
+    def unwatch(self, dir_path):
+        wd = self.wds_by_dir.pop(dir_path, None)
+        if wd is not None:
+            self.dirs_by_wd.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def poll(self, timeout):
+        """Waits up to ``timeout``; returns ``(dirty_dirs, modified_files)``."""
+        dirty_dirs, modified_files = set(), set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable: return dirty_dirs, modified_files
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return dirty_dirs, modified_files
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += self._EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                dirty_dirs.update(self.session.directories()) # Lost events: re-list everything
+                continue
+            dir_path = self.dirs_by_wd.get(wd)
+            if dir_path is None: continue
+            if mask & self.IN_IGNORED:
+                self.dirs_by_wd.pop(wd, None)
+                self.wds_by_dir.pop(dir_path, None)
+            elif mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                dirty_dirs.add(os.path.dirname(dir_path))
+            elif mask & self.LISTING_EVENTS:
+                dirty_dirs.add(dir_path)
+                # Editors often save by writing a temp file and renaming it over the original
+                if name and not mask & self.IN_ISDIR: modified_files.add(os.path.join(dir_path, name))
+            elif mask & self.CONTENT_EVENTS and name and not mask & self.IN_ISDIR:
+                modified_files.add(os.path.join(dir_path, name))
+        return dirty_dirs, modified_files
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend:
+    """Portable fallback: compares directory mtimes and file size/mtime every sweep.
+
+    Ignore files are stat'ed as well (a kept directory's .gitignore, present or
+    not, and the session's outer ignore files): editing one in place does not
+    change any directory's mtime.
+    """
+
+    def __init__(self, session, interval=POLL_INTERVAL_SECONDS):
+        self.session = session
+        self.interval = interval
+        self.dir_mtimes = {}
+        self.file_stats = {}
+        self._snapshot(self.dir_mtimes, self.file_stats)
+
+    def watch(self, dir_path):
+        pass # Every sweep walks the session's current listings
+
+    def unwatch(self, dir_path):
+        pass
+
+    def _snapshot(self, dir_mtimes, file_stats):
+        use_gitignore = self.session.file_filter.use_gitignore
+        for dir_path, (files, _subdirs) in list(self.session.listings.items()):
+            try:
+                dir_mtimes[dir_path] = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                dir_mtimes[dir_path] = None
+            for file_path in files: _stat_into(file_stats, file_path)
+            if use_gitignore: _stat_into(file_stats, os.path.join(dir_path, GITIGNORE_NAME))
+        for file_path in self.session.ignore_files: _stat_into(file_stats, file_path)
+
+    def poll(self, timeout):
+        time.sleep(self.interval) # A sweep stats the whole tree, so never sweep faster than the interval
+        dir_mtimes, file_stats = {}, {}
+        self._snapshot(dir_mtimes, file_stats)
+        dirty_dirs = {d for d, mtime in dir_mtimes.items() if self.dir_mtimes.get(d, mtime) != mtime}
+        modified_files = {f for f, stat in file_stats.items() if f in self.file_stats and self.file_stats[f] != stat}
+        for dir_path, mtime in dir_mtimes.items():
+            if mtime is None: dirty_dirs.add(os.path.dirname(dir_path))
+        self.dir_mtimes, self.file_stats = dir_mtimes, file_stats
+        return dirty_dirs, modified_files
+
+    def close(self):
+        pass
+
+
+def _stat_into(file_stats, file_path):
+    try:
+        st = os.stat(file_path)
+        file_stats[file_path] = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        file_stats[file_path] = None
+
+
+# --- Watcher Thread ---
+
+class TreeWatcher:
+    """Watches a WatchSession's tree on a daemon thread and queues Changes batches.
+
+    ``backend`` is 'auto' (inotify when available, else polling), 'inotify' or 'poll'.
+    """
+
+    def __init__(self, session, backend="auto"):
+        self.session = session
+        self.changes = queue.Queue()
+        self.stop_event = threading.Event()
+        if backend in ("auto", "inotify"):
+            try:
+                self.backend = InotifyBackend(session)
+            except (OSError, AttributeError):
+                if backend == "inotify": raise
+                self.backend = PollingBackend(session)
+        else:
+            self.backend = PollingBackend(session)
+        session.backend = self.backend
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def kind(self):
+        return "inotify" if isinstance(self.backend, InotifyBackend) else "polling"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        dirty_dirs, modified_files = set(), set()
+        last_event = None
+        try:
+            while not self.stop_event.is_set():
+                new_dirty, new_modified = self.backend.poll(DEBOUNCE_SECONDS)
+                if new_dirty or new_modified:
+                    dirty_dirs |= new_dirty
+                    modified_files |= new_modified
+                    last_event = time.monotonic()
+                    continue
+                # Quiet for a full debounce period: process the accumulated batch
+                if last_event is not None and time.monotonic() - last_event >= DEBOUNCE_SECONDS:
+                    changes = self.session.apply(dirty_dirs, modified_files)
+                    dirty_dirs, modified_files = set(), set()
+                    last_event = None
+                    if changes: self.changes.put(changes)
+        except Exception as e:
+            self.changes.put(e)
+        finally:
+            self.backend.close()
+
+    def poll(self):
+        """Returns all queued Changes (or an exception that stopped the watcher) without blocking."""
+        drained = []
+        while True:
+            try:
+                drained.append(self.changes.get_nowait())
+            except queue.Empty:
+                return drained
@@ -1,7 +1,24 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
+import io
 import os
 import platform
+import re
+
+from codemerger import core, tasks
+from codemerger.analysis import DEFAULT_MAX_FILE_BYTES, AnalysisOptions, analyze_files
+from codemerger.cache import MergeCache, default_cache_dir
+from codemerger.filetree import FileTreeView
+from codemerger.formats import TEXT, detect_format, open_output, read_jsonl, write_merge_format
+from codemerger.metrics import ProfileCapture, RunMetrics, default_metrics_log
+from codemerger.mappedoutput import MergeSpool
+from codemerger.outputview import LazyOutputView, OutputBlocks
+from codemerger.profiles import MergeProfile, ProfileStore
+from codemerger.search import ContentIndex, PathIndex
+from codemerger.selection import FileSelection
+from codemerger.statspanel import StatsPanel
+from codemerger.tokens import TokenCounter, chunk_path, write_merge_chunks
+from codemerger.watch import TreeWatcher, WatchSession
 
 # --- Configuration (NERV-inspired Theme - Enhanced) ---
 BG_COLOR = "#1a1a1a"
@@ -10,8 +27,7 @@ ACCENT_COLOR_RED = "#FF3B30"
 ACCENT_COLOR_ORANGE = "#FF9500"
 TEXT_AREA_BG = "#000000"
 TEXT_AREA_FG = "#33FF33"
-# PREVIEW_AREA_BG = "#101010" # Canvas background will be BG_COLOR
-CHECKBOX_FRAME_BG = "#1f1f1f" # Slightly different bg for the frame inside canvas
+CHECKBOX_FRAME_BG = "#1f1f1f" # Slightly different bg for the file list
 PREVIEW_AREA_FG = "#C0C0C0" # Color for checkbox text
 BUTTON_BG = ACCENT_COLOR_RED
 BUTTON_FG = "#FFFFFF"
@@ -29,6 +45,14 @@ FONT_SIZE_LABEL = 12
 FONT_SIZE_CODE = 10
 FONT_SIZE_CHECKBOX = 10 # Font size for checkbox labels
 
+# --- Background Work ---
+QUEUE_POLL_INTERVAL_MS = 50 # How often the Tk loop drains worker messages
+STATUS_UPDATE_INTERVAL = 0.1 # Seconds between status bar updates from a worker
+WATCH_POLL_INTERVAL_MS = 250 # How often the Tk loop picks up live refresh changes
+# Larger merges are spooled to a temp file and shown a window of lines at a time (outputview.LazyOutputView)
+OUTPUT_INLINE_MAX_CHARS = 1_000_000
+FIND_CONTEXT_LINES = 5 # Lines shown above a Find match in a spooled output
+
 # --- Application Class ---
 class CodeMergerApp:
     def __init__(self, root):
@@ -39,10 +63,36 @@ class CodeMergerApp:
         self.root.configure(bg=BG_COLOR)
         self.root.minsize(700, 600)
 
-        # Store the state of each file checkbox {full_path: BooleanVar}
-        self.file_checkbox_vars = {}
+        # Checked state of every previewed file (selection.FileSelection) or None
+        self.file_selection = None
         # Store the actual full paths found by the last preview
         self.last_previewed_files = []
+        # Currently running background scan/merge (tasks.BackgroundTask) or None
+        self.task = None
+        # Persistent scan/content cache, opened on first use
+        self.cache = None
+        # Live refresh watcher (watch.TreeWatcher) or None
+        self.watcher = None
+        # Full paths making up the current combined output (the output area may show only part of it)
+        self.combined_files = []
+        # Duplicates/truncation of the current output (core.MergePlan) or None, reused by Save/Copy
+        self.merge_plan = None
+        # Checked files the current output was combined from, including those the analysis left out
+        self.merge_inputs = set()
+        # AnalysisOptions of the current output (None if the checks were off), for live refresh
+        self.analysis_options = None
+        # Per-file token counts of the previewed tree (tokens.TokenCounter) or None
+        self.token_counter = None
+        # Word index of the previewed paths for the filter box, as (FileSelection, search.PathIndex), or None
+        self.path_index = None
+        # Find index of the shown output (search.ContentIndex), rebuilt after the output changes, and where Find resumes
+        self.content_index = None
+        self.find_query = ""
+        self.find_offset = 0
+        # Metrics of the running task (metrics.RunMetrics) or None; finished runs go to the stats panel
+        self.task_metrics = None
+        # JSON lines log of every run, if CODEMERGER_METRICS_LOG is set
+        self.metrics_log = default_metrics_log()
 
         # --- Style Configuration ---
         self.style = ttk.Style()
@@ -51,12 +101,10 @@ class CodeMergerApp:
         # General widget styling
         self.style.configure('.', background=BG_COLOR, foreground=FG_COLOR, font=(FONT_FAMILY_MAIN, FONT_SIZE_NORMAL))
         self.style.configure('TFrame', background=BG_COLOR)
-        self.style.configure('Checkbox.TFrame', background=CHECKBOX_FRAME_BG) # Style for frame inside canvas
 
         # Label styling
         self.style.configure('TLabel', background=BG_COLOR, foreground=FG_COLOR, font=(FONT_FAMILY_MAIN, FONT_SIZE_NORMAL))
         self.style.configure('Header.TLabel', font=(FONT_FAMILY_MAIN, FONT_SIZE_LABEL, 'bold'), foreground=ACCENT_COLOR_ORANGE)
-        self.style.configure('Checkbox.TLabel', background=CHECKBOX_FRAME_BG, foreground=PREVIEW_AREA_FG, font=(FONT_FAMILY_CODE, FONT_SIZE_CHECKBOX))
 
         # Entry styling
         self.style.configure('TEntry', fieldbackground=ENTRY_BG, foreground=ENTRY_FG, insertcolor=FG_COLOR, borderwidth=1, relief=tk.FLAT)
@@ -66,22 +114,21 @@ class CodeMergerApp:
         self.style.configure('TButton', background=BUTTON_BG, foreground=BUTTON_FG, font=(FONT_FAMILY_MAIN, FONT_SIZE_NORMAL, 'bold'), borderwidth=0, relief=tk.RAISED, padding=(10, 5))
         self.style.map('TButton', background=[('active', BUTTON_ACTIVE_BG), ('disabled', '#555555'), ('!disabled', BUTTON_BG)], foreground=[('disabled', '#999999'), ('!disabled', BUTTON_FG)])
 
+        # Checkbutton styling (options row)
+        self.style.configure('TCheckbutton', background=BG_COLOR, foreground=FG_COLOR, indicatorcolor=ENTRY_BG)
+        self.style.map('TCheckbutton', indicatorcolor=[('selected', CHECKBOX_SELECT_COLOR)], background=[('active', BG_COLOR)])
+
         # Separator styling
         self.style.configure('TSeparator', background=SEPARATOR_COLOR)
 
-        # Checkbox styling (configure Checkbutton itself)
-        self.style.configure('TCheckbutton',
-                             background=CHECKBOX_FRAME_BG, # Background of the checkbox area
-                             foreground=PREVIEW_AREA_FG,    # Text color
-                             font=(FONT_FAMILY_CODE, FONT_SIZE_CHECKBOX),
-                             indicatorcolor=BG_COLOR, # Border of the box
-                             selectcolor=CHECKBOX_SELECT_COLOR # Color of the checkmark when selected
-                             )
-        self.style.map('TCheckbutton',
-                       indicatorcolor=[('selected', BG_COLOR), ('!selected', BG_COLOR)], # Keep box border consistent
-                       selectcolor=[('selected', CHECKBOX_SELECT_COLOR), ('!selected', CHECKBOX_FRAME_BG)], # Checkmark color / box fill color when not selected
-                       foreground=[('disabled', '#777777'), ('active', FG_COLOR)] # Text color states
-                       )
+        # File list styling (Treeview rows with checkbox images)
+        self.style.configure('Files.Treeview',
+                             background=CHECKBOX_FRAME_BG, fieldbackground=CHECKBOX_FRAME_BG,
+                             foreground=PREVIEW_AREA_FG, font=(FONT_FAMILY_CODE, FONT_SIZE_CHECKBOX),
+                             borderwidth=1, relief=tk.FLAT)
+        self.style.map('Files.Treeview',
+                       background=[('selected', ENTRY_BG)],
+                       foreground=[('selected', FG_COLOR)])
         # --- Main Frame ---
         main_frame = ttk.Frame(root, padding="15 15 15 15")
         main_frame.pack(expand=True, fill=tk.BOTH)
@@ -101,17 +148,57 @@ class CodeMergerApp:
         self.folder_entry.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         self.browse_button = ttk.Button(input_section_frame, text="Browse...", command=self.browse_folder, width=10)
         self.browse_button.grid(row=1, column=2, padx=5, pady=5)
-        # Extension Input
-        ttk.Label(input_section_frame, text="File Extension:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
-        self.extension_var = tk.StringVar(value=".py")
-        self.extension_entry = ttk.Entry(input_section_frame, textvariable=self.extension_var, width=15)
-        self.extension_entry.grid(row=2, column=1, padx=5, pady=5, sticky="w")
-        # Exclude Folders Input
+        # Extension Input (one or more, e.g. ".py, .pyi")
+        ttk.Label(input_section_frame, text="File Extensions:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        extension_frame = ttk.Frame(input_section_frame)
+        extension_frame.grid(row=2, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+        self.extension_var = tk.StringVar(value=core.DEFAULT_EXTENSION)
+        self.extension_entry = ttk.Entry(extension_frame, textvariable=self.extension_var, width=30)
+        self.extension_entry.pack(side=tk.LEFT)
+        self.use_gitignore_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(extension_frame, text="Respect .gitignore", variable=self.use_gitignore_var).pack(side=tk.LEFT, padx=(15, 0))
+        # Exclude Folders Input (bare names, or globs such as tests/** and *_pb2.py)
         ttk.Label(input_section_frame, text="Exclude Folders:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
-        ttk.Label(input_section_frame, text="(comma-separated)", font=(FONT_FAMILY_MAIN, FONT_SIZE_NORMAL - 2)).grid(row=4, column=0, padx=5, pady=(0,5), sticky="nw")
-        self.exclude_folders_var = tk.StringVar(value="venv, .git, __pycache__, node_modules, build, dist")
+        ttk.Label(input_section_frame, text="(names or globs)", font=(FONT_FAMILY_MAIN, FONT_SIZE_NORMAL - 2)).grid(row=4, column=0, padx=5, pady=(0,5), sticky="nw")
+        self.exclude_folders_var = tk.StringVar(value=core.DEFAULT_EXCLUDED_FOLDERS)
         self.exclude_folders_entry = ttk.Entry(input_section_frame, textvariable=self.exclude_folders_var, width=60)
         self.exclude_folders_entry.grid(row=3, column=1, columnspan=2, padx=5, pady=5, sticky="ew", rowspan=2)
+        # Include Globs Input (optional)
+        ttk.Label(input_section_frame, text="Include Only:").grid(row=5, column=0, padx=5, pady=5, sticky="w")
+        self.include_var = tk.StringVar(value="")
+        self.include_entry = ttk.Entry(input_section_frame, textvariable=self.include_var, width=60)
+        self.include_entry.grid(row=5, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+        # Cache Options
+        ttk.Label(input_section_frame, text="Cache:").grid(row=6, column=0, padx=5, pady=5, sticky="w")
+        cache_frame = ttk.Frame(input_section_frame)
+        cache_frame.grid(row=6, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+        # Opt-in, like --cache: it keeps a copy of every merged file's text on disk
+        self.use_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(cache_frame, text=f"Reuse unchanged listings and files (stores their text in {default_cache_dir()})",
+                        variable=self.use_cache_var).pack(side=tk.LEFT)
+        self.clear_cache_button = ttk.Button(cache_frame, text="Clear Cache", command=self.clear_cache)
+        self.clear_cache_button.pack(side=tk.LEFT, padx=(10, 0))
+        # Pre-merge checks (analysis.analyze_files)
+        ttk.Label(input_section_frame, text="Checks:").grid(row=7, column=0, padx=5, pady=5, sticky="w")
+        checks_frame = ttk.Frame(input_section_frame)
+        checks_frame.grid(row=7, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+        self.analyze_var = tk.BooleanVar(value=False) # Opt-in, like --analyze: by default the output is every file in full
+        ttk.Checkbutton(checks_frame, text="Collapse duplicates, skip binary/minified files", variable=self.analyze_var).pack(side=tk.LEFT)
+        ttk.Label(checks_frame, text="Truncate Above (KB):").pack(side=tk.LEFT, padx=(15, 5))
+        self.max_file_kb_var = tk.StringVar(value=str(DEFAULT_MAX_FILE_BYTES // 1024))
+        ttk.Entry(checks_frame, textvariable=self.max_file_kb_var, width=8).pack(side=tk.LEFT)
+        # Saved profiles (profiles.ProfileStore): fields plus the unchecked files; run in bulk with `--batch`
+        ttk.Label(input_section_frame, text="Profile:").grid(row=8, column=0, padx=5, pady=5, sticky="w")
+        profile_frame = ttk.Frame(input_section_frame)
+        profile_frame.grid(row=8, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+        self.profile_store = ProfileStore()
+        self.profile_var = tk.StringVar(value="")
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.profile_var, width=28, values=self.profile_names())
+        self.profile_combo.pack(side=tk.LEFT)
+        self.load_profile_button = ttk.Button(profile_frame, text="Load", command=self.load_profile)
+        self.load_profile_button.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(profile_frame, text="Save", command=self.save_profile).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(profile_frame, text="Delete", command=self.delete_profile).pack(side=tk.LEFT, padx=(10, 0))
 
         # --- Separator ---
         ttk.Separator(main_frame, orient=tk.HORIZONTAL).grid(row=1, column=0, sticky="ew", pady=10)
@@ -121,8 +208,15 @@ class CodeMergerApp:
         action_frame.grid(row=2, column=0, pady=5)
         self.preview_button = ttk.Button(action_frame, text="Preview Files", command=self.preview_files)
         self.preview_button.pack(side=tk.LEFT, padx=10)
+        self.load_button = ttk.Button(action_frame, text="Load JSONL...", command=self.load_jsonl)
+        self.load_button.pack(side=tk.LEFT, padx=10)
         self.combine_button = ttk.Button(action_frame, text="Combine Files", command=self.combine_files)
         self.combine_button.pack(side=tk.LEFT, padx=10)
+        self.cancel_button = ttk.Button(action_frame, text="Cancel", command=self.cancel_task, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=10)
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch_checkbutton = ttk.Checkbutton(action_frame, text="Live Refresh", variable=self.watch_var, command=self.toggle_watch)
+        self.watch_checkbutton.pack(side=tk.LEFT, padx=10)
 
         # --- Separator ---
         ttk.Separator(main_frame, orient=tk.HORIZONTAL).grid(row=3, column=0, sticky="ew", pady=10)
@@ -134,32 +228,20 @@ class CodeMergerApp:
         preview_section_frame.rowconfigure(1, weight=1)
 
         ttk.Label(preview_section_frame, text="Files to be Included:", style='Header.TLabel').grid(row=0, column=0, sticky="w", pady=(0, 5))
-
-        # Create a Canvas and a Scrollbar
-        self.preview_canvas = tk.Canvas(preview_section_frame, bg=BG_COLOR, highlightthickness=1, highlightbackground=SEPARATOR_COLOR) # Use canvas bg, add border
-        self.preview_scrollbar = ttk.Scrollbar(preview_section_frame, orient="vertical", command=self.preview_canvas.yview)
-        self.preview_canvas.configure(yscrollcommand=self.preview_scrollbar.set)
-
-        self.preview_canvas.grid(row=1, column=0, sticky="nsew")
-        self.preview_scrollbar.grid(row=1, column=1, sticky="ns")
-
-        # Create a Frame INSIDE the Canvas
-        self.checkbox_frame = ttk.Frame(self.preview_canvas, style='Checkbox.TFrame') # Use specific style
-        self.canvas_frame_id = self.preview_canvas.create_window((0, 0), window=self.checkbox_frame, anchor="nw")
-
-        # Bind events for scrolling and resizing
-        self.checkbox_frame.bind("<Configure>", self.on_frame_configure)
-        self.preview_canvas.bind("<Configure>", self.on_canvas_configure)
-        # Mouse wheel scrolling (platform specific)
-        if platform.system() == "Windows":
-            self.preview_canvas.bind_all("<MouseWheel>", self.on_mousewheel)
-        elif platform.system() == "Darwin": # macOS
-             self.preview_canvas.bind_all("<MouseWheel>", self.on_mousewheel) # Tkinter handles this similarly now
-             self.preview_canvas.bind_all("<Button-4>", self.on_mousewheel) # Older binding might be needed
-             self.preview_canvas.bind_all("<Button-5>", self.on_mousewheel)
-        else: # Linux
-            self.preview_canvas.bind("<Button-4>", self.on_mousewheel)
-            self.preview_canvas.bind("<Button-5>", self.on_mousewheel)
+        selection_actions_frame = ttk.Frame(preview_section_frame)
+        selection_actions_frame.grid(row=0, column=1, sticky="e", pady=(0, 5))
+        # Filter box: narrows the list to matching paths as you type; Select All/None then apply to the matches
+        ttk.Label(selection_actions_frame, text="Filter:").pack(side=tk.LEFT, padx=(0, 5))
+        self.filter_var = tk.StringVar(value="")
+        ttk.Entry(selection_actions_frame, textvariable=self.filter_var, width=30).pack(side=tk.LEFT, padx=(0, 10))
+        self.filter_var.trace_add("write", self.apply_file_filter)
+        ttk.Button(selection_actions_frame, text="Select All", command=lambda: self.file_tree.set_all(True)).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(selection_actions_frame, text="Select None", command=lambda: self.file_tree.set_all(False)).pack(side=tk.LEFT)
+
+        # Virtualized checkbox tree: rows are only created for expanded directories
+        self.file_tree = FileTreeView(preview_section_frame, check_color=CHECKBOX_SELECT_COLOR, box_color=CHECKBOX_FRAME_BG, style='Files.Treeview')
+        self.file_tree.grid(row=1, column=0, columnspan=2, sticky="nsew")
+        self.file_tree.on_change = self.on_selection_change
 
 
         # --- Separator ---
@@ -172,10 +254,31 @@ class CodeMergerApp:
         ttk.Label(output_section_frame, text="Combined Output:", style='Header.TLabel').grid(row=0, column=0, sticky="w")
         output_actions_frame = ttk.Frame(output_section_frame)
         output_actions_frame.grid(row=0, column=1, sticky="e")
+        # Optional token budget: Save Output then writes one file per chunk, split between files
+        ttk.Label(output_actions_frame, text="Max Tokens/File:").pack(side=tk.LEFT, padx=(0, 5))
+        self.max_tokens_var = tk.StringVar(value="")
+        ttk.Entry(output_actions_frame, textvariable=self.max_tokens_var, width=10).pack(side=tk.LEFT, padx=(0, 10))
         self.copy_button = ttk.Button(output_actions_frame, text="Copy Output", command=self.copy_output, state=tk.DISABLED)
         self.copy_button.pack(side=tk.LEFT, padx=(0, 10))
         self.save_button = ttk.Button(output_actions_frame, text="Save Output", command=self.save_output, state=tk.DISABLED)
         self.save_button.pack(side=tk.LEFT, padx=0)
+        # File-jump index: one entry per block of the shown output, in output order
+        jump_frame = ttk.Frame(output_section_frame)
+        jump_frame.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        jump_frame.columnconfigure(1, weight=1)
+        ttk.Label(jump_frame, text="Jump to File:").grid(row=0, column=0, padx=(0, 5), sticky="w")
+        self.jump_var = tk.StringVar(value="")
+        self.jump_combo = ttk.Combobox(jump_frame, textvariable=self.jump_var, state="disabled")
+        self.jump_combo.grid(row=0, column=1, sticky="ew")
+        self.jump_combo.bind("<<ComboboxSelected>>", self.jump_to_file)
+        # Find in the merged output (search.ContentIndex over its bytes, not a scan of the widget)
+        ttk.Label(jump_frame, text="Find:").grid(row=0, column=2, padx=(10, 5), sticky="w")
+        self.find_var = tk.StringVar(value="")
+        find_entry = ttk.Entry(jump_frame, textvariable=self.find_var, width=25)
+        find_entry.grid(row=0, column=3, sticky="w")
+        find_entry.bind("<Return>", self.find_in_output)
+        ttk.Button(jump_frame, text="Find Next", command=self.find_in_output).grid(row=0, column=4, padx=(10, 0))
+        self.jump_targets = [] # (full path, 0-based line of its block in a spooled output, else None) per entry
         output_text_frame = ttk.Frame(main_frame, relief=tk.SOLID, borderwidth=1, style='Output.TFrame')
         output_text_frame.grid(row=7, column=0, sticky="nsew", pady=5)
         output_text_frame.columnconfigure(0, weight=1)
@@ -187,42 +290,29 @@ class CodeMergerApp:
         )
         self.output_text.grid(row=0, column=0, sticky="nsew", padx=1, pady=1)
         self.output_text.configure(state=tk.DISABLED)
+        self.output_text.tag_configure("find_match", background=ACCENT_COLOR_ORANGE, foreground="#000000")
+        # Where each file's block starts in output_text, for in-place live refresh
+        self.output_blocks = OutputBlocks(self.output_text)
+        # Large merges: the spooled output (mappedoutput.MappedOutput) or None, and its windowed view
+        self.mapped_output = None
+        self.lazy_output = LazyOutputView(self.output_text, self.output_text.vbar)
+
+        # --- Stats Panel (collapsed by default) ---
+        self.stats_panel = StatsPanel(main_frame, text_options={"bg": TEXT_AREA_BG, "fg": TEXT_AREA_FG, "font": (FONT_FAMILY_CODE, FONT_SIZE_CODE - 1)})
+        self.stats_panel.grid(row=8, column=0, sticky="ew", pady=(5, 0))
 
         # --- Status Bar ---
         status_bar = ttk.Label(root, text="Status: Idle", relief=tk.FLAT, anchor=tk.W, padding=(5, 3), foreground=ACCENT_COLOR_ORANGE, background="#000000", font=(FONT_FAMILY_CODE, FONT_SIZE_NORMAL - 1))
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         self.status_var = tk.StringVar(value="Status: Idle")
         status_bar.configure(textvariable=self.status_var)
+        # Closing must also delete a spooled output's temp file
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    # --- Canvas/Frame/Scrolling Event Handlers ---
-    def on_frame_configure(self, event=None):
-        """Reset the scroll region to encompass the inner frame"""
-        self.preview_canvas.configure(scrollregion=self.preview_canvas.bbox("all"))
-
-    def on_canvas_configure(self, event):
-        """Set the inner frame width to the canvas width"""
-        canvas_width = event.width
-        self.preview_canvas.itemconfig(self.canvas_frame_id, width=canvas_width)
-
-    def on_mousewheel(self, event):
-        """Handle mouse wheel scrolling"""
-        if platform.system() == 'Darwin': # macOS specific delta
-             delta = event.delta
-        elif platform.system() == 'Windows':
-             delta = -1 * int(event.delta / 120) # Windows delta is different
-        else: # Linux Button-4 / Button-5
-            if event.num == 4:
-                delta = -1
-            elif event.num == 5:
-                delta = 1
-            else:
-                delta = 0
-
-        # Check if cursor is over the canvas before scrolling
-        widget_under_cursor = self.root.winfo_containing(event.x_root, event.y_root)
-        if widget_under_cursor == self.preview_canvas or widget_under_cursor.master == self.checkbox_frame:
-             self.preview_canvas.yview_scroll(delta, "units")
-
+    def on_close(self):
+        self.stop_watch()
+        self.clear_output()
+        self.root.destroy()
 
     # --- Core Logic Methods ---
 
@@ -236,132 +326,366 @@ class CodeMergerApp:
 
     def clear_results(self):
         """Clears the preview and output areas and resets buttons and data."""
-        # Clear checkboxes from the frame
-        for widget in self.checkbox_frame.winfo_children():
-            widget.destroy()
-        self.file_checkbox_vars.clear() # Clear the stored variable states
+        self.stop_watch()
+        # Clear the file list (only expanded rows exist, so this is cheap)
+        self.file_tree.clear()
+        self.file_selection = None
         self.last_previewed_files = [] # Clear the list of files
+        self.token_counter = None
+        self.clear_output()
+        # Don't reset status here, let the calling function set it
 
-        # Reset scroll region after clearing
-        self.on_frame_configure()
-        self.preview_canvas.yview_moveto(0) # Scroll back to top
-
-        # Clear output text
+    def clear_output(self):
+        """Clears the output area and disables Save/Copy."""
+        self.combined_files = []
+        self.merge_plan = None
+        self.merge_inputs = set()
+        self.analysis_options = None
+        if self.watcher is not None: self.watcher.session.set_plan(None, None)
+        self.output_blocks.clear()
+        if self.mapped_output is not None:
+            self.lazy_output.reset()
+            self.mapped_output.close()
+            self.mapped_output = None
+        self.content_index = None
+        self.set_jump_targets([])
         self.output_text.configure(state=tk.NORMAL)
         self.output_text.delete('1.0', tk.END)
         self.output_text.configure(state=tk.DISABLED)
-
-        # Disable Save and Copy buttons
         self.save_button.config(state=tk.DISABLED)
         self.copy_button.config(state=tk.DISABLED)
-        # Don't reset status here, let the calling function set it
 
-    def get_excluded_folders(self):
-        """Parses the excluded folders string into a set."""
-        exclude_str = self.exclude_folders_var.get().strip()
-        if not exclude_str: return set()
-        return {folder.strip() for folder in exclude_str.split(',') if folder.strip()}
+    def get_cache(self):
+        """Returns the persistent cache if enabled (opening it on first use), else None."""
+        if not self.use_cache_var.get(): return None
+        if self.cache is None:
+            try:
+                self.cache = MergeCache()
+            except Exception as e:
+                print(f"Warning: Cache unavailable: {e}")
+                self.use_cache_var.set(False)
+                return None
+        return self.cache
 
-    def find_files(self):
-        """Finds files, respecting exclusions. Returns list of full paths or None."""
-        folder_path = self.folder_path_var.get()
-        extension = self.extension_var.get().strip()
-        if not folder_path or not os.path.isdir(folder_path):
-            messagebox.showerror("Error", "Please select a valid target directory.")
-            self.status_var.set("Status: Error - Invalid directory")
-            return None
-        if not extension or not extension.startswith('.'):
-            messagebox.showerror("Error", "Please enter a valid file extension (e.g., .py).")
-            self.status_var.set("Status: Error - Invalid extension format")
-            return None
-
-        excluded_folders = self.get_excluded_folders()
-        found_files = []
-        self.status_var.set(f"Status: Searching for '{extension}' files...")
-        self.root.update_idletasks()
+    def clear_cache(self):
+        """Empties the persistent cache."""
         try:
-            for root_dir, dirs, files in os.walk(folder_path, topdown=True):
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in excluded_folders]
-                for file in files:
-                    if file.endswith(extension):
-                        try:
-                            file_path = os.path.join(root_dir, file)
-                            if os.path.commonpath([folder_path]) == os.path.commonpath([folder_path, file_path]):
-                                found_files.append(file_path)
-                        except Exception as e: print(f"Warning: Skipping {os.path.join(root_dir, file)} due to path issue: {e}")
-            return found_files
+            cache = self.cache or MergeCache()
+            cache.clear()
+            self.cache = cache
+            self.status_var.set("Status: Cache cleared.")
         except Exception as e:
-            messagebox.showerror("Error", f"Error during file search:\n{str(e)}")
-            self.status_var.set(f"Status: Error - File search failed: {str(e)}")
-            return None
+            messagebox.showerror("Error", f"Failed to clear cache:\n{str(e)}")
+            self.status_var.set(f"Status: Error - Failed to clear cache: {str(e)}")
+
+    def get_file_filter(self, folder_path):
+        """Compiles the extension/exclude/include fields into a FileFilter; raises core.InputError."""
+        return core.build_filter(folder_path, self.extension_var.get(), self.exclude_folders_var.get(),
+                                 self.include_var.get(), self.use_gitignore_var.get())
+
+    # --- Background Task Handling ---
+
+    def run_in_background(self, func, on_done, error_title, metrics=None):
+        """Runs func(task) on a worker thread; on_done(result) is called back on the Tk thread.
+
+        With ``metrics`` (a RunMetrics filled in by func and on_done), the run is
+        reported in the stats panel and metrics log once on_done returns.
+        """
+        if metrics is not None and self.stats_panel.take_profile_request():
+            func = self.profiled(func, metrics)
+        self.task = tasks.BackgroundTask(func, progress_interval=STATUS_UPDATE_INTERVAL).start()
+        self.task_on_done = on_done
+        self.task_error_title = error_title
+        self.task_metrics = metrics
+        self.set_busy(True)
+        self.root.after(QUEUE_POLL_INTERVAL_MS, self.poll_task)
+
+    def set_busy(self, busy):
+        """Toggles the action buttons while a background task is running."""
+        state = tk.DISABLED if busy else tk.NORMAL
+        self.preview_button.config(state=state)
+        self.combine_button.config(state=state)
+        self.browse_button.config(state=state)
+        self.load_button.config(state=state)
+        self.load_profile_button.config(state=state)
+        self.clear_cache_button.config(state=state)
+        self.watch_checkbutton.config(state=state)
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+        output_state = tk.NORMAL if not busy and self.combined_files else tk.DISABLED
+        self.copy_button.config(state=output_state)
+        self.save_button.config(state=output_state)
+
+    def cancel_task(self):
+        """Asks the running scan/merge to stop before its next directory or file."""
+        if self.task is not None:
+            self.task.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_var.set("Status: Cancelling...")
+
+    def poll_task(self):
+        """Drains the worker's message queue; reschedules itself until the task finishes."""
+        task = self.task
+        if task is None: return
+        for kind, payload in task.poll():
+            if kind == tasks.PROGRESS:
+                self.status_var.set(payload)
+                continue
+            # Any other message is final
+            self.task = None
+            self.set_busy(False)
+            if kind == tasks.DONE:
+                metrics = self.task_metrics
+                self.task_on_done(payload)
+                if metrics is not None: self.report_metrics(metrics)
+            elif kind == tasks.CANCELLED:
+                self.status_var.set("Status: Cancelled.")
+            else:
+                messagebox.showerror("Error", f"{self.task_error_title}:\n{str(payload)}")
+                self.status_var.set(f"Status: Error - {str(payload)}")
+            return
+        self.root.after(QUEUE_POLL_INTERVAL_MS, self.poll_task)
+
+    @staticmethod
+    def profiled(func, metrics):
+        """Wraps a task function in a cProfile/tracemalloc capture (the stats panel's 'Profile next run')."""
+        profile_dir = os.path.join(default_cache_dir(), "profiles")
+        def run(task):
+            with ProfileCapture(profile_dir, metrics.operation, metrics):
+                return func(task)
+        return run
+
+    @staticmethod
+    def rendered(metrics, on_done):
+        """Wraps a task's on_done callback so the time it spends updating widgets counts as the render phase."""
+        def render(result):
+            with metrics.phase("render"):
+                on_done(result)
+        return render
+
+    def report_metrics(self, metrics):
+        """Shows a finished run in the stats panel and appends it to the metrics log (Tk thread)."""
+        self.stats_panel.show(metrics)
+        if self.metrics_log is not None:
+            try:
+                self.metrics_log.write(metrics)
+            except OSError as e:
+                print(f"Warning: Could not write metrics log: {e}")
+        if metrics.profile_paths:
+            self.status_var.set(f"{self.status_var.get()} Profile saved to {metrics.profile_paths[0]}")
+
+    # --- Preview ---
 
-    def preview_files(self):
-        """Finds files and populates the checkbox list."""
+    def preview_files(self, unchecked=()):
+        """Finds files on a worker thread, then populates the checkbox list.
+
+        ``unchecked`` ('/'-separated relative paths, e.g. from a profile) start unchecked.
+        """
         self.clear_results() # Clear previous results first
         folder_path = self.folder_path_var.get()
         if not folder_path:
              messagebox.showerror("Error", "Please select a target directory first.")
              self.status_var.set("Status: Select a directory.")
              return
+        try:
+            file_filter = self.get_file_filter(folder_path)
+        except core.InputError as e:
+            messagebox.showerror("Error", str(e))
+            self.status_var.set(f"Status: Error - {e.status}")
+            return
+        extension = file_filter.describe()
+        cache = self.get_cache()
+        # Filter time is only split out of the walk when someone will look at it: it costs time per entry
+        filter_timing = self.stats_panel.expanded or self.stats_panel.profile_var.get() or self.metrics_log is not None
+        metrics = RunMetrics("preview", folder_path, filter_timing)
+
+        def scan(task):
+            def on_progress(files_found):
+                task.progress(f"Status: Searching for '{extension}' files... {files_found} found")
+            lister = cache.lister(folder_path) if cache else None
+            found_files = metrics.scan(lambda instrumented_filter: core.find_files(
+                folder_path, instrumented_filter, task.cancel_event, on_progress=on_progress, lister=lister), file_filter)
+            if lister is not None: lister.commit()
+            metrics.count("found", len(found_files))
+            # Sizes are one stat per file; tokens are exact where counted before, else estimated from the size
+            task.progress(f"Status: Estimating tokens for {len(found_files)} file(s)...")
+            with metrics.phase("estimate"):
+                counter = TokenCounter.load(cache, folder_path)
+                stats = counter.file_stats(found_files)
+            with metrics.phase("index"):
+                path_index = PathIndex([core.relative_path(path, folder_path) for path in found_files])
+            return found_files, counter, stats, path_index
 
-        self.last_previewed_files = self.find_files() # Get the list of full paths
+        self.status_var.set(f"Status: Searching for '{extension}' files...")
+        def on_scanned(scanned):
+            self.populate_preview(*scanned, folder_path)
+            if unchecked and self.file_selection:
+                self.file_selection.uncheck_rel_paths(unchecked)
+                self.file_tree.reload(self.file_selection)
+                self.apply_file_filter()
+                self.on_selection_change()
+
+        self.run_in_background(scan, self.rendered(metrics, on_scanned), "Error during file search", metrics)
 
-        if self.last_previewed_files is None: return # Error occurred
+    def populate_preview(self, found_files, counter, stats, path_index, folder_path):
+        """Fills the file list with the scan results (Tk thread); ``path_index`` is their search.PathIndex."""
+        self.last_previewed_files = found_files
+        self.token_counter = counter
 
         if not self.last_previewed_files:
-            # Display message inside the checkbox frame if no files found
-            no_files_label = ttk.Label(self.checkbox_frame, text="No matching files found.", style='Checkbox.TLabel')
-            no_files_label.pack(pady=10, padx=10)
+            # Display message inside the file list if no files found
+            self.file_tree.show_message("No matching files found.")
             self.status_var.set("Status: Preview complete. No matching files found.")
         else:
-            # --- Populate Checkbox List ---
-            self.file_checkbox_vars.clear() # Clear previous vars
-            try:
-                for full_path in self.last_previewed_files:
-                    var = tk.BooleanVar(value=True) # Default to checked
-                    self.file_checkbox_vars[full_path] = var
-                    relative_path = os.path.relpath(full_path, folder_path)
-                    cb = ttk.Checkbutton(self.checkbox_frame, text=relative_path, variable=var, style='TCheckbutton')
-                    cb.pack(anchor='w', padx=5, pady=2, fill='x') # Fill horizontally
-                self.status_var.set(f"Status: Preview complete. Found {len(self.last_previewed_files)} file(s). Ready to combine.")
-            except ValueError as e:
-                 messagebox.showerror("Error", f"Could not determine relative paths:\n{e}\nCheckboxes will show full paths.")
-                 self.status_var.set(f"Status: Preview complete (full paths). Found {len(self.last_previewed_files)} file(s).")
-                 # Fallback to full paths in checkboxes if relpath fails
-                 self.file_checkbox_vars.clear()
-                 for full_path in self.last_previewed_files:
-                     var = tk.BooleanVar(value=True)
-                     self.file_checkbox_vars[full_path] = var
-                     cb = ttk.Checkbutton(self.checkbox_frame, text=full_path, variable=var, style='TCheckbutton')
-                     cb.pack(anchor='w', padx=5, pady=2, fill='x')
-
-        # Update scroll region after adding widgets
-        self.on_frame_configure()
-        self.preview_canvas.yview_moveto(0) # Scroll to top
-
+            # --- Populate File List (all checked by default) ---
+            self.file_selection = FileSelection(self.last_previewed_files, folder_path)
+            self.file_selection.set_stats(*stats)
+            self.path_index = (self.file_selection, path_index)
+            self.file_tree.load(self.file_selection)
+            self.status_var.set(f"Status: Preview complete. Found {len(self.last_previewed_files)} file(s), "
+                                f"~{self.file_selection.selected_tokens():,} tokens. Ready to combine.")
+
+        self.apply_file_filter()
         # Keep Save/Copy disabled after only previewing
         self.save_button.config(state=tk.DISABLED)
         self.copy_button.config(state=tk.DISABLED)
 
+    def load_jsonl(self):
+        """Rebuilds the preview selection from a saved JSONL merge instead of rescanning the tree."""
+        input_path = filedialog.askopenfilename(
+            filetypes=[("CodeMerger JSONL", "*.jsonl *.jsonl.gz *.jsonl.zst"), ("All Files", "*.*")],
+            title="Load Files from a JSONL Merge"
+        )
+        if not input_path: return
+        cache = self.get_cache()
+
+        def load(task):
+            archive = read_jsonl(input_path)
+            listed = []
+            sizes = {}
+            tokens = {}
+            counter = TokenCounter.load(cache, archive.root)
+            # One pass over the records: each file's content is only held while it is counted
+            for record in archive.records():
+                if "error" in record: continue
+                count = counter.count(record["content"])
+                for rel_path in [record["path"], *record.get("duplicates", ())]:
+                    full_path = archive.full_path(rel_path)
+                    listed.append(full_path)
+                    sizes[full_path], tokens[full_path] = record["size"], count
+            # Files deleted since the merge are dropped: one stat each, still no directory walk
+            found_files = [path for path in listed if os.path.isfile(path)]
+            stats = ([sizes[path] for path in found_files], [tokens[path] for path in found_files])
+            path_index = PathIndex([core.relative_path(path, archive.root) for path in found_files])
+            return archive.root, found_files, counter, stats, path_index, len(listed) - len(found_files)
+
+        def on_loaded(loaded):
+            folder_path, found_files, counter, stats, path_index, missing = loaded
+            self.clear_results()
+            self.folder_path_var.set(folder_path)
+            self.populate_preview(found_files, counter, stats, path_index, folder_path)
+            status_msg = f"Status: Loaded {len(found_files)} file(s) from {os.path.basename(input_path)}."
+            if missing: status_msg += f" {missing} file(s) no longer exist."
+            self.status_var.set(status_msg)
+
+        self.status_var.set(f"Status: Loading {input_path}...")
+        self.run_in_background(load, on_loaded, "Failed to load JSONL file")
+
+    def get_path_index(self):
+        """PathIndex of the current selection (prebuilt by the scan; rebuilt here after a live refresh)."""
+        if self.path_index is None or self.path_index[0] is not self.file_selection:
+            self.path_index = (self.file_selection, PathIndex(self.file_selection.rel_paths))
+        return self.path_index[1]
+
+    def apply_file_filter(self, *args):
+        """Narrows the file list to the paths matching the filter box (all files when it is empty)."""
+        if not self.file_selection: return
+        matches = self.get_path_index().match(self.filter_var.get())
+        if matches is None:
+            self.file_tree.clear_matches()
+            return
+        self.file_tree.show_matches(matches)
+        self.status_var.set(f"Status: {len(matches)} of {len(self.file_selection)} file(s) match the filter "
+                            f"(Select All/None apply to these).")
+
+    def on_selection_change(self):
+        """Reports the selection size after the user toggles files or directories."""
+        selected = self.file_selection.checked_count()
+        self.status_var.set(f"Status: {selected} of {len(self.file_selection)} file(s) selected, "
+                            f"~{self.file_selection.selected_tokens():,} tokens.")
+
+    # --- Profiles ---
+
+    def profile_names(self):
+        try:
+            return self.profile_store.names()
+        except core.InputError as e:
+            print(f"Warning: {e}")
+            return []
+
+    def save_profile(self):
+        """Saves the current fields and unchecked files under the name in the profile box."""
+        name = self.profile_var.get().strip()
+        folder_path = self.folder_path_var.get()
+        if not name or not folder_path:
+            messagebox.showinfo("Info", "Select a directory and type a profile name first.")
+            return
+        max_kb_str = self.max_file_kb_var.get().strip().replace(",", "").replace("_", "")
+        unchecked = self.file_selection.unchecked_rel_paths() if self.file_selection else []
+        profile = MergeProfile(name, os.path.abspath(folder_path), self.extension_var.get(), self.exclude_folders_var.get(),
+                               self.include_var.get(), self.use_gitignore_var.get(), self.analyze_var.get(),
+                               int(max_kb_str) if max_kb_str.isdigit() else None, unchecked=unchecked)
+        try:
+            self.profile_store.save(profile)
+        except (OSError, core.InputError) as e:
+            messagebox.showerror("Error", f"Failed to save profile:\n{str(e)}")
+            return
+        self.profile_combo.config(values=self.profile_names())
+        self.status_var.set(f"Status: Saved profile '{name}' ({len(unchecked)} unchecked file(s)).")
+
+    def load_profile(self):
+        """Fills in the fields from a saved profile and previews its folder with its selection."""
+        name = self.profile_var.get().strip()
+        if not name: return
+        try:
+            profile = self.profile_store.get(name)
+        except core.InputError as e:
+            messagebox.showerror("Error", str(e))
+            self.status_var.set(f"Status: Error - {e.status}")
+            return
+        self.folder_path_var.set(profile.folder)
+        self.extension_var.set(profile.extension)
+        self.exclude_folders_var.set(profile.exclude)
+        self.include_var.set(profile.include)
+        self.use_gitignore_var.set(profile.gitignore)
+        self.analyze_var.set(profile.analyze)
+        if profile.max_file_kb is not None: self.max_file_kb_var.set(str(profile.max_file_kb))
+        self.preview_files(unchecked=profile.unchecked)
+
+    def delete_profile(self):
+        name = self.profile_var.get().strip()
+        if not name or not messagebox.askyesno("Delete Profile", f"Delete profile '{name}'?"): return
+        try:
+            self.profile_store.delete(name)
+        except (OSError, core.InputError) as e:
+            messagebox.showerror("Error", f"Failed to delete profile:\n{str(e)}")
+            return
+        self.profile_var.set("")
+        self.profile_combo.config(values=self.profile_names())
+        self.status_var.set(f"Status: Deleted profile '{name}'.")
+
+    # --- Combine ---
 
     def combine_files(self):
-        """Combines the content of CHECKED files from the preview list."""
+        """Combines the content of CHECKED files from the preview list on a worker thread."""
         folder_path = self.folder_path_var.get() # Needed for relpath fallback
 
         # --- Get list of files to combine based on checkbox state ---
-        files_to_combine = [
-            fp for fp, var in self.file_checkbox_vars.items() if var.get()
-        ]
+        files_to_combine = self.file_selection.selected_paths() if self.file_selection else []
 
         # Clear only the output area, keep the preview checkboxes as they are
-        self.output_text.configure(state=tk.NORMAL)
-        self.output_text.delete('1.0', tk.END)
-        self.output_text.configure(state=tk.DISABLED)
-        self.save_button.config(state=tk.DISABLED)
-        self.copy_button.config(state=tk.DISABLED)
-
+        self.clear_output()
 
-        if not self.file_checkbox_vars:
+        if not self.file_selection:
              self.status_var.set("Status: Please preview files before combining.")
              messagebox.showinfo("Info", "Run 'Preview Files' first to select files.")
              return
@@ -370,68 +694,296 @@ class CodeMergerApp:
              messagebox.showinfo("Info", f"No files are checked in the list above.")
              return
 
-        self.status_var.set(f"Status: Combining {len(files_to_combine)} selected file(s)...")
-        self.root.update_idletasks()
-
-        combined_content = []
-        files_processed_count = 0
-        errors_encountered = 0
-
-        try:
+        analysis_options = None
+        if self.analyze_var.get():
+            max_kb_str = self.max_file_kb_var.get().strip().replace(",", "").replace("_", "")
+            if max_kb_str and not max_kb_str.isdigit():
+                messagebox.showerror("Error", "Truncate Above (KB) must be a whole number (0 or empty for no limit).")
+                self.status_var.set("Status: Error - Invalid size limit")
+                return
+            analysis_options = AnalysisOptions(max_file_bytes=int(max_kb_str or 0) * 1024)
+        total = len(files_to_combine)
+        cache = self.get_cache()
+        counter = self.token_counter
+        metrics = RunMetrics("combine", folder_path)
+
+        def merge(task):
+            nonlocal files_to_combine, total
+            analysis = None
+            if analysis_options is not None:
+                def on_checked(checked, count):
+                    task.progress(f"Status: Checking files ({checked}/{count})...")
+                with metrics.phase("analyze"):
+                    analysis = analyze_files(files_to_combine, folder_path, analysis_options, task.cancel_event,
+                                             workers=core.DEFAULT_READ_WORKERS, on_progress=on_checked)
+                metrics.add_analysis(analysis)
+                files_to_combine, total = analysis.files, len(analysis.files)
+            plan = analysis.plan if analysis is not None else None
+            done = 0
+            def on_file(file_path, ok):
+                nonlocal done
+                done += 1
+                if not ok: print(f"Warning: Could not read file {file_path}: {result.failures[file_path]}")
+                task.progress(f"Status: Processing {core.relative_path(file_path, folder_path)} ({done}/{total})...")
             # --- Read and Combine File Content ---
-            for file_path in files_to_combine: # Iterate through the CHECKED files
-                try:
-                    relative_path = os.path.relpath(file_path, folder_path)
-                except ValueError:
-                    relative_path = file_path # Fallback
-
-                self.status_var.set(f"Status: Processing {relative_path}...")
-                self.root.update_idletasks()
-
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                    combined_content.append(f"--- File: {relative_path} ---")
-                    combined_content.append(content.strip())
-                    combined_content.append(f"--- End File: {relative_path} ---\n")
-                    files_processed_count += 1
-                except Exception as e:
-                    errors_encountered += 1
-                    error_msg = f"--- Error reading file: {relative_path} ---\nError: {str(e)}\n--- End Error ---\n"
-                    combined_content.append(error_msg)
-                    print(f"Warning: Could not read file {file_path}: {e}")
-
-            final_output = "\n".join(combined_content)
-
-            # --- Update Output Text Area ---
+            # Blocks are kept in memory up to OUTPUT_INLINE_MAX_CHARS, then everything goes to a temp file
+            cached_reader = cache.reader(folder_path, on_decode=metrics.count_decode) if cache else None
+            # Every file read is also counted, replacing its size-based token estimate
+            reader = counter.reader(metrics.reader(cached_reader))
+            blocks = [] # (path, block) while the output still fits inline
+            inline_chars = 0
+            spool = None
+            result = core.MergeResult()
+            try:
+                with metrics.phase("assemble"):
+                    for file_path, block, ok in core.iter_blocks(files_to_combine, folder_path, result, task.cancel_event,
+                                                                 workers=core.DEFAULT_READ_WORKERS, reader=reader, plan=plan):
+                        if spool is None:
+                            blocks.append((file_path, block))
+                            inline_chars += len(block) + 1
+                            if inline_chars > OUTPUT_INLINE_MAX_CHARS:
+                                spool = MergeSpool()
+                                for spooled_path, spooled_block in blocks: spool.add_block(spooled_path, spooled_block)
+                                blocks = []
+                        else:
+                            spool.add_block(file_path, block)
+                        on_file(file_path, ok)
+                    mapped = spool.finish() if spool is not None else None
+            except BaseException:
+                if spool is not None: spool.discard()
+                raise
+            if cached_reader is not None: cached_reader.commit()
+            counter.save(cache, folder_path)
+            token_counts = {path: counter.known[path][2] for path in files_to_combine if path in counter.known}
+            summary = analysis.summary() if analysis is not None else ""
+            excluded = set(selected_files) - set(files_to_combine)
+            return files_to_combine, blocks, mapped, result, token_counts, plan, summary, excluded
+
+        selected_files = list(files_to_combine)
+        self.analysis_options = analysis_options
+        self.status_var.set(f"Status: Combining {total} selected file(s)...")
+        self.run_in_background(merge, self.rendered(metrics, self.show_combined_output),
+                               "An unexpected error during combining", metrics)
+
+    def show_combined_output(self, merged):
+        """Displays the merged text and updates buttons/status (Tk thread)."""
+        combined_files, blocks, mapped, result, token_counts, plan, summary, excluded = merged
+        files_processed_count = result.processed
+        errors_encountered = result.errors
+        self.combined_files = combined_files
+        self.merge_plan = plan
+        self.merge_inputs = set(combined_files) | excluded
+        if self.watcher is not None: self.watcher.session.set_plan(plan, self.analysis_options, excluded)
+        if self.file_selection is not None:
+            self.file_selection.update_tokens(token_counts)
+            self.file_tree.refresh_stats()
+
+        # --- Update Output Text Area ---
+        self.content_index = None
+        if mapped is not None:
+            # Too large to insert whole: only the lines around the viewport are loaded
+            self.mapped_output = mapped
+            self.lazy_output.show(mapped)
+            self.set_jump_targets([(file_path, line) for file_path, _, line in mapped.blocks])
+        else:
+            block_lines = [] # (path, first line of its block), for live refresh
+            line = 1
+            for file_path, block in blocks:
+                block_lines.append((file_path, line))
+                line += block.count("\n") + 1
             self.output_text.configure(state=tk.NORMAL)
             self.output_text.delete('1.0', tk.END)
-            self.output_text.insert('1.0', final_output)
+            self.output_text.insert('1.0', "\n".join(block for _, block in blocks))
+            self.output_blocks.load(block_lines)
             self.output_text.configure(state=tk.DISABLED)
-
-            # --- Update Button States and Status ---
-            if files_processed_count > 0:
-                self.save_button.config(state=tk.NORMAL)
-                self.copy_button.config(state=tk.NORMAL)
-                status_msg = f"Status: Combined {files_processed_count} selected file(s)."
-                if errors_encountered > 0: status_msg += f" Encountered {errors_encountered} read error(s)."
-                self.status_var.set(status_msg)
-            else:
-                # This case means files were selected but all failed to read
-                self.save_button.config(state=tk.DISABLED)
-                self.copy_button.config(state=tk.DISABLED)
-                self.status_var.set(f"Status: Combine complete. No selected files processed successfully (Errors: {errors_encountered}).")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error during combining:\n{str(e)}")
-            self.status_var.set(f"Status: Error - Combining failed: {str(e)}")
+            self.set_jump_targets([(file_path, None) for file_path in self.output_blocks.order])
+
+        # --- Update Button States and Status ---
+        if files_processed_count > 0:
+            self.save_button.config(state=tk.NORMAL)
+            self.copy_button.config(state=tk.NORMAL)
+            status_msg = f"Status: Combined {files_processed_count} selected file(s), ~{sum(token_counts.values()):,} tokens."
+            if errors_encountered > 0: status_msg += f" Encountered {errors_encountered} read error(s)."
+            if summary: status_msg += f" Checks: {summary}."
+            self.status_var.set(status_msg)
+        else:
+            # This case means files were selected but all failed to read
             self.save_button.config(state=tk.DISABLED)
             self.copy_button.config(state=tk.DISABLED)
+            self.status_var.set(f"Status: Combine complete. No selected files processed successfully (Errors: {errors_encountered}).")
 
 
+    def set_jump_targets(self, targets):
+        """Fills the Jump to File list with ``[(full path, spooled output line or None), ...]``."""
+        folder_path = self.folder_path_var.get()
+        self.jump_targets = targets
+        self.jump_var.set("")
+        self.jump_combo.config(values=[core.relative_path(file_path, folder_path).replace(os.sep, "/") for file_path, _ in targets],
+                               state="readonly" if targets else "disabled")
+
+    def jump_to_file(self, event=None):
+        """Scrolls the output to the block of the file picked in the Jump to File list."""
+        index = self.jump_combo.current()
+        if index < 0: return
+        file_path, line = self.jump_targets[index]
+        if self.lazy_output.active:
+            self.lazy_output.go_to(line)
+        elif file_path in self.output_blocks:
+            self.output_text.yview(self.output_blocks.marks[file_path])
+
+    def get_content_index(self):
+        """ContentIndex of the shown output, built on the first Find after the output changes."""
+        if self.content_index is None:
+            mapped = self.mapped_output
+            if mapped is not None:
+                self.content_index = ContentIndex(mapped.data, mapped.blocks, mapped.line_starts)
+            else:
+                block_lines = [(file_path, int(self.output_text.index(self.output_blocks.marks[file_path]).split(".")[0]) - 1)
+                               for file_path in self.output_blocks.order]
+                self.content_index = ContentIndex.from_text(self.output_text.get("1.0", "end-1c"), block_lines)
+        return self.content_index
+
+    def find_in_output(self, event=None):
+        """Highlights the next match of the Find box in the output, wrapping around at the end."""
+        query = self.find_var.get()
+        if not query or not self.combined_files: return
+        index = self.get_content_index()
+        if query != self.find_query:
+            self.find_query, self.find_offset = query, 0
+        found = index.find(query, self.find_offset)
+        self.output_text.tag_remove("find_match", "1.0", tk.END)
+        if found is None:
+            self.status_var.set(f"Status: '{query}' not found in the output.")
+            return
+        start, end = found
+        wrapped = start < self.find_offset
+        self.find_offset = end
+        line, column = index.position(start)
+        if self.lazy_output.active:
+            self.lazy_output.go_to(max(0, line - FIND_CONTEXT_LINES))
+            row = line - self.lazy_output.first + 1
+        else:
+            row = line + 1
+        match_start = f"{row}.{column}"
+        self.output_text.tag_add("find_match", match_start, f"{match_start}+{index.length(start, end)}c")
+        self.output_text.see(match_start)
+        file_path = index.file_at(start)
+        where = core.relative_path(file_path, self.folder_path_var.get()) if file_path else "the output"
+        self.status_var.set(f"Status: Found '{query}' in {where}, output line {line + 1}." + (" Wrapped to the top." if wrapped else ""))
+
+    # --- Live Refresh ---
+
+    def toggle_watch(self):
+        """Starts or stops watching the previewed tree for changes."""
+        if not self.watch_var.get():
+            self.stop_watch()
+            self.status_var.set("Status: Live refresh off.")
+            return
+        if not self.file_selection:
+            self.watch_var.set(False)
+            messagebox.showinfo("Info", "Run 'Preview Files' first, then enable Live Refresh.")
+            return
+        folder_path = self.folder_path_var.get()
+        try:
+            file_filter = self.get_file_filter(folder_path)
+        except core.InputError as e:
+            self.watch_var.set(False)
+            messagebox.showerror("Error", str(e))
+            return
+
+        plan, analysis_options = self.merge_plan, self.analysis_options
+        excluded = self.merge_inputs - set(self.combined_files)
+
+        def start(task):
+            # Building the session lists the tree once more, so do it off the Tk thread
+            session = WatchSession(folder_path, file_filter, counter=self.token_counter)
+            session.set_plan(plan, analysis_options, excluded)
+            return TreeWatcher(session).start()
+
+        def on_started(watcher):
+            if not self.watch_var.get():
+                watcher.stop()
+                return
+            self.watcher = watcher
+            self.status_var.set(f"Status: Live refresh on ({watcher.kind}).")
+            self.root.after(WATCH_POLL_INTERVAL_MS, self.poll_watch)
+
+        self.status_var.set("Status: Starting live refresh...")
+        self.run_in_background(start, on_started, "Could not start live refresh")
+
+    def stop_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.watch_var.set(False)
+
+    def poll_watch(self):
+        """Applies queued filesystem changes to the file list and the shown output."""
+        watcher = self.watcher
+        if watcher is None: return
+        for item in watcher.poll():
+            if isinstance(item, Exception):
+                self.stop_watch()
+                self.status_var.set(f"Status: Live refresh stopped - {str(item)}")
+                return
+            self.apply_watch_changes(item)
+        self.root.after(WATCH_POLL_INTERVAL_MS, self.poll_watch)
+
+    def apply_watch_changes(self, changes):
+        # --- Patch the file list, keeping the user's checkbox selections ---
+        folder_path = self.folder_path_var.get()
+        self.last_previewed_files = changes.files
+        self.file_selection = FileSelection(changes.files, folder_path, previous=self.file_selection)
+        if changes.stats is not None: self.file_selection.set_stats(*changes.stats)
+        if self.file_selection:
+            self.file_tree.reload(self.file_selection)
+            self.apply_file_filter()
+        else:
+            self.file_tree.show_message("No matching files found.")
+
+        # --- Regenerate only the affected blocks of the shown output ---
+        touched = 0
+        if self.merge_inputs:
+            # New files join the output if checked; the analysis (if any) decides which inputs get a block
+            selected = set(self.file_selection.selected_paths())
+            self.merge_inputs -= changes.removed
+            self.merge_inputs.update(file_path for file_path in changes.added if file_path in selected)
+            if changes.plan is not None: self.merge_plan = changes.plan
+            combined = self.merge_inputs - changes.excluded
+            self.combined_files = [file_path for file_path in changes.files if file_path in combined]
+            if self.mapped_output is None:
+                self.output_text.configure(state=tk.NORMAL)
+                touched = self.output_blocks.apply(changes, combined.__contains__)
+                self.output_text.configure(state=tk.DISABLED)
+                if touched: self.content_index = None
+                self.set_jump_targets([(file_path, None) for file_path in self.output_blocks.order])
+        status_msg = (f"Status: Live refresh - {len(changes.added)} added, {len(changes.removed)} removed, "
+                      f"{len(changes.modified)} modified; {touched} output block(s) updated.")
+        if self.mapped_output is not None and (changes.added or changes.removed or changes.modified):
+            # A spooled output is not patched in place; Save/Copy already use the updated file list
+            status_msg += " Combine again to refresh the large output view."
+        self.status_var.set(status_msg)
+
     def copy_output(self):
-        """Copies the content of the output text area to the clipboard."""
-        content = self.output_text.get('1.0', tk.END).strip()
+        """Copies the combined output to the clipboard (regenerated from disk if it was spooled to a temp file)."""
+        if self.mapped_output is None:
+            self.set_clipboard(self.output_text.get('1.0', tk.END).strip())
+            return
+        folder_path = self.folder_path_var.get()
+        files = list(self.combined_files)
+        plan = self.merge_plan
+        metrics = RunMetrics("copy", folder_path)
+
+        def merge(task):
+            buffer = io.StringIO()
+            with metrics.phase("assemble"):
+                core.write_merge(files, folder_path, buffer, cancel=task.cancel_event, reader=metrics.reader(), plan=plan)
+            return buffer.getvalue().strip()
+
+        self.status_var.set(f"Status: Regenerating output of {len(files)} file(s) for the clipboard...")
+        self.run_in_background(merge, self.set_clipboard, "Failed to copy output", metrics)
+
+    def set_clipboard(self, content):
         if content:
             try:
                 self.root.clipboard_clear()
@@ -445,26 +997,96 @@ class CodeMergerApp:
 
 
     def save_output(self):
-        """Save the content of the output text area to a file."""
-        content_to_save = self.output_text.get('1.0', tk.END).strip()
-        if not content_to_save:
+        """Saves the combined output to a file, streaming it from the source files rather than the output area."""
+        if not self.combined_files:
              messagebox.showwarning("Warning", "There is no output content to save.")
              self.status_var.set("Status: Nothing to save.")
              return
-
-        initial_filename = f"codemerger_output_{self.extension_var.get().strip('.')}.txt"
+        folder_path = self.folder_path_var.get()
+        files = list(self.combined_files)
+        plan = self.merge_plan
+        max_tokens_str = self.max_tokens_var.get().strip().replace(",", "").replace("_", "")
+        if max_tokens_str and (not max_tokens_str.isdigit() or int(max_tokens_str) <= 0):
+            messagebox.showerror("Error", "Max Tokens/File must be a positive whole number (or empty for a single file).")
+            self.status_var.set("Status: Error - Invalid token budget")
+            return
+        max_tokens = int(max_tokens_str) if max_tokens_str else None
+        counter = self.token_counter or TokenCounter()
+        cache = self.get_cache()
+
+        extension_names = "_".join(re.findall(r"[\w-]+", self.extension_var.get())) or "files"
+        initial_filename = f"codemerger_output_{extension_names}.txt"
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".txt", filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")],
+            defaultextension=".txt",
+            filetypes=[("Text Files", "*.txt"), ("Compressed Text", "*.txt.gz *.txt.zst"),
+                       ("JSON Lines (one record per file)", "*.jsonl *.jsonl.gz *.jsonl.zst"),
+                       ("Tar Archive", "*.tar *.tar.gz *.tgz *.tar.zst"), ("All Files", "*.*")],
             initialfile=initial_filename, title="Save Combined Code As"
         )
-        if file_path:
+        if not file_path: return
+        # The format follows the chosen name: .jsonl, .tar, optionally .gz/.zst
+        output_format, compression = detect_format(file_path)
+        formatted = output_format != TEXT or compression is not None
+        if formatted and max_tokens is not None:
+            messagebox.showerror("Error", "Max Tokens/File only applies to plain .txt output.")
+            self.status_var.set("Status: Error - Token budget needs .txt output")
+            return
+        total = len(files)
+        metrics = RunMetrics("save", folder_path)
+
+        def save(task):
+            written = [] # Output files opened so far; deleted if the save is cancelled or fails
             try:
-                with open(file_path, 'w', encoding='utf-8') as f: f.write(content_to_save)
+                return write_output(task, written)
+            except BaseException:
+                for path in written:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                raise
+
+        def write_output(task, written):
+            done = 0
+            def on_file(path, ok):
+                nonlocal done
+                done += 1
+                task.progress(f"Status: Saving {core.relative_path(path, folder_path)} ({done}/{total})...")
+            if max_tokens is None:
+                # Single-pass writers have no reader to instrument; count files as they are written
+                def on_copied(path, ok):
+                    metrics.count("files" if ok else "errors")
+                    on_file(path, ok)
+                with metrics.phase("save"), open_output(file_path, compression) as out:
+                    written.append(file_path)
+                    write_merge_format(files, folder_path, out, output_format, on_copied, task.cancel_event, plan,
+                                       core.DEFAULT_READ_WORKERS, on_decode=metrics.count_decode)
+                return None
+            # Chunked: blocks are counted as they are read and packed greedily under the budget
+            def open_chunk(index):
+                f = open(chunk_path(file_path, index), 'w', encoding='utf-8', newline='')
+                written.append(f.name)
+                return f
+            with metrics.phase("save"):
+                result = write_merge_chunks(files, folder_path, open_chunk, max_tokens, counter, on_file=on_file,
+                                            cancel=task.cancel_event, workers=core.DEFAULT_READ_WORKERS,
+                                            reader=metrics.reader(), plan=plan)
+            counter.save(cache, folder_path)
+            return result
+
+        def on_saved(result):
+            if result is None:
                 self.status_var.set(f"Status: Output saved successfully to {file_path}")
                 messagebox.showinfo("Success", f"Output saved to:\n{file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file:\n{str(e)}")
-                self.status_var.set(f"Status: Error - Failed to save file: {str(e)}")
+                return
+            chunks = len(result.chunk_tokens)
+            status_msg = f"Status: Output saved as {chunks} file(s) of at most ~{max(result.chunk_tokens):,} tokens ({chunk_path(file_path, 1)}, ...)."
+            if result.oversized: status_msg += f" {result.oversized} file(s) alone exceed the budget."
+            self.status_var.set(status_msg)
+            messagebox.showinfo("Success", f"Output saved as {chunks} file(s):\n{chunk_path(file_path, 1)}\n...\n{chunk_path(file_path, chunks)}")
+
+        self.status_var.set(f"Status: Saving {total} file(s) to {file_path}...")
+        self.run_in_background(save, on_saved, "Failed to save file", metrics)
 
 # --- Run the Application ---
 if __name__ == "__main__":
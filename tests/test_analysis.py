@@ -0,0 +1,87 @@
+import io
+import os
+
+import pytest
+
+from codemerger import analysis as analysis_module
+from codemerger import core
+from codemerger.analysis import BINARY, LONG_LINES, NON_UTF8, UNREADABLE, AnalysisOptions, analyze_files, sniff
+from codemerger.cache import MergeCache
+from codemerger.metrics import RunMetrics
+from codemerger.tokens import TokenCounter
+
+
+def write_files(root, files):
+    paths = []
+    for rel_path, data in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+
+def test_truncated_files_go_through_the_reader_chain(tmp_path):
+    folder = tmp_path / "src"
+    paths = write_files(folder, {"a.py": b"a = 1\n", "big.py": b"y = 1\n" * 1000, "c.py": "c = 'é'\n".encode("utf-8")})
+    analysis = analyze_files(paths, str(folder), AnalysisOptions(max_file_bytes=1024))
+    assert analysis.plan.limits == {paths[1]: 1024}
+    metrics = RunMetrics("merge")
+    counter = TokenCounter()
+    with MergeCache(str(tmp_path / "cache.sqlite3")) as cache:
+        cached_reader = cache.reader(str(folder), on_decode=metrics.count_decode)
+        out = io.StringIO()
+        result = core.write_merge(analysis.files, str(folder), out, reader=counter.reader(metrics.reader(cached_reader)),
+                                  plan=analysis.plan)
+    assert result.processed == 3
+    assert metrics.counts["files"] == 3
+    assert metrics.decode_paths == {"ascii": 2, "utf-8": 1}
+    assert metrics.read_latency.total == 3
+    assert "[truncated: " in out.getvalue()
+    # The head's count is not the file's: only whole files are remembered
+    assert set(counter.known) == {paths[0], paths[2]}
+    assert os.path.getsize(paths[1]) > 1024
+
+
+@pytest.mark.parametrize("head, size, expected", [
+    (b"", 0, set()),
+    (b"print('hi')\n", 12, set()),
+    (b"\x7fELF\x02\x01\x01\0\0\0", 10, {BINARY}),
+    ("w = 'é'\n".encode("utf-16"), 18, set()), # NULs of UTF-16 text are not binary
+    ("café\n".encode("cp1252"), 5, {NON_UTF8}),
+    ("é".encode("utf-8")[:1], 2, set()), # Cut mid-character by the sniff: not an error yet
+    (b"x" * 50 + b"\n", 51, {LONG_LINES}),
+])
+def test_sniff(head, size, expected):
+    assert sniff(head, size, max_line_length=40) == expected
+
+
+def test_analysis_skips_and_truncates(tmp_path):
+    paths = write_files(tmp_path, {"a.py": b"a = 1\n", "bin.py": b"\0\1\2\3" * 10, "legacy.py": "café\n".encode("cp1252"),
+                                   "long.py": b"x" * 2000, "big.py": b"y = 1\n" * 100})
+    analysis = analyze_files(paths, str(tmp_path), AnalysisOptions(skip_non_utf8=True, max_file_bytes=100), workers=2)
+    assert analysis.files == [paths[0], paths[4]]
+    assert {os.path.basename(r.path) for r in analysis.skipped()} == {"bin.py", "legacy.py", "long.py"}
+    assert analysis.plan.limits == {paths[4]: 100}
+    assert analysis.summary() == "1 truncated, 3 skipped (1 binary, 1 long-lines, 1 non-utf8), 1 non-UTF-8"
+
+
+def test_analysis_collapses_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_module, "SNIFF_BYTES", 16)
+    paths = write_files(tmp_path, {"a.py": b"same\n", "pkg/b.py": b"same\n", "c.py": b"diff\n",
+                                   "big1.py": b"z" * 15 + b"1\n", "big2.py": b"z" * 15 + b"1\n",
+                                   "big3.py": b"z" * 15 + b"2\n"}) # Same head and size, different tail
+    progress = []
+    analysis = analyze_files(paths, str(tmp_path), on_progress=lambda done, total: progress.append((done, total)))
+    assert progress[-1] == (6, 6)
+    assert analysis.files == [paths[0], paths[2], paths[3], paths[5]]
+    assert analysis.plan.aliases == {paths[0]: [os.path.join("pkg", "b.py")], paths[3]: ["big2.py"]}
+    assert analysis.summary() == "2 duplicate(s) collapsed"
+    assert analyze_files(paths, str(tmp_path), AnalysisOptions(dedupe=False)).files == paths
+
+
+def test_unreadable_files_are_left_to_the_merge(tmp_path):
+    gone = str(tmp_path / "gone.py")
+    analysis = analyze_files([gone, gone], str(tmp_path))
+    assert analysis.files == [gone, gone] # Never collapsed: each reports its own read error
+    assert analysis.reports[0].flags == {UNREADABLE}
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from codemerger import batch, formats
+from codemerger.errors import InputError
+from codemerger.formats import JSONL
+from codemerger.profiles import MergeProfile
+
+
+def make_tree(root):
+    for i in range(3):
+        path = root / "src" / f"m{i}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"value = {i}\n")
+    return str(root / "src")
+
+
+def test_run_job(tmp_path):
+    folder = make_tree(tmp_path)
+    output = str(tmp_path / "out" / "merged.txt")
+    job = batch.run_job(MergeProfile("src", folder, unchecked=["m1.py"]), output, threads=1)
+    assert job.ok and (job.files, job.errors) == (2, 0)
+    assert job.output_bytes == os.path.getsize(output)
+    assert "--- File: m1.py ---" not in open(output, encoding="utf-8").read()
+
+
+def test_failed_job_removes_its_partial_output(tmp_path, monkeypatch):
+    folder = make_tree(tmp_path)
+    output = str(tmp_path / "merged.txt")
+    def failing_save(*args, **kwargs):
+        def on_file(path, ok):
+            if path.endswith("m1.py"): raise OSError("disk full")
+        return formats.save_merge(*args, on_file=on_file, **kwargs)
+    monkeypatch.setattr(batch, "save_merge", failing_save)
+    job = batch.run_job(MergeProfile("src", folder), output, threads=1)
+    assert job.failure == "OSError: disk full"
+    assert not os.path.exists(output)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_run_batch(tmp_path, processes):
+    folder = make_tree(tmp_path)
+    profiles = [MergeProfile("plain", folder), MergeProfile("archive", folder, format=JSONL),
+                MergeProfile("missing", str(tmp_path / "missing"))]
+    finished = []
+    result = batch.run_batch(profiles, str(tmp_path / "out"), processes=processes, threads_per_job=1, on_job=finished.append)
+    assert sorted(job.name for job in finished) == ["archive", "missing", "plain"]
+    assert [job.name for job in result.failed] == ["missing"]
+    assert os.path.exists(tmp_path / "out" / "plain.txt") and os.path.exists(tmp_path / "out" / "archive.jsonl")
+    assert result.summary().startswith("2/3 profile(s) merged: 6 file(s)")
+
+
+def test_run_batch_rejects_shared_outputs(tmp_path):
+    profiles = [MergeProfile("a", str(tmp_path), output="same.txt"), MergeProfile("b", str(tmp_path), output="same.txt")]
+    with pytest.raises(InputError):
+        batch.run_batch(profiles, str(tmp_path))
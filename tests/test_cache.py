@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from codemerger import cache as cache_module
+from codemerger.cache import CACHED, CONTENT_VERSION, MergeCache
+from codemerger.core import find_files, read_file
+from codemerger.filters import FileFilter
+
+
+def settle(path):
+    """Backdates ``path`` past the racy window so the cache will trust it."""
+    past = time.time_ns() - 10 * cache_module.RACY_WINDOW_NS
+    os.utime(path, ns=(past, past))
+
+
+def make_file(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    settle(path)
+    return str(path)
+
+
+@pytest.fixture
+def merge_cache(tmp_path):
+    with MergeCache(str(tmp_path / "cache.sqlite3")) as opened:
+        yield opened
+
+
+def test_reader_hits_after_commit(tmp_path, merge_cache):
+    path = make_file(tmp_path / "src" / "a.py", "  x = 'ü'  \r\n")
+    paths = []
+    reader = merge_cache.reader(str(tmp_path / "src"), on_decode=paths.append)
+    assert reader(path) == read_file(path)
+    reader.commit()
+    again = merge_cache.reader(str(tmp_path / "src"), on_decode=paths.append)
+    assert again(path) == read_file(path)
+    assert (reader.misses, again.hits) == (1, 1)
+    assert paths == ["utf-8", CACHED]
+
+
+def test_changed_file_is_read_again(tmp_path, merge_cache):
+    path = make_file(tmp_path / "a.py", "old")
+    reader = merge_cache.reader(str(tmp_path))
+    reader(path)
+    reader.commit()
+    (tmp_path / "a.py").write_text("new content")
+    settle(path)
+    again = merge_cache.reader(str(tmp_path))
+    assert again(path) == "new content"
+    assert again.misses == 1
+
+
+def test_same_size_new_mtime_is_a_miss(tmp_path, merge_cache):
+    path = make_file(tmp_path / "a.py", "aaa")
+    reader = merge_cache.reader(str(tmp_path))
+    reader(path)
+    reader.commit()
+    (tmp_path / "a.py").write_text("bbb")
+    settle(path) # A different, equally old mtime
+    assert merge_cache.reader(str(tmp_path))(path) == "bbb"
+
+
+def test_racy_files_are_not_stored(tmp_path, merge_cache):
+    path = tmp_path / "fresh.py"
+    path.write_text("just written")
+    reader = merge_cache.reader(str(tmp_path))
+    reader(str(path))
+    reader.commit()
+    assert merge_cache.size() == 0
+    assert merge_cache.reader(str(tmp_path))(str(path)) == "just written"
+
+
+def test_nbytes_counts_utf8_bytes(tmp_path, merge_cache):
+    path = make_file(tmp_path / "a.py", "é" * 10)
+    reader = merge_cache.reader(str(tmp_path))
+    reader(path)
+    reader.commit()
+    assert merge_cache.size() == 20
+
+
+def test_older_content_version_is_dropped(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    path = make_file(tmp_path / "src" / "a.py", "content")
+    with MergeCache(db_path) as first:
+        reader = first.reader(str(tmp_path / "src"))
+        reader(path)
+        reader.commit()
+        first.store_token_counts(str(tmp_path / "src"), "heuristic", {path: (7, os.stat(path).st_mtime_ns, 2)})
+    db = sqlite3.connect(db_path)
+    db.execute(f"PRAGMA user_version = {CONTENT_VERSION - 1}")
+    db.commit()
+    db.close()
+    with MergeCache(db_path) as reopened:
+        assert reopened.size() == 0
+        assert reopened.token_counts(str(tmp_path / "src"), "heuristic") == {}
+    with MergeCache(db_path) as current:
+        version, = current.db.execute("PRAGMA user_version").fetchone()
+        assert version == CONTENT_VERSION
+
+
+def test_lister_reuses_unchanged_listings(tmp_path, merge_cache):
+    folder = tmp_path / "src"
+    make_file(folder / "a.py", "")
+    make_file(folder / "pkg" / "b.py", "")
+    settle(folder / "pkg")
+    settle(folder)
+    file_filter = FileFilter(str(folder), ".py")
+    lister = merge_cache.lister(str(folder))
+    first = find_files(str(folder), file_filter, workers=1, lister=lister)
+    lister.commit()
+    assert lister.misses == 2
+    again = merge_cache.lister(str(folder))
+    assert find_files(str(folder), FileFilter(str(folder), ".py"), workers=2, lister=again) == first
+    assert (again.hits, again.misses) == (2, 0)
+
+    make_file(folder / "pkg" / "c.py", "")
+    settle(folder / "pkg")
+    changed = merge_cache.lister(str(folder))
+    assert len(find_files(str(folder), FileFilter(str(folder), ".py"), workers=1, lister=changed)) == 3
+    assert (changed.hits, changed.misses) == (1, 1)
+
+
+def test_evict_drops_least_recently_used_target_first(tmp_path, merge_cache):
+    old = [make_file(tmp_path / "old" / f"m{i}.py", "x" * 10) for i in range(150)]
+    reader = merge_cache.reader(str(tmp_path / "old"))
+    for path in old: reader(path)
+    reader.commit()
+    time.sleep(0.01)
+    new = make_file(tmp_path / "new" / "a.py", "y" * 1000)
+    reader = merge_cache.reader(str(tmp_path / "new"))
+    reader(new)
+    reader.commit()
+    assert merge_cache.size() == 2500
+    merge_cache.max_bytes = 1800
+    merge_cache.evict()
+    assert merge_cache.size() <= 1800
+    hits = merge_cache.reader(str(tmp_path / "new"))
+    hits(new)
+    assert hits.hits == 1
+    remaining = merge_cache.reader(str(tmp_path / "old"))
+    for path in old: remaining(path)
+    assert remaining.misses > 0
+
+
+def test_token_counts_round_trip(merge_cache):
+    settled = time.time_ns() - 10 * cache_module.RACY_WINDOW_NS
+    counts = {"/src/a.py": (10, settled, 3), "/src/racy.py": (10, time.time_ns(), 4)}
+    merge_cache.store_token_counts("/src", "heuristic", counts)
+    assert merge_cache.token_counts("/src", "heuristic") == {"/src/a.py": (10, settled, 3)}
+    assert merge_cache.token_counts("/src", "cl100k_base") == {}
+
+
+def test_clear(tmp_path, merge_cache):
+    path = make_file(tmp_path / "a.py", "content")
+    reader = merge_cache.reader(str(tmp_path))
+    reader(path)
+    reader.commit()
+    assert merge_cache.size() > 0
+    merge_cache.clear()
+    assert merge_cache.size() == 0
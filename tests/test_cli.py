@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+from codemerger.__main__ import main
+
+
+@pytest.mark.parametrize("extra", [[], ["--format", "jsonl"], ["--max-tokens", "1000"], ["--stream-copy"]])
+def test_read_errors_are_reported_with_their_cause(tmp_path, capsys, extra):
+    folder = tmp_path / "src"
+    folder.mkdir()
+    (folder / "a.py").write_text("a = 1\n")
+    os.symlink(folder / "nowhere.py", folder / "b.py") # Listed, but fails to open
+    assert main([str(folder), "-o", str(tmp_path / "merged.out")] + extra) == 0
+    err = capsys.readouterr().err
+    assert f"Warning: Could not read file {folder / 'b.py'}: [Errno 2] No such file or directory" in err
+    assert "Encountered 1 read error(s)." in err
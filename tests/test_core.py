@@ -0,0 +1,182 @@
+import io
+import os
+import threading
+
+import pytest
+
+from codemerger import core
+from codemerger.errors import InputError, MergeCancelled
+from codemerger.filters import FileFilter
+
+
+def write_tree(root, files):
+    for rel_path, data in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+
+def merge_text(paths, folder, **kwargs):
+    out = io.StringIO()
+    result = core.write_merge(paths, folder, out, **kwargs)
+    return out.getvalue(), result
+
+
+def test_validate_inputs_rejects_missing_folder_and_bad_extension(tmp_path):
+    with pytest.raises(InputError):
+        core.validate_inputs(str(tmp_path / "missing"), ".py")
+    with pytest.raises(InputError):
+        core.validate_inputs(str(tmp_path), "py")
+    core.validate_inputs(str(tmp_path), ".py, .pyi")
+
+
+def test_parse_excluded_folders():
+    assert core.parse_excluded_folders(" venv, .git,, build/* ") == {"venv", ".git", "build/*"}
+    assert core.parse_excluded_folders("") == set()
+
+
+def test_find_files_matches_iter_files_order(tmp_path):
+    # Parallel listing must stitch subtrees back in the single-threaded depth-first order
+    files = {f"pkg{i}/sub{j}/mod{k}.py": "x = 1\n" for i in range(4) for j in range(3) for k in range(3)}
+    files.update({"top.py": "", "notes.txt": "", "venv/skip.py": "", ".hidden/skip.py": ""})
+    write_tree(tmp_path, files)
+    folder = str(tmp_path)
+    file_filter = core.build_filter(folder, ".py")
+    serial = list(core.iter_files(folder, file_filter))
+    assert core.find_files(folder, file_filter, workers=4) == serial
+    assert core.find_files(folder, file_filter, workers=1) == serial
+    assert sorted(os.path.relpath(p, folder).replace(os.sep, "/") for p in serial) == sorted(
+        rel for rel in files if rel.endswith(".py") and not rel.startswith(("venv/", ".hidden/")))
+
+
+def test_find_files_reports_progress(tmp_path):
+    write_tree(tmp_path, {"a.py": "", "b/c.py": "", "b/d.py": ""})
+    seen = []
+    found = core.find_files(str(tmp_path), FileFilter(str(tmp_path), ".py"), workers=2, on_progress=seen.append)
+    assert len(found) == 3 and seen[-1] == 3
+
+
+def test_iter_contents_keeps_input_order_under_read_budget(tmp_path):
+    # Sizes vary so later small files finish first; one file is larger than the whole budget
+    paths = []
+    for i in range(40):
+        path = tmp_path / f"f{i:02d}.py"
+        path.write_text(f"# {i}\n" + "x" * (5000 if i == 7 else (i % 5) * 100))
+        paths.append(str(path))
+    expected = [core.read_file(path) for path in paths]
+    results = list(core.iter_contents(paths, workers=8, max_buffered_bytes=1000))
+    assert [path for path, _, _ in results] == paths
+    assert [content for _, content, _ in results] == expected
+    assert all(error is None for _, _, error in results)
+
+
+def test_iter_contents_yields_errors_in_place(tmp_path):
+    good = tmp_path / "good.py"
+    good.write_text("ok")
+    missing = str(tmp_path / "missing.py")
+    def reader(file_path, st=None):
+        if file_path.endswith("bad.py"): raise ValueError("boom")
+        return core.read_file(file_path, st)
+    bad = tmp_path / "bad.py"
+    bad.write_text("never returned")
+    for workers in (1, 3):
+        results = list(core.iter_contents([str(good), missing, str(bad), str(good)], workers=workers, reader=reader))
+        assert [content for _, content, _ in results] == ["ok", None, None, "ok"]
+        assert isinstance(results[1][2], OSError)
+        assert str(results[2][2]) == "boom"
+
+
+def test_read_budget_admits_head_over_limit():
+    budget = core._ReadBudget(10)
+    budget.acquire(0, 100) # The head is always admitted
+    admitted = threading.Event()
+    def second():
+        budget.acquire(1, 5)
+        admitted.set()
+    worker = threading.Thread(target=second)
+    worker.start()
+    assert not admitted.wait(0.3)
+    budget.release(100)
+    assert admitted.wait(2)
+    worker.join()
+    assert budget.used == 5
+
+
+def test_read_budget_close_wakes_waiters():
+    budget = core._ReadBudget(10)
+    budget.acquire(0, 10)
+    errors = []
+    def blocked():
+        try:
+            budget.acquire(1, 10)
+        except MergeCancelled as e:
+            errors.append(e)
+    worker = threading.Thread(target=blocked)
+    worker.start()
+    budget.close()
+    worker.join(2)
+    assert len(errors) == 1
+
+
+def test_write_merge_block_format(tmp_path):
+    write_tree(tmp_path, {"a.py": "print('a')\n\n", "pkg/b.py": "  b = 2  "})
+    paths = [str(tmp_path / "a.py"), str(tmp_path / "pkg" / "b.py"), str(tmp_path / "gone.py")]
+    text, result = merge_text(paths, str(tmp_path))
+    b_rel = os.path.join("pkg", "b.py")
+    assert text.startswith("--- File: a.py ---\nprint('a')\n--- End File: a.py ---\n\n")
+    assert f"--- File: {b_rel} ---\nb = 2\n--- End File: {b_rel} ---\n" in text
+    assert "--- Error reading file: gone.py ---\nError: " in text and text.endswith("--- End Error ---\n")
+    assert (result.processed, result.errors, result.total) == (2, 1, 3)
+
+
+def test_write_merge_parallel_matches_serial(tmp_path):
+    write_tree(tmp_path, {f"m{i}.py": f"value = {i}\n" * (i + 1) for i in range(30)})
+    paths = [str(tmp_path / f"m{i}.py") for i in range(30)]
+    serial, _ = merge_text(paths, str(tmp_path))
+    parallel, _ = merge_text(paths, str(tmp_path), workers=6, max_buffered_bytes=64)
+    assert parallel == serial
+
+
+def test_write_merge_cancel(tmp_path):
+    write_tree(tmp_path, {"a.py": "a", "b.py": "b"})
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(MergeCancelled):
+        merge_text([str(tmp_path / "a.py"), str(tmp_path / "b.py")], str(tmp_path), cancel=cancel)
+
+
+def test_on_file_called_after_each_block(tmp_path):
+    write_tree(tmp_path, {"a.py": "a"})
+    calls = []
+    merge_text([str(tmp_path / "a.py"), str(tmp_path / "b.py")], str(tmp_path), on_file=lambda path, ok: calls.append(ok))
+    assert calls == [True, False]
+
+
+def test_result_keeps_each_failure(tmp_path):
+    write_tree(tmp_path, {"a.py": "a"})
+    gone = str(tmp_path / "gone.py")
+    _, result = merge_text([str(tmp_path / "a.py"), gone], str(tmp_path), workers=2)
+    assert list(result.failures) == [gone]
+    assert isinstance(result.failures[gone], FileNotFoundError)
+
+
+def test_truncation_point_cuts_at_last_line_break():
+    head = b"line one\nline two\nline three"
+    assert core.truncation_point(head, 10, 100) == 10 # Fits: nothing cut
+    assert core.truncation_point(head, 1000, 20) == head.rfind(b"\n", 0, 20)
+    assert core.truncation_point(b"no line breaks here", 1000, 5) == 5
+
+
+def test_plan_truncates_and_lists_duplicates(tmp_path):
+    write_tree(tmp_path, {"big.py": "".join(f"line {i}\n" for i in range(100)), "a.py": "same", "copy.py": "same"})
+    big, a = str(tmp_path / "big.py"), str(tmp_path / "a.py")
+    plan = core.MergePlan(aliases={a: ["copy.py"]}, limits={big: 20})
+    text, _ = merge_text([big, a], str(tmp_path), plan=plan)
+    size = os.path.getsize(big)
+    cut = core.truncation_point((tmp_path / "big.py").read_bytes()[:20], size, 20)
+    assert f"--- File: big.py ---\nline 0\nline 1{core.format_truncation(size - cut)}\n--- End File: big.py ---\n" in text
+    assert "--- File: a.py ---\n--- Duplicates: copy.py ---\nsame\n--- End File: a.py ---\n" in text
+
+
+def test_plan_reader_without_limits_is_the_reader():
+    assert core.MergePlan().reader(core.read_file) is core.read_file
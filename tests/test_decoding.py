@@ -0,0 +1,96 @@
+import codecs
+
+import pytest
+
+from codemerger import decoding
+from codemerger.decoding import decode_bytes, detect_bom, guess_utf16, normalize_bytes, scan_utf8, stream_decoder
+
+
+def test_ascii_is_stripped_and_newlines_normalized():
+    assert decode_bytes(b"\r\n  a = 1\r\nb = 2\rc = 3\n\n") == ("a = 1\nb = 2\nc = 3", decoding.ASCII)
+
+
+def test_trailing_whitespace_inside_the_file_is_kept():
+    data = b"first  \r\nsecond\t\r\n\r\nthird \n  \n"
+    assert decode_bytes(data) == ("first  \nsecond\t\n\nthird", decoding.ASCII)
+    assert normalize_bytes(data) == (b"first  \nsecond\t\n\nthird", decoding.ASCII)
+
+
+def test_utf8_without_bom():
+    text = "name = 'Grüße, 世界'"
+    assert decode_bytes(text.encode("utf-8") + b"\n") == (text, decoding.UTF8)
+
+
+def test_non_ascii_whitespace_is_stripped_like_str_strip():
+    assert decode_bytes("\u00a0x = 1\u00a0".encode("utf-8")) == ("x = 1", decoding.UTF8)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8-sig", "utf-16", "utf-16-le", "utf-16-be", "utf-32-le", "utf-32-be"])
+def test_bom_decides_the_encoding(encoding):
+    text = "s = 'é'\r\nt = 2"
+    data = text.encode(encoding)
+    if encoding in ("utf-16-le", "utf-16-be", "utf-32-le", "utf-32-be"):
+        data = "\ufeff".encode(encoding) + data
+    assert decode_bytes(data) == ("s = 'é'\nt = 2", decoding.BOM)
+
+
+def test_utf32_le_bom_is_not_taken_for_utf16():
+    assert detect_bom(codecs.BOM_UTF32_LE + b"x\0\0\0") == ("utf-32-le", 4)
+    assert detect_bom(codecs.BOM_UTF16_LE + b"x\0") == ("utf-16-le", 2)
+    assert detect_bom(b"plain") == (None, 0)
+
+
+@pytest.mark.parametrize("encoding", ["utf-16-le", "utf-16-be"])
+def test_bomless_utf16(encoding):
+    text = "def f():\n    return 'ü'\n"
+    assert guess_utf16(text.encode(encoding)) == encoding
+    assert decode_bytes(text.encode(encoding)) == ("def f():\n    return 'ü'", decoding.UTF16)
+
+
+def test_binary_is_not_taken_for_utf16():
+    assert guess_utf16(b"\0\1bin") is None
+    assert guess_utf16(bytes(range(256)) * 4) is None
+    assert guess_utf16(b"ab") is None # Too short to tell
+    assert guess_utf16(b"plain ascii text") is None
+
+
+def test_legacy_cp1252():
+    data = "caf\xe9 – €5".encode("cp1252")
+    with pytest.raises(UnicodeDecodeError):
+        data.decode("utf-8")
+    assert decode_bytes(data) == ("café – €5", decoding.LEGACY)
+
+
+@pytest.mark.parametrize("data", [
+    b"  plain\r\nascii \n",
+    "  utf-8 ü\r\n".encode("utf-8"),
+    "\u00a0nbsp\u00a0".encode("utf-8"),
+    codecs.BOM_UTF8 + "bom é".encode("utf-8"),
+    "wide é\n".encode("utf-16"),
+    "caf\xe9\r".encode("cp1252"),
+])
+def test_normalize_bytes_matches_decode_bytes(data):
+    text, path = decode_bytes(data)
+    assert normalize_bytes(data) == (text.encode("utf-8"), path)
+
+
+def test_normalize_bytes_does_not_copy_clean_input():
+    data = "already clean ü".encode("utf-8")
+    assert normalize_bytes(data)[0] is data
+
+
+def test_scan_utf8_across_chunks():
+    data = "abü世cd".encode("utf-8")
+    for split in range(1, len(data)):
+        assert scan_utf8([data[:split], data[split:]])
+    assert not scan_utf8([b"ok", b"\xff"])
+    assert not scan_utf8([b"cut \xc3"]) # Truncated character at the end
+
+
+def test_stream_decoder():
+    assert stream_decoder(decoding.ASCII) is None and stream_decoder(decoding.UTF8) is None
+    decoder = stream_decoder(decoding.LEGACY)
+    assert decoder.decode(b"\x80") + decoder.decode(b"", final=True) == "€"
+    decoder = stream_decoder(decoding.BOM)
+    data = "é".encode("utf-8")
+    assert decoder.decode(data[:1]) + decoder.decode(data[1:], final=True) == "é"
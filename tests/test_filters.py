@@ -0,0 +1,162 @@
+import os
+import re
+
+import pytest
+
+from codemerger.errors import InputError
+from codemerger.filters import FileFilter, GitIgnore, GlobSet, glob_to_regex, parse_extensions, parse_patterns, split_excludes
+from codemerger.scanner import iter_scan
+
+
+@pytest.fixture(autouse=True)
+def no_user_git_config(tmp_path, monkeypatch):
+    # Keep the developer's own core.excludesFile out of the .gitignore tests
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(home / ".config"))
+
+
+def touch(root, *rel_paths):
+    for rel_path in rel_paths:
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+
+
+def scanned(folder, file_filter):
+    return sorted(os.path.relpath(path, folder).replace(os.sep, "/") for path in iter_scan(str(folder), file_filter))
+
+
+def matches(pattern, path):
+    return re.fullmatch(glob_to_regex(pattern), path) is not None
+
+
+def test_parse_extensions():
+    assert parse_extensions(".py, .pyi .toml;.py") == (".py", ".pyi", ".toml")
+    for bad in ("", "py", ".py, txt", "."):
+        with pytest.raises(InputError):
+            parse_extensions(bad)
+
+
+def test_parse_patterns_and_split_excludes():
+    assert parse_patterns(" venv , ,build/ ") == ["venv", "build/"]
+    names, globs = split_excludes(["venv", "node_modules", "*.egg-info", "docs/build", "tmp?"])
+    assert names == {"venv", "node_modules"}
+    assert globs == ["*.egg-info", "docs/build", "tmp?"]
+
+
+@pytest.mark.parametrize("pattern, path, expected", [
+    ("*.py", "a.py", True),
+    ("*.py", "pkg/deep/a.py", True), # No '/': matches at any depth
+    ("*.py", "a.pyc", False),
+    ("src/*.py", "src/a.py", True),
+    ("src/*.py", "src/pkg/a.py", False), # '*' stops at '/'
+    ("src/*.py", "lib/src/a.py", False), # With '/': anchored at the base
+    ("/build", "build", True),
+    ("/build", "sub/build", False),
+    ("src/**/test_*.py", "src/test_a.py", True),
+    ("src/**/test_*.py", "src/a/b/test_a.py", True),
+    ("docs/**", "docs/a/b.md", True),
+    ("file?.txt", "file1.txt", True),
+    ("file?.txt", "file/.txt", False),
+    ("[!a]*.py", "b.py", True),
+    ("[!a]*.py", "a.py", False),
+    ("\\*.py", "*.py", True),
+    ("\\*.py", "x.py", False),
+])
+def test_glob_to_regex(pattern, path, expected):
+    assert matches(pattern, path) is expected
+
+
+def test_globset_directory_only_patterns():
+    globs = GlobSet(["build/", "*.log"])
+    assert globs.match_dir("build") and globs.match_dir("a/build")
+    assert not globs.match_file("build")
+    assert globs.match_file("x/y.log") and globs.match_dir("x.log")
+    assert not GlobSet([])
+
+
+def test_gitignore_negation_last_rule_wins():
+    rules = GitIgnore(["# comment", "", "*.py", "!keep.py", "gen/", "trailing   ", "\\#hash"])
+    assert rules.match("a.py", False) is True
+    assert rules.match("sub/keep.py", False) is False
+    assert rules.match("gen", True) is True
+    assert rules.match("gen", False) is None # Directory-only rule
+    assert rules.match("trailing", False) is True
+    assert rules.match("#hash", False) is True
+    assert rules.match("README.md", False) is None
+
+
+def test_gitignore_without_negation_uses_compiled_matchers():
+    rules = GitIgnore(["*.log", "out/"])
+    assert rules.simple
+    assert rules.match("a/b.log", False) is True
+    assert rules.match("out", True) is True
+    assert rules.match("out", False) is None
+
+
+def test_file_filter_excludes_and_includes(tmp_path):
+    touch(tmp_path, "a.py", "b.txt", "venv/x.py", "src/m.py", "src/gen/g.py", "tests/t.py", ".hidden/h.py")
+    file_filter = FileFilter.from_strings(str(tmp_path), ".py", "venv, src/gen", "src/**, a.py")
+    assert scanned(tmp_path, file_filter) == ["a.py", "src/m.py"]
+
+
+def test_nested_gitignores(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py", "ignored.py", "sub/b.py", "sub/local.py", "sub/ignored.py", "build/c.py")
+    (tmp_path / ".gitignore").write_text("ignored.py\nbuild/\n")
+    (tmp_path / "sub" / ".gitignore").write_text("local.py\n!ignored.py\n")
+    file_filter = FileFilter(str(tmp_path), ".py", use_gitignore=True)
+    assert scanned(tmp_path, file_filter) == ["a.py", "sub/b.py", "sub/ignored.py"]
+    assert scanned(tmp_path, FileFilter(str(tmp_path), ".py")) == [
+        "a.py", "build/c.py", "ignored.py", "sub/b.py", "sub/ignored.py", "sub/local.py"]
+
+
+def test_gitignores_above_the_scanned_folder(tmp_path):
+    touch(tmp_path, ".git/HEAD", "pkg/a.py", "pkg/skip.py", "pkg/sub/skip.py")
+    (tmp_path / ".gitignore").write_text("pkg/skip.py\n")
+    (tmp_path / "pkg" / ".gitignore").write_text("sub/\n")
+    folder = tmp_path / "pkg"
+    assert scanned(folder, FileFilter(str(folder), ".py", use_gitignore=True)) == ["a.py"]
+
+
+def test_info_exclude_and_excludes_file(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py", "local.py", "global.py", "kept.py")
+    (tmp_path / ".git" / "info").mkdir()
+    (tmp_path / ".git" / "info" / "exclude").write_text("local.py\n")
+    ignore = tmp_path / "home" / ".config" / "git" / "ignore"
+    ignore.parent.mkdir(parents=True)
+    ignore.write_text("global.py\nkept.py\n")
+    (tmp_path / ".gitignore").write_text("!kept.py\n") # .gitignore outranks both
+    file_filter = FileFilter(str(tmp_path), ".py", use_gitignore=True)
+    assert scanned(tmp_path, file_filter) == ["a.py", "kept.py"]
+
+
+def test_core_excludesfile_setting(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py", "b.py")
+    custom = tmp_path / "custom-ignore"
+    custom.write_text("b.py\n")
+    (tmp_path / ".git" / "config").write_text(f'[core]\n\texcludesFile = "{custom}"\n')
+    assert scanned(tmp_path, FileFilter(str(tmp_path), ".py", use_gitignore=True)) == ["a.py"]
+
+
+def test_worktree_git_file_points_to_common_dir(tmp_path):
+    main_git = tmp_path / "main.git"
+    (main_git / "info").mkdir(parents=True)
+    (main_git / "info" / "exclude").write_text("skip.py\n")
+    worktree_git = main_git / "worktrees" / "wt"
+    worktree_git.mkdir(parents=True)
+    (worktree_git / "commondir").write_text("../..\n")
+    tree = tmp_path / "wt"
+    touch(tree, "a.py", "skip.py")
+    (tree / ".git").write_text(f"gitdir: {worktree_git}\n")
+    assert scanned(tree, FileFilter(str(tree), ".py", use_gitignore=True)) == ["a.py"]
+
+
+def test_forget_reloads_changed_gitignore(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py", "b.py")
+    file_filter = FileFilter(str(tmp_path), ".py", use_gitignore=True)
+    assert scanned(tmp_path, file_filter) == ["a.py", "b.py"]
+    (tmp_path / ".gitignore").write_text("b.py\n")
+    file_filter.forget(str(tmp_path))
+    assert scanned(tmp_path, file_filter) == ["a.py"]
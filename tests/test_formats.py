@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from codemerger import core, formats, streamcopy
+from codemerger.errors import InputError
+from codemerger.formats import GZIP, JSONL, TAR, TEXT, ZSTD
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "src"
+    files = {
+        "a.py": b"print('a')\r\n",
+        "pkg/b.py": "  s = 'ü'  \n".encode("utf-8"),
+        "pkg/legacy.py": "caf\xe9 = 1\n".encode("cp1252"),
+        "pkg/wide.py": "w = 'é'\n".encode("utf-16"),
+        "big.py": b"".join(b"line %d\n" % i for i in range(50)),
+        "copy.py": b"print('a')\r\n",
+    }
+    for rel_path, data in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    paths = [str(root / rel_path) for rel_path in ("a.py", "pkg/b.py", "pkg/legacy.py", "pkg/wide.py", "big.py")]
+    return str(root), paths
+
+
+def text_merge(paths, folder, plan=None):
+    out = io.StringIO()
+    core.write_merge(paths, folder, out, plan=plan)
+    return out.getvalue().encode("utf-8")
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("merged.txt", (TEXT, None)),
+    ("merged", (TEXT, None)),
+    ("out.jsonl", (JSONL, None)),
+    ("out.NDJSON.gz", (JSONL, GZIP)),
+    ("src.tar.zst", (TAR, ZSTD)),
+    ("src.tgz", (TAR, GZIP)),
+    ("notes.txt.gz", (TEXT, GZIP)),
+])
+def test_detect_format(name, expected):
+    assert formats.detect_format(name) == expected
+
+
+@pytest.mark.parametrize("fmt", [TEXT, JSONL, TAR])
+@pytest.mark.parametrize("compression", [None, GZIP, ZSTD])
+def test_output_suffix_round_trips(fmt, compression):
+    assert formats.detect_format("out" + formats.output_suffix(fmt, compression)) == (fmt, compression)
+
+
+def test_unknown_format_and_compression(tmp_path):
+    with pytest.raises(InputError):
+        formats.write_merge_format([], str(tmp_path), io.BytesIO(), "xml")
+    with pytest.raises(InputError):
+        formats.check_compression("lzma")
+
+
+def test_text_stream_matches_text_merge(tree):
+    folder, paths = tree
+    out = io.BytesIO()
+    result = formats.write_merge_format(paths + [os.path.join(folder, "gone.py")], folder, out, TEXT)
+    assert out.getvalue() == text_merge(paths + [os.path.join(folder, "gone.py")], folder)
+    assert (result.processed, result.errors) == (5, 1)
+
+
+def test_text_stream_copies_large_files_in_chunks(tree, monkeypatch):
+    folder, paths = tree
+    monkeypatch.setattr(streamcopy, "COPY_CHUNK_SIZE", 16)
+    out = io.BytesIO()
+    formats.write_merge_format(paths, folder, out, TEXT)
+    assert out.getvalue() == text_merge(paths, folder)
+
+
+def test_text_stream_with_plan(tree):
+    folder, paths = tree
+    plan = core.MergePlan(aliases={paths[0]: ["copy.py"]}, limits={paths[4]: 30})
+    out = io.BytesIO()
+    formats.write_merge_format(paths, folder, out, TEXT, plan=plan)
+    assert out.getvalue() == text_merge(paths, folder, plan)
+
+
+def test_jsonl_round_trip(tree, tmp_path):
+    folder, paths = tree
+    plan = core.MergePlan(aliases={paths[0]: ["copy.py"]}, limits={paths[4]: 30})
+    output = str(tmp_path / "merged.jsonl.gz")
+    decoded = []
+    result = formats.save_merge(paths + [os.path.join(folder, "gone.py")], folder, output, plan=plan, on_decode=decoded.append)
+    assert (result.processed, result.errors) == (5, 1)
+    assert sorted(decoded) == ["ascii", "ascii", "bom", "legacy", "utf-8"]
+    with gzip.open(output, "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline()) == {"codemerger": "jsonl", "version": 1, "root": os.path.abspath(folder)}
+
+    archive = formats.read_jsonl(output)
+    assert archive.root == os.path.abspath(folder)
+    records = {record["path"]: record for record in archive.records()}
+    assert list(records) == ["a.py", "pkg/b.py", "pkg/legacy.py", "pkg/wide.py", "big.py", "gone.py"]
+    for path in paths:
+        record = records[os.path.relpath(path, folder).replace(os.sep, "/")]
+        data = open(path, "rb").read()
+        assert record["size"] == len(data)
+        assert record["sha256"] == hashlib.sha256(data).hexdigest() # Of the whole file, even when truncated
+    assert records["a.py"]["content"] == "print('a')" and records["a.py"]["duplicates"] == ["copy.py"]
+    assert records["pkg/legacy.py"]["content"] == "café = 1"
+    assert records["big.py"]["content"] == "line 0\nline 1\nline 2\nline 3"
+    assert records["big.py"]["truncated"] == os.path.getsize(paths[4]) - len("line 0\nline 1\nline 2\nline 3")
+    assert "error" in records["gone.py"]
+    assert archive.file_paths() == [paths[0], os.path.join(folder, "copy.py")] + paths[1:]
+    assert archive.file_paths(include_duplicates=False) == paths
+
+
+def test_read_jsonl_rejects_other_files(tmp_path):
+    other = tmp_path / "other.jsonl"
+    other.write_text('{"hello": 1}\n')
+    with pytest.raises(InputError):
+        formats.read_jsonl(str(other))
+    newer = tmp_path / "newer.jsonl"
+    newer.write_text(json.dumps({"codemerger": "jsonl", "version": formats.JSONL_VERSION + 1, "root": "/"}) + "\n")
+    with pytest.raises(InputError):
+        formats.read_jsonl(str(newer))
+
+
+def test_read_jsonl_parses_records_lazily(tmp_path):
+    path = tmp_path / "merged.jsonl"
+    header = json.dumps({"codemerger": "jsonl", "version": formats.JSONL_VERSION, "root": str(tmp_path)})
+    path.write_text(header + '\n{"path": "a.py", "size": 1, "sha256": "", "content": "a"}\nnot json\n')
+    archive = formats.read_jsonl(str(path)) # Only the header is read here
+    records = archive.records()
+    assert next(records)["path"] == "a.py"
+    with pytest.raises(ValueError):
+        next(records)
+
+
+def test_tar_round_trip(tree, tmp_path):
+    folder, paths = tree
+    plan = core.MergePlan(aliases={paths[0]: ["copy.py"]}, limits={paths[4]: 30})
+    output = str(tmp_path / "src.tgz")
+    result = formats.save_merge(paths + [os.path.join(folder, "gone.py")], folder, output, plan=plan)
+    assert (result.processed, result.errors) == (5, 1)
+    with tarfile.open(output) as tar:
+        members = tar.getmembers()
+        assert [member.name for member in members] == ["a.py", "copy.py", "pkg/b.py", "pkg/legacy.py", "pkg/wide.py", "big.py"]
+        for path in paths[:4]:
+            member = tar.getmember(os.path.relpath(path, folder).replace(os.sep, "/"))
+            assert tar.extractfile(member).read() == open(path, "rb").read() # Raw bytes, not normalized
+        link = tar.getmember("copy.py")
+        assert link.islnk() and link.linkname == "a.py"
+        big = tar.getmember("big.py")
+        assert tar.extractfile(big).read() == b"line 0\nline 1\nline 2\nline 3"
+        assert big.pax_headers["comment"] == f"codemerger: truncated, {os.path.getsize(paths[4]) - big.size} more bytes"
+
+
+def test_tar_skips_a_file_that_fails_mid_read(tree, tmp_path, monkeypatch):
+    folder, paths = tree
+    class FailingRead:
+        def __init__(self, f):
+            self.f = f
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc_info):
+            self.f.close()
+        def fileno(self):
+            return self.f.fileno()
+        def read(self, n=-1):
+            raise OSError("device went away")
+    def fake_open(path, mode="r", *args, **kwargs):
+        f = open(path, mode, *args, **kwargs)
+        return FailingRead(f) if path == paths[1] else f
+    monkeypatch.setattr(formats, "open", fake_open, raising=False)
+    calls = []
+    output = str(tmp_path / "src.tar")
+    result = formats.save_merge(paths, folder, output, on_file=lambda path, ok: calls.append(ok))
+    assert (result.processed, result.errors) == (4, 1)
+    assert calls == [True, False, True, True, True]
+    with tarfile.open(output) as tar: # Still a complete, readable archive
+        assert [member.name for member in tar.getmembers()] == ["a.py", "pkg/legacy.py", "pkg/wide.py", "big.py"]
+        assert tar.extractfile("big.py").read() == open(paths[4], "rb").read()
+
+
+@pytest.mark.parametrize("fmt", [TEXT, JSONL, TAR])
+def test_result_keeps_the_read_error(tree, fmt):
+    folder, paths = tree
+    gone = os.path.join(folder, "gone.py")
+    result = formats.write_merge_format(paths + [gone], folder, io.BytesIO(), fmt)
+    assert list(result.failures) == [gone]
+    assert "No such file or directory" in str(result.failures[gone])
+
+
+def test_gzip_text_output(tree, tmp_path):
+    folder, paths = tree
+    output = str(tmp_path / "merged.txt.gz")
+    formats.save_merge(paths, folder, output)
+    with gzip.open(output, "rb") as f:
+        assert f.read() == text_merge(paths, folder)
+
+
+def test_wrap_output_leaves_the_stream_open(tree):
+    folder, paths = tree
+    raw = io.BytesIO()
+    assert formats.wrap_output(raw) is None
+    with formats.wrap_output(raw, GZIP) as out:
+        formats.write_merge_format(paths, folder, out, TEXT)
+    assert not raw.closed
+    assert gzip.decompress(raw.getvalue()) == text_merge(paths, folder)
+
+
+def test_zstd_round_trip(tree, tmp_path):
+    pytest.importorskip("zstandard")
+    folder, paths = tree
+    output = str(tmp_path / "merged.jsonl.zst")
+    formats.save_merge(paths, folder, output)
+    assert [record["path"] for record in formats.read_jsonl(output).records()] == ["a.py", "pkg/b.py", "pkg/legacy.py", "pkg/wide.py", "big.py"]
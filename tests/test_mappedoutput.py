@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from codemerger import mappedoutput, outputview
+from codemerger.mappedoutput import MergeSpool, index_line_starts
+from codemerger.outputview import LazyOutputView
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4 * 1024 * 1024])
+def test_index_line_starts(monkeypatch, chunk_size):
+    monkeypatch.setattr(mappedoutput, "INDEX_CHUNK_SIZE", chunk_size)
+    data = "ab\n\ncd\né\n".encode("utf-8")
+    assert list(index_line_starts(data)) == [0, 3, 4, 7, 10]
+    assert list(index_line_starts(b"")) == [0]
+    assert list(index_line_starts(b"no newline")) == [0]
+
+
+def spooled(tmp_path, blocks):
+    spool = MergeSpool(str(tmp_path))
+    for file_path, block in blocks: spool.add_block(file_path, block)
+    return spool.finish()
+
+
+def test_spool_records_block_starts_and_reads_line_ranges(tmp_path):
+    output = spooled(tmp_path, [("/a.py", "--- File: a.py ---\nä\n--- End File: a.py ---\n"),
+                                ("/b.py", "--- File: b.py ---\nb\n--- End File: b.py ---\n")])
+    try:
+        assert [(path, line) for path, _, line in output.blocks] == [("/a.py", 0), ("/b.py", 4)]
+        offset = output.blocks[1][1]
+        assert output.data[offset:offset + 18] == b"--- File: b.py ---"
+        assert output.line_count == 8 # The final newline starts an empty last line
+        assert output.lines(1, 2) == "ä\n"
+        assert output.lines(3, 5) == "\n--- File: b.py ---\n"
+        assert output.lines(-5, 100) == output.data[:].decode("utf-8")
+        assert output.lines(6, 2) == ""
+    finally:
+        output.close()
+    assert not os.path.exists(output.path)
+
+
+def test_empty_spool_and_discard(tmp_path):
+    output = spooled(tmp_path, [])
+    assert (output.line_count, output.lines(0, 1)) == (1, "")
+    output.close()
+    spool = MergeSpool(str(tmp_path))
+    spool.add_block("/a.py", "x\n")
+    spool.discard()
+    assert os.listdir(tmp_path) == []
+
+
+class FakeText:
+    """The slice of tk.Text that LazyOutputView uses; one line per 10 px, 30 lines tall."""
+
+    def __init__(self):
+        self.content = ""
+        self.top = 1
+        self.options = {"state": "disabled"}
+        self.idle = []
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def cget(self, name):
+        return self.options[name]
+
+    def winfo_height(self):
+        return 300
+
+    def delete(self, start, end):
+        self.content = ""
+
+    def insert(self, index, text):
+        self.content = text
+
+    def yview(self, index):
+        self.top = int(index.split(".")[0])
+
+    def index(self, index):
+        return f"{self.top}.0"
+
+    def after_idle(self, callback):
+        self.idle.append(callback)
+
+
+class FakeScrollbar:
+    def __init__(self):
+        self.fractions = None
+        self.options = {}
+
+    def set(self, first, last):
+        self.fractions = (first, last)
+
+    def configure(self, **options):
+        self.options.update(options)
+
+
+def test_lazy_view_loads_a_window_around_the_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(outputview, "WINDOW_MARGIN_LINES", 100)
+    monkeypatch.setattr(outputview, "RECENTER_LINES", 25)
+    output = spooled(tmp_path, [(f"/m{i}.py", f"line {i}") for i in range(1000)]) # One line per block
+    text, scrollbar = FakeText(), FakeScrollbar()
+    view = LazyOutputView(text, scrollbar)
+    try:
+        view.show(output, line=500)
+        assert view.active and scrollbar.options["command"] == view.yview
+        assert (view.first, view.last) == (400, 630) # Margin either side plus the visible lines
+        assert text.content.splitlines()[0] == "line 400" and text.top == 101
+        assert view.top_line() == 500
+        view.yview("moveto", "0.0")
+        assert view.first == 0 and text.top == 1
+        view._on_text_scroll("0.5", "0.6") # Not near an edge of the loaded window
+        assert scrollbar.fractions == (115 / output.line_count, 138 / output.line_count) and not text.idle
+        view._on_text_scroll("0.95", "1.0")
+        assert len(text.idle) == 1
+        view.reset()
+        assert not view.active and scrollbar.options["command"] == text.yview
+    finally:
+        output.close()
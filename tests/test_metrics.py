@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from codemerger import core
+from codemerger.filters import FileFilter
+from codemerger.metrics import HISTOGRAM_BUCKETS, LatencyHistogram, MetricsLog, ProfileCapture, RunMetrics
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0.0
+    for micros in (0, 3, 3, 3, 100, 5000):
+        histogram.record(micros / 1_000_000)
+    assert histogram.total == 6 and histogram.max == 0.005
+    assert histogram.counts[0] == 1 and histogram.counts[2] == 3 # <1 us, then [2, 4) us
+    assert histogram.percentile(50) == LatencyHistogram.bucket_limit(2)
+    assert histogram.percentile(100) == 0.005 # Capped at the maximum seen
+    assert histogram.to_dict()["buckets_us"] == {"1": 1, "4": 3, "128": 1, "8192": 1}
+
+
+def test_histogram_clamps_to_the_last_bucket():
+    histogram = LatencyHistogram()
+    histogram.record(3600)
+    assert histogram.counts[HISTOGRAM_BUCKETS - 1] == 1
+    assert histogram.percentile(99) == LatencyHistogram.bucket_limit(HISTOGRAM_BUCKETS - 1)
+
+
+def test_reader_counts_reads_bytes_and_errors(tmp_path):
+    (tmp_path / "a.py").write_text("café\n", encoding="utf-8")
+    metrics = RunMetrics("merge", str(tmp_path))
+    read = metrics.reader()
+    assert read(str(tmp_path / "a.py")) == "café"
+    with pytest.raises(OSError):
+        read(str(tmp_path / "gone.py"))
+    assert (metrics.counts["files"], metrics.counts["bytes"], metrics.counts["errors"]) == (1, 5, 1)
+    assert metrics.decode_paths == {"utf-8": 1}
+    assert metrics.read_latency.total == 1 and metrics.phases["read"] > 0
+
+
+@pytest.mark.parametrize("filter_timing", [False, True])
+def test_scans_split_walk_and_filter(tmp_path, filter_timing):
+    for name in ("a.py", "b.py", "pkg/c.py"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text("")
+    metrics = RunMetrics("list", str(tmp_path), filter_timing)
+    file_filter = FileFilter(str(tmp_path), ".py")
+    found = metrics.scan(lambda f: core.find_files(str(tmp_path), f, workers=2), file_filter)
+    lazily = list(metrics.iter_scan(lambda f: core.iter_files(str(tmp_path), f), file_filter))
+    assert found == lazily and len(found) == 3
+    assert ("filter" in metrics.phases) == filter_timing
+    assert metrics.phases["walk"] >= 0
+
+
+def test_summary_and_log(tmp_path):
+    metrics = RunMetrics("merge", str(tmp_path))
+    with metrics.phase("save"):
+        metrics.count("files", 2)
+        metrics.count_decode("ascii")
+        metrics.count_decode("legacy")
+    lines = metrics.finish().summary_lines()
+    assert lines[0].startswith("merge: ")
+    assert lines[1].startswith("save ")
+    assert lines[2] == "2 file(s) read, 0.00 MB, 0 skipped, 0 duplicate(s), 0 error(s)"
+    assert lines[-1] == "decoding: ascii 1, legacy 1"
+    log = MetricsLog(str(tmp_path / "runs.jsonl"))
+    log.write(metrics)
+    log.write(metrics)
+    records = [json.loads(line) for line in open(tmp_path / "runs.jsonl", encoding="utf-8")]
+    assert len(records) == 2 and records[0]["counts"]["files"] == 2 and records[0]["decoding"] == {"ascii": 1, "legacy": 1}
+
+
+def test_profile_capture_writes_its_files(tmp_path):
+    metrics = RunMetrics("merge")
+    with ProfileCapture(str(tmp_path / "profiles"), "merge", metrics) as capture:
+        sum(range(1000))
+    assert metrics.profile_paths == capture.paths
+    assert all(os.path.getsize(path) > 0 for path in capture.paths)
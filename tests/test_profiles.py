@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from codemerger.errors import InputError
+from codemerger.formats import GZIP, JSONL
+from codemerger.profiles import MergeProfile, ProfileStore, default_config_dir, safe_file_name
+
+
+def test_profile_round_trip(tmp_path):
+    store = ProfileStore(str(tmp_path / "config" / "profiles.json"))
+    assert store.names() == [] and store.all() == []
+    profile = MergeProfile("web", "/src/web", ".py,.js", include="src/**", gitignore=True, analyze=True, max_file_kb=64,
+                           unchecked=["a.py"], format=JSONL, compression=GZIP)
+    store.save(profile)
+    store.save(MergeProfile("api", "/src/api"))
+    assert store.names() == ["api", "web"]
+    loaded = store.get("web")
+    assert loaded.to_dict() == profile.to_dict()
+    assert [p.name for p in store.all()] == ["api", "web"]
+    store.delete("api")
+    assert store.names() == ["web"]
+    assert not [name for name in os.listdir(tmp_path / "config") if name.startswith(".profiles-")] # No temp files left
+
+
+def test_unknown_and_corrupt_profiles(tmp_path):
+    path = tmp_path / "profiles.json"
+    store = ProfileStore(str(path))
+    with pytest.raises(InputError):
+        store.get("missing")
+    path.write_text(json.dumps({"broken": {"extension": ".py"}}))
+    with pytest.raises(InputError):
+        store.get("broken") # No folder
+    path.write_text("{not json")
+    with pytest.raises(InputError):
+        store.names()
+
+
+def test_output_path():
+    assert MergeProfile("my app", "/src").output_path("out") == os.path.join("out", "my_app.txt")
+    assert MergeProfile("x", "/src", format=JSONL, compression=GZIP).output_path("out") == os.path.join("out", "x.jsonl.gz")
+    assert MergeProfile("x", "/src", output="merged.txt").output_path("out") == os.path.join("out", "merged.txt")
+    absolute = os.path.abspath("merged.txt")
+    assert MergeProfile("x", "/src", output=absolute).output_path("out") == absolute
+    assert safe_file_name("../..") == ".._.." and safe_file_name("") == "profile"
+
+
+def test_config_dir_override(monkeypatch, tmp_path):
+    monkeypatch.setenv("CODEMERGER_CONFIG_DIR", str(tmp_path))
+    assert default_config_dir() == str(tmp_path)
+    assert ProfileStore().path == str(tmp_path / "profiles.json")
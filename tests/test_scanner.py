@@ -0,0 +1,69 @@
+import os
+import threading
+
+import pytest
+
+from codemerger.errors import MergeCancelled
+from codemerger.filters import FileFilter
+from codemerger.scanner import (KIND_DIR, KIND_DIR_LINK, KIND_FILE, filter_listing, flatten_listings, iter_scan,
+                                list_directory, scan_directory, scan_listings, scan_parallel)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for rel_path in ("a.py", "b.txt", "pkg/c.py", "pkg/sub/d.py", "pkg/sub/deeper/e.py", "other/f.py",
+                     ".hidden/g.py", "node_modules/h.py", *(f"wide/w{i}/m{i}.py" for i in range(20))):
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    os.symlink(tmp_path / "pkg", tmp_path / "linked")
+    return str(tmp_path)
+
+
+def py_filter(folder):
+    return FileFilter(folder, ".py", excluded=["node_modules"])
+
+
+def test_iter_scan_walks_depth_first_and_prunes(tree):
+    found = [os.path.relpath(path, tree).replace(os.sep, "/") for path in iter_scan(tree, py_filter(tree))]
+    assert "a.py" in found and "b.txt" not in found
+    assert not any(path.startswith((".hidden/", "node_modules/", "linked/")) for path in found)
+    assert len(found) == 25
+    # A directory's subtree is contiguous in the results
+    pkg = [i for i, path in enumerate(found) if path.startswith("pkg/")]
+    assert pkg == list(range(pkg[0], pkg[0] + 3))
+
+
+@pytest.mark.parametrize("workers", [1, 2, 8])
+def test_parallel_scan_matches_iter_scan_order(tree, workers):
+    expected = list(iter_scan(tree, py_filter(tree)))
+    progress = []
+    assert scan_parallel(tree, py_filter(tree), workers=workers, on_progress=progress.append) == expected
+    assert progress[-1] == len(expected)
+
+
+def test_listings_flatten_back_in_order(tree):
+    listings = scan_listings(tree, py_filter(tree), workers=4)
+    assert set(listings) >= {tree, os.path.join(tree, "pkg", "sub", "deeper")}
+    assert os.path.join(tree, "node_modules") not in listings
+    assert flatten_listings(tree, listings) == list(iter_scan(tree, py_filter(tree)))
+
+
+def test_raw_listing_and_filter_match_scan_directory(tree):
+    listing = dict(list_directory(tree))
+    assert (listing["a.py"], listing["pkg"], listing["linked"]) == (KIND_FILE, KIND_DIR, KIND_DIR_LINK)
+    files, subdirs = filter_listing(tree, list_directory(tree), py_filter(tree))
+    expected_files, expected_subdirs = scan_directory(tree, py_filter(tree))
+    assert sorted(files) == sorted(expected_files) and sorted(subdirs) == sorted(expected_subdirs)
+
+
+def test_unreadable_directory_is_skipped(tmp_path):
+    assert scan_directory(str(tmp_path / "missing"), FileFilter(str(tmp_path), ".py")) == ([], [])
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_scan_cancel(tree, workers):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(MergeCancelled):
+        scan_parallel(tree, py_filter(tree), cancel=cancel, workers=workers)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from codemerger.mappedoutput import MergeSpool
+from codemerger.search import ContentIndex, PathIndex
+
+PATHS = ["src/utils/io.py", "src/main.py", "tests/test_utils.py", "docs/README.md", os.path.join("src", "My_Module", "core.py")]
+
+
+@pytest.fixture
+def index():
+    return PathIndex(PATHS)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("", None),
+    ("   ", None),
+    ("util", [0, 2]),
+    ("tils", []), # Not at the start of a word
+    (".py", [0, 1, 2, 4]),
+    ("src/ut", [0]),
+    ("src/", [0, 1, 4]),
+    ("SRC MAIN", [1]), # Case is ignored; every term must match
+    ("module core", [4]),
+    ("my_mod", [4]),
+    ("src\\main", [1]),
+    ("/", [0, 1, 2, 3, 4]),
+    ("readme nothing", []),
+])
+def test_path_index_match(index, query, expected):
+    assert index.match(query) == expected
+
+
+def test_path_index_caches_terms(index):
+    assert len(index) == len(PATHS)
+    index.match("util")
+    assert index._term_cache["util"] == [0, 2]
+    assert index.match("util test") == [2]
+
+
+TEXT = "--- File: a.py ---\nfoo = 'é'\nFoo()\n--- End File: a.py ---\n\n--- File: b.py ---\nbar = foo\n--- End File: b.py ---\n"
+
+
+def test_content_index_finds_and_locates_matches():
+    index = ContentIndex.from_text(TEXT, [("/a.py", 0), ("/b.py", 5)])
+    first = index.find("foo")
+    assert index.position(first[0]) == (1, 0)
+    second = index.find("foo", first[1])
+    assert index.position(second[0]) == (2, 0) # Lowercase query: case-insensitive
+    third = index.find("foo", second[1])
+    assert index.file_at(third[0]) == "/b.py" and index.position(third[0]) == (6, 6)
+    assert index.find("foo", third[1]) == first # Wraps around
+    assert index.position(index.find("Foo")[0]) == (2, 0) # Uppercase: exact case
+    assert index.find("Foo", index.find("Foo")[1]) == index.find("Foo")
+    quote = index.find("é'")
+    assert index.position(quote[0]) == (1, 7) and index.length(*quote) == 2
+    assert index.find("missing") is None and index.find("") is None
+    assert index.file_at(0) == "/a.py"
+
+
+def test_content_index_over_a_spooled_output(tmp_path):
+    spool = MergeSpool(str(tmp_path))
+    spool.add_block("/a.py", "--- File: a.py ---\nneedle\n--- End File: a.py ---\n")
+    spool.add_block("/b.py", "--- File: b.py ---\nhay NEEDLE\n--- End File: b.py ---\n")
+    output = spool.finish()
+    try:
+        index = ContentIndex(output.data, output.blocks, output.line_starts)
+        match = index.find("NEEDLE")
+        assert index.file_at(match[0]) == "/b.py" and index.position(match[0]) == (5, 4)
+        assert index.file_at(index.find("needle")[0]) == "/a.py"
+    finally:
+        output.close()
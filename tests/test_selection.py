@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from codemerger.selection import STATE_ALL, STATE_NONE, STATE_SOME, FileSelection
+
+REL_PATHS = ["a.py", "pkg/b.py", "pkg/c.py", "pkg/sub/d.py", "z.py"]
+
+
+@pytest.fixture
+def selection(tmp_path):
+    return FileSelection([os.path.join(tmp_path, *rel_path.split("/")) for rel_path in REL_PATHS], str(tmp_path))
+
+
+def test_tree_groups_files_by_directory(selection):
+    pkg = selection.dirs["pkg"]
+    assert list(selection.root.subdirs) == ["pkg"]
+    assert (pkg.first, pkg.stop, pkg.count) == (1, 4, 3) and pkg.contiguous
+    assert selection.dirs["pkg/sub"].files == [3]
+    assert selection.root.files == [0, 4]
+    assert selection.file_name(3) == "d.py"
+
+
+def test_toggling_a_directory(selection):
+    pkg = selection.dirs["pkg"]
+    assert selection.dir_state(pkg) == STATE_ALL
+    selection.set_file(3, False)
+    assert selection.dir_state(pkg) == STATE_SOME
+    assert selection.dir_state(selection.dirs["pkg/sub"]) == STATE_NONE
+    assert selection.toggle_dir(pkg) is True # Partly checked: checks the whole subtree
+    assert selection.toggle_dir(pkg) is False
+    assert selection.checked_count() == 2
+    assert selection.unchecked_rel_paths() == ["pkg/b.py", "pkg/c.py", "pkg/sub/d.py"]
+    assert selection.selected_paths() == [selection.paths[0], selection.paths[4]]
+
+
+def test_non_contiguous_subtree(tmp_path):
+    # Not in scan order: the subtree's ids are listed explicitly
+    paths = [os.path.join(tmp_path, name) for name in ("pkg/a.py", "b.py", "pkg/c.py")]
+    selection = FileSelection(paths, str(tmp_path))
+    pkg = selection.dirs["pkg"]
+    assert not pkg.contiguous
+    assert list(selection.subtree_ids(pkg)) == [0, 2]
+    selection.set_dir(pkg, False)
+    assert selection.selected_paths() == [paths[1]]
+    assert selection.checked_count(pkg) == 0
+
+
+def test_stats_are_summed_per_subtree(selection):
+    assert not selection.has_stats() and selection.selected_tokens() == 0
+    selection.set_stats([10, 20, 30, 40, 50], [1, 2, 3, 4, 5])
+    assert selection.dir_stats(selection.dirs["pkg"]) == (90, 9)
+    assert selection.dir_stats(selection.root) == (150, 15)
+    selection.update_tokens({selection.paths[1]: 7})
+    assert selection.file_stats(1) == (20, 7)
+    assert selection.dir_stats(selection.dirs["pkg"]) == (90, 14)
+    selection.set_file(0, False)
+    assert selection.selected_tokens() == 19
+
+
+def test_previous_selection_is_kept(selection, tmp_path):
+    selection.uncheck_rel_paths(["pkg/c.py", "unknown.py"])
+    paths = selection.paths + [os.path.join(tmp_path, "new.py")]
+    rescanned = FileSelection(paths, str(tmp_path), previous=selection)
+    assert rescanned.unchecked_rel_paths() == ["pkg/c.py"]
+    assert rescanned.is_checked(len(paths) - 1) # New files start checked
+
+
+def test_stats_formatting():
+    filetree = pytest.importorskip("codemerger.filetree") # Needs tkinter
+    assert filetree.format_size(512) == "512 B"
+    assert filetree.format_size(1536) == "1.5 KB"
+    assert filetree.format_size(3 * 1024 ** 3) == "3.0 GB"
+    assert filetree.format_tokens(950) == "950"
+    assert filetree.format_tokens(12_345) == "12.3k"
+    assert filetree.format_tokens(4_100_000) == "4.1M"
+    assert filetree.format_stats(2048, 1200) == "2.0 KB  ~1.2k tok"
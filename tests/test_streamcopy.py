@@ -0,0 +1,60 @@
+import codecs
+import io
+
+import pytest
+
+from codemerger import core, streamcopy
+from codemerger.decoding import ASCII, BOM, LEGACY, UTF8
+
+CASES = {
+    "ascii": (b"  \n" + b"x = 1\r\n" * 20 + b"\n\n  ", ASCII),
+    "utf8_late": (b"a = 1\n" * 10 + "s = 'ü'\n".encode("utf-8"), UTF8),
+    "legacy_late": (b"a = 1\n" * 10 + "s = 'caf\xe9'\n".encode("cp1252"), LEGACY),
+    "bom": (codecs.BOM_UTF8 + "  é = 1\n".encode("utf-8") * 5, BOM),
+    "cr_split": (b"a\r" + b"\nb\r\n" * 7 + b"c\rd\r", ASCII),
+    "blank": (b" \n\t\r\n " * 10, ASCII),
+}
+
+
+@pytest.mark.parametrize("chunk_size", [3, 7, 1024])
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_copy_matches_read_file(tmp_path, monkeypatch, chunk_size, name):
+    data, expected_path = CASES[name]
+    monkeypatch.setattr(streamcopy, "COPY_CHUNK_SIZE", chunk_size)
+    path = tmp_path / "f.py"
+    path.write_bytes(data)
+    out = io.BytesIO()
+    with open(path, "rb") as f:
+        decoded = streamcopy.copy_content(f, len(data), out)
+    assert out.getvalue().decode("utf-8") == core.read_file(str(path))
+    if name != "blank": assert decoded == expected_path
+
+
+def test_content_range_skips_whitespace_chunks(monkeypatch):
+    monkeypatch.setattr(streamcopy, "COPY_CHUNK_SIZE", 4)
+    data = b" \n \t\n  ab c \n\n \t "
+    assert streamcopy.content_range(io.BytesIO(data), len(data)) == (data.index(b"a"), data.index(b"c") + 1)
+    assert streamcopy.content_range(io.BytesIO(b" \n\n "), 4) == (0, 0)
+
+
+def test_stream_writes_error_block_for_a_file_failing_mid_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(streamcopy, "COPY_CHUNK_SIZE", 8)
+    good = tmp_path / "a.py"
+    good.write_bytes(b"a = 1\n" * 10)
+    bad = tmp_path / "b.py"
+    bad.write_bytes(b"b = 2\n" * 10)
+    def flaky_read(self, n=-1):
+        def read(n):
+            if self.f.name == str(bad) and self.f.tell() > 8: raise OSError("I/O error")
+            return self.f.read(n)
+        return self._call(read, n)
+    monkeypatch.setattr(streamcopy._Source, "read", flaky_read)
+    out = io.BytesIO()
+    calls = []
+    result = streamcopy.write_merge_stream([str(good), str(bad)], str(tmp_path), out, on_file=lambda path, ok: calls.append(ok))
+    text = out.getvalue().decode("utf-8")
+    assert (result.processed, result.errors, calls) == (1, 1, [True, False])
+    assert str(result.failures[str(bad)]) == "I/O error"
+    # The part already copied stays, followed by the error block
+    assert text.endswith("--- Error reading file: b.py ---\nError: I/O error\n--- End Error ---\n")
+    assert text.startswith("--- File: a.py ---\n")
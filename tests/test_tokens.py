@@ -0,0 +1,122 @@
+import io
+import os
+
+import pytest
+
+from codemerger import core
+from codemerger.errors import InputError
+from codemerger.tokens import TokenCounter, chunk_path, estimate_from_size, estimate_tokens, load_tokenizer, write_merge_chunks
+
+
+def make_files(root, sizes):
+    paths = []
+    for i, lines in enumerate(sizes):
+        path = root / f"m{i}.py"
+        path.write_text("".join(f"value_{i}_{n} = {n}\n" for n in range(lines)))
+        paths.append(str(path))
+    return paths
+
+
+def write_chunks(paths, folder, max_tokens, counter=None, **kwargs):
+    output = os.path.join(folder, "out", "merged.txt")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    written = []
+    def open_chunk(index):
+        written.append(chunk_path(output, index))
+        return open(written[-1], "w", encoding="utf-8")
+    result = write_merge_chunks(paths, folder, open_chunk, max_tokens, counter or TokenCounter(), **kwargs)
+    return result, [open(path, encoding="utf-8").read() for path in written]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2 # Runs of up to four word characters
+    assert estimate_tokens("x = f(y)") == 6
+    assert estimate_from_size(0) == 0
+    assert estimate_from_size(100) == 32 # Rounded up
+
+
+def test_unknown_tokenizer():
+    assert load_tokenizer(None) is estimate_tokens
+    try:
+        import tiktoken # noqa: F401
+    except ImportError:
+        with pytest.raises(InputError):
+            load_tokenizer("cl100k_base")
+
+
+def test_chunk_path():
+    assert chunk_path("out.txt", 1) == "out.part001.txt"
+    assert chunk_path(os.path.join("dir", "merged"), 12) == os.path.join("dir", "merged.part012")
+
+
+def test_counter_remembers_by_size_and_mtime(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("alpha beta gamma")
+    counter = TokenCounter()
+    st = os.stat(path)
+    assert counter.file_tokens(str(path), st) == estimate_from_size(st.st_size) # Not read yet
+    read = counter.reader()
+    assert read(str(path)) == "alpha beta gamma"
+    assert counter.lookup(str(path), st) == estimate_tokens("alpha beta gamma")
+    assert counter.file_stats([str(path), str(tmp_path / "gone.py")]) == ([st.st_size, 0], [counter.known[str(path)][2], 0])
+    path.write_text("alpha beta gamma delta")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert counter.lookup(str(path), os.stat(path)) is None
+
+
+def test_chunks_respect_budget_and_break_between_blocks(tmp_path):
+    paths = make_files(tmp_path, [3, 5, 2, 8, 1, 4, 6])
+    folder = str(tmp_path)
+    whole = io.StringIO()
+    core.write_merge(paths, folder, whole)
+    result, chunks = write_chunks(paths, folder, 120)
+    assert len(chunks) > 1 and result.oversized == 0
+    assert len(result.chunk_tokens) == len(chunks)
+    assert all(tokens <= 120 for tokens in result.chunk_tokens)
+    assert all(chunk.startswith("--- File: ") and chunk.endswith(" ---\n") for chunk in chunks)
+    assert "\n".join(chunks) == whole.getvalue() # Nothing lost or reordered
+    assert result.processed == len(paths)
+
+
+def test_chunk_tokens_match_the_text_written(tmp_path):
+    paths = make_files(tmp_path, [4, 4, 4, 4])
+    result, chunks = write_chunks(paths, str(tmp_path), 80)
+    # Counts come from the remembered per-file totals, not a recount of the chunk
+    assert result.chunk_tokens == [estimate_tokens(chunk) for chunk in chunks]
+
+
+def test_oversized_block_gets_its_own_chunk(tmp_path):
+    paths = make_files(tmp_path, [1, 200, 1])
+    result, chunks = write_chunks(paths, str(tmp_path), 50)
+    assert result.oversized == 1
+    assert len(chunks) == 3
+    assert chunks[1].startswith("--- File: m1.py ---") and chunks[1].count("--- File: ") == 1
+
+
+def test_chunks_with_plan_count_truncated_blocks(tmp_path):
+    paths = make_files(tmp_path, [100, 2])
+    plan = core.MergePlan(aliases={paths[1]: ["copy.py"]}, limits={paths[0]: 40})
+    result, chunks = write_chunks(paths, str(tmp_path), 10_000, plan=plan)
+    assert len(chunks) == 1
+    assert "[truncated:" in chunks[0] and "--- Duplicates: copy.py ---" in chunks[0]
+    assert result.chunk_tokens == [estimate_tokens(chunks[0])]
+
+
+def test_counts_round_trip_through_a_cache(tmp_path):
+    class Store:
+        def __init__(self):
+            self.counts = {}
+        def token_counts(self, folder_path, tokenizer):
+            return dict(self.counts)
+        def store_token_counts(self, folder_path, tokenizer, counts):
+            self.counts.update(counts)
+    path = tmp_path / "a.py"
+    path.write_text("one two three")
+    store = Store()
+    counter = TokenCounter.load(store, str(tmp_path))
+    counter.reader()(str(path))
+    counter.save(store, str(tmp_path))
+    assert counter.updated == {}
+    reloaded = TokenCounter.load(store, str(tmp_path))
+    assert reloaded.lookup(str(path), os.stat(path)) == estimate_tokens("one two three")
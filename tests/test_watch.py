@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import pytest
+
+from codemerger.analysis import AnalysisOptions, analyze_files
+from codemerger.filters import FileFilter
+from codemerger.tokens import TokenCounter
+from codemerger.watch import InotifyBackend, PollingBackend, TreeWatcher, WatchSession
+
+
+@pytest.fixture(autouse=True)
+def no_user_git_config(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(home / ".config"))
+
+
+def touch(root, *rel_paths):
+    for rel_path in rel_paths:
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"# {rel_path}\n")
+
+
+def rewrite_in_place(path, text):
+    """Rewrites ``path`` without touching its directory's mtime, bumping its own."""
+    dir_st = os.stat(path.parent)
+    st = os.stat(path)
+    path.write_text(text)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    os.utime(path.parent, ns=(dir_st.st_atime_ns, dir_st.st_mtime_ns))
+
+
+def sweep(session):
+    return session.apply(*session.backend.poll(0))
+
+
+def polling_session(folder):
+    session = WatchSession(str(folder), FileFilter(str(folder), ".py", use_gitignore=True))
+    session.backend = PollingBackend(session, interval=0)
+    return session
+
+
+def test_polling_sees_an_edited_gitignore(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py", "pkg/b.py", "pkg/c.py")
+    (tmp_path / "pkg" / ".gitignore").write_text("c.py\n")
+    session = polling_session(tmp_path)
+    assert session.files == [str(tmp_path / "a.py"), str(tmp_path / "pkg" / "b.py")]
+    rewrite_in_place(tmp_path / "pkg" / ".gitignore", "b.py\n")
+    changes = sweep(session)
+    assert changes.added == {str(tmp_path / "pkg" / "c.py")}
+    assert changes.removed == {str(tmp_path / "pkg" / "b.py")}
+
+
+def test_polling_sees_a_new_gitignore(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py", "b.py")
+    session = polling_session(tmp_path)
+    dir_st = os.stat(tmp_path)
+    (tmp_path / ".gitignore").write_text("b.py\n")
+    os.utime(tmp_path, ns=(dir_st.st_atime_ns, dir_st.st_mtime_ns))
+    assert sweep(session).removed == {str(tmp_path / "b.py")}
+
+
+def test_polling_sees_ignore_files_outside_the_tree(tmp_path):
+    touch(tmp_path, ".git/HEAD", "pkg/a.py", "pkg/b.py", "pkg/c.py")
+    exclude = tmp_path / ".git" / "info" / "exclude"
+    exclude.parent.mkdir()
+    exclude.write_text("b.py\n")
+    (tmp_path / ".gitignore").write_text("")
+    session = polling_session(tmp_path / "pkg")
+    assert str(exclude) in session.ignore_files
+    assert [os.path.basename(path) for path in session.files] == ["a.py", "c.py"]
+    rewrite_in_place(exclude, "")
+    assert sweep(session).added == {str(tmp_path / "pkg" / "b.py")}
+    rewrite_in_place(tmp_path / ".gitignore", "pkg/c.py\n")
+    assert sweep(session).removed == {str(tmp_path / "pkg" / "c.py")}
+
+
+def test_no_ignore_files_without_gitignore_handling(tmp_path):
+    touch(tmp_path, ".git/HEAD", "a.py")
+    session = WatchSession(str(tmp_path), FileFilter(str(tmp_path), ".py"))
+    assert session.ignore_files == frozenset()
+
+
+def test_token_counter_records_from_several_threads(tmp_path):
+    touch(tmp_path, *(f"m{i}.py" for i in range(200)))
+    paths = [str(tmp_path / f"m{i}.py") for i in range(200)]
+    counter = TokenCounter()
+    read = counter.reader()
+    threads = [threading.Thread(target=lambda part: [read(path) for path in part], args=(paths[i::4],)) for i in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert set(counter.known) == set(counter.updated) == set(paths)
+
+
+def test_apply_reports_added_removed_and_modified(tmp_path):
+    touch(tmp_path, "a.py", "pkg/b.py")
+    session = WatchSession(str(tmp_path), FileFilter(str(tmp_path), ".py"))
+    (tmp_path / "pkg" / "b.py").write_text("b = 2\n")
+    touch(tmp_path, "pkg/new/c.py")
+    (tmp_path / "a.py").unlink()
+    changes = session.apply({str(tmp_path), str(tmp_path / "pkg")}, {str(tmp_path / "pkg" / "b.py")})
+    assert changes.files == [str(tmp_path / "pkg" / "b.py"), str(tmp_path / "pkg" / "new" / "c.py")]
+    assert changes.removed == {str(tmp_path / "a.py")}
+    assert changes.added == {str(tmp_path / "pkg" / "new" / "c.py")}
+    assert changes.modified == {str(tmp_path / "pkg" / "b.py")}
+    b_rel = os.path.join("pkg", "b.py")
+    assert changes.blocks[str(tmp_path / "pkg" / "b.py")] == f"--- File: {b_rel} ---\nb = 2\n--- End File: {b_rel} ---\n"
+    assert str(tmp_path / "pkg" / "new") in session.listings
+    assert not session.apply(set(), set())
+
+
+def test_apply_counts_tokens_of_changed_files(tmp_path):
+    touch(tmp_path, "a.py")
+    counter = TokenCounter()
+    session = WatchSession(str(tmp_path), FileFilter(str(tmp_path), ".py"), counter=counter)
+    (tmp_path / "a.py").write_text("alpha beta\n")
+    changes = session.apply(set(), {str(tmp_path / "a.py")})
+    assert changes.stats == counter.file_stats(changes.files)
+    assert str(tmp_path / "a.py") in counter.known
+
+
+def test_apply_reanalyzes_changed_files_with_a_plan(tmp_path):
+    touch(tmp_path, "a.py", "b.py")
+    session = WatchSession(str(tmp_path), FileFilter(str(tmp_path), ".py"))
+    options = AnalysisOptions(max_file_bytes=64)
+    analysis = analyze_files(session.files, str(tmp_path), options)
+    session.set_plan(analysis.plan, options)
+    (tmp_path / "b.py").write_text("x = 1\n" * 100) # Now over the limit
+    changes = session.apply(set(), {str(tmp_path / "b.py")})
+    assert changes.plan.limits == {str(tmp_path / "b.py"): 64}
+    assert "[truncated: " in changes.blocks[str(tmp_path / "b.py")]
+    (tmp_path / "a.py").write_text("x = 1\n" * 100) # Now a copy of b.py
+    changes = session.apply(set(), {str(tmp_path / "a.py"), str(tmp_path / "b.py")})
+    assert changes.plan.aliases == {str(tmp_path / "a.py"): ["b.py"]}
+    assert changes.excluded == {str(tmp_path / "b.py")}
+    assert "--- Duplicates: b.py ---" in changes.blocks[str(tmp_path / "a.py")]
+
+
+def test_inotify_backend_reports_events(tmp_path):
+    touch(tmp_path, "a.py", "pkg/b.py")
+    session = WatchSession(str(tmp_path), FileFilter(str(tmp_path), ".py"))
+    try:
+        backend = InotifyBackend(session)
+    except (OSError, AttributeError):
+        pytest.skip("inotify is not available")
+    session.backend = backend
+    try:
+        (tmp_path / "pkg" / "b.py").write_text("b = 2\n")
+        touch(tmp_path, "c.py")
+        dirty_dirs, modified_files = backend.poll(1)
+        assert str(tmp_path) in dirty_dirs
+        assert {str(tmp_path / "pkg" / "b.py"), str(tmp_path / "c.py")} <= modified_files
+        changes = session.apply(dirty_dirs, modified_files)
+        assert changes.added == {str(tmp_path / "c.py")}
+        assert changes.modified == {str(tmp_path / "pkg" / "b.py")}
+    finally:
+        backend.close()
+
+
+def test_tree_watcher_queues_batches(tmp_path):
+    touch(tmp_path, "a.py")
+    session = WatchSession(str(tmp_path), FileFilter(str(tmp_path), ".py"))
+    watcher = TreeWatcher(session, backend="poll")
+    watcher.backend.interval = 0.05
+    assert watcher.kind == "polling"
+    watcher.start()
+    try:
+        touch(tmp_path, "b.py")
+        deadline = time.monotonic() + 5
+        batches = []
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.05)
+            batches = watcher.poll()
+    finally:
+        watcher.stop()
+    assert batches and batches[0].added == {str(tmp_path / "b.py")}